@@ -0,0 +1,122 @@
+# benchmarks/bench_packet.py
+# Compares the precompiled Struct codecs in lidar/packet.py against the
+# format-string packing they replaced. Run from lidar_python/:
+#     python -m benchmarks.bench_packet [number]
+import struct
+import sys
+import timeit
+from lidar.packet import DirectLidarStateInfo, LivoxLidarCmdPacket, LivoxLidarEthernetPacket, LivoxLidarKeyValueParam, LivoxLidarCartesianHighRawPoint
+from lidar.crc import calculate_crc16, calculate_crc32
+
+
+# Legacy packing, as done before the codecs were precompiled.
+
+def legacy_cmd_pack(p):
+    header = struct.pack(p.fmt, p.sof, p.version, p.length, p.seq_num, p.cmd_id, p.cmd_type, p.sender_type, p.rsvd, p.crc16_h, p.crc32_d)
+    return header + p.data
+
+def legacy_cmd_response(p):
+    p.crc16_h = calculate_crc16(legacy_cmd_pack(p)[:18])
+    p.crc32_d = calculate_crc32(legacy_cmd_pack(p)[24:])
+    return legacy_cmd_pack(p)
+
+def legacy_cmd_unpack(buffer):
+    if len(buffer) < struct.calcsize(LivoxLidarCmdPacket.fmt):
+        raise ValueError("short")
+    unpacked = struct.unpack_from(LivoxLidarCmdPacket.fmt, buffer)
+    return LivoxLidarCmdPacket(*unpacked, buffer[struct.calcsize(LivoxLidarCmdPacket.fmt):])
+
+def legacy_eth_pack(p):
+    return struct.pack(p.fmt, p.version, p.length, p.time_interval, p.dot_num, p.udp_cnt, p.frame_cnt, p.data_type, p.time_type, p.rsvd, p.crc32, p.timestamp)
+
+def legacy_kvp_unpack(data):
+    key, length = struct.unpack(LivoxLidarKeyValueParam.fmt, data[:struct.calcsize(LivoxLidarKeyValueParam.fmt)])
+    return LivoxLidarKeyValueParam(key, length, data[struct.calcsize(LivoxLidarKeyValueParam.fmt):struct.calcsize(LivoxLidarKeyValueParam.fmt) + length])
+
+def legacy_point_pack(p):
+    return struct.pack(p.fmt, p.x, p.y, p.z, p.reflectivity, p.tag)
+
+def legacy_state_pack(s):
+    return (
+        struct.pack('BBBB', s.pcl_data_type, s.pattern_mode, s.dual_emit_en, s.point_send_en)
+        + struct.pack('!III', s.lidar_ipcfg.ip, s.lidar_ipcfg.mask, s.lidar_ipcfg.gateway)
+        + struct.pack('IHH', s.host_info.dest_ip, s.host_info.dest_port, s.host_info.src_port)
+        + struct.pack('IHH', s.pointcloud_host_ipcfg.dest_ip, s.pointcloud_host_ipcfg.dest_port, s.pointcloud_host_ipcfg.src_port)
+        + struct.pack('IHH', s.imu_host_ipcfg.dest_ip, s.imu_host_ipcfg.dest_port, s.imu_host_ipcfg.src_port)
+        + struct.pack('16sHH', *s.ctl_host_ipcfg)
+        + struct.pack('16sHH', *s.log_host_ipcfg)
+        + struct.pack('ii', s.vehicle_speed, s.environment_temp)
+        + struct.pack('fffiii', s.install_attitude.roll_deg, s.install_attitude.pitch_deg, s.install_attitude.yaw_deg,
+                      s.install_attitude.x_mm, s.install_attitude.y_mm, s.install_attitude.z_mm)
+        + struct.pack('I', s.blind_spot_set)
+        + struct.pack('B', s.frame_rate)
+        + struct.pack('iiiiI', s.fov_cfg0.yaw_start, s.fov_cfg0.yaw_stop, s.fov_cfg0.pitch_start, s.fov_cfg0.pitch_stop, s.fov_cfg0.rsvd)
+        + struct.pack('iiiiI', s.fov_cfg1.yaw_start, s.fov_cfg1.yaw_stop, s.fov_cfg1.pitch_start, s.fov_cfg1.pitch_stop, s.fov_cfg1.rsvd)
+        + struct.pack('B', s.fov_cfg_en)
+        + struct.pack('B', s.detect_mode)
+        + struct.pack('4B', *s.func_io_cfg)
+        + struct.pack('B', s.work_tgt_mode)
+        + struct.pack('B', s.glass_heat)
+        + struct.pack('B', s.imu_data_en)
+        + struct.pack('B', s.fusa_en)
+        + struct.pack('16s', s.sn)
+        + struct.pack('64s', s.product_info)
+        + struct.pack('4B', *s.version_app)
+        + struct.pack('4B', *s.version_loader)
+        + struct.pack('4B', *s.version_hardware)
+        + struct.pack('6B', *s.mac)
+        + struct.pack('B', s.cur_work_state)
+        + struct.pack('i', s.core_temp)
+        + struct.pack('I', s.powerup_cnt)
+        + struct.pack('Q', s.local_time_now)
+        + struct.pack('Q', s.last_sync_time)
+        + struct.pack('q', s.time_offset)
+        + struct.pack('B', s.time_sync_type)
+        + struct.pack('32B', *s.status_code)
+        + struct.pack('H', s.lidar_diag_status)
+        + struct.pack('B', s.lidar_flash_status)
+        + struct.pack('B', s.fw_type)
+        + struct.pack('8I', *s.hms_code)
+        + struct.pack('B', s.ROI_Mode)
+    )
+
+
+def pack_cmd_response(p, buf):
+    p.length = LivoxLidarCmdPacket.size + len(p.data)
+    p.crc32_d = calculate_crc32(p.data)
+    p.pack_into(buf)
+    p.crc16_h = calculate_crc16(memoryview(buf)[:18])
+    struct.pack_into('<H', buf, 18, p.crc16_h)
+
+
+def cases():
+    state = DirectLidarStateInfo()
+    cmd = LivoxLidarCmdPacket(0xAA, 0, 24 + 64, 1, 0x0101, 0, 1, b'\x00' * 6, 0, 0, bytes(64))
+    eth = LivoxLidarEthernetPacket(0, 1380, 0, 96, 0, 0, 1, 0, b'\x00' * 12, 0, 0, b'')
+    point = LivoxLidarCartesianHighRawPoint(1, 2, 3, 4, 0)
+    cmd_bytes = cmd.pack()
+    kvp_bytes = LivoxLidarKeyValueParam(0x8000, 16, bytes(16)).pack()
+    view = memoryview(bytearray(cmd_bytes))
+    out = bytearray(1500)
+    return [
+        ('DirectLidarStateInfo.pack', lambda: legacy_state_pack(state), state.pack),
+        ('DirectLidarStateInfo.pack_into', lambda: legacy_state_pack(state), lambda: state.pack_into(out)),
+        ('LivoxLidarCmdPacket.pack', lambda: legacy_cmd_pack(cmd), cmd.pack),
+        ('LivoxLidarCmdPacket response + crc', lambda: legacy_cmd_response(cmd), lambda: pack_cmd_response(cmd, out)),
+        ('LivoxLidarCmdPacket.unpack_from', lambda: legacy_cmd_unpack(cmd_bytes), lambda: LivoxLidarCmdPacket.unpack_from(view)),
+        ('LivoxLidarEthernetPacket.pack_into', lambda: legacy_eth_pack(eth), lambda: eth.pack_into(out)),
+        ('LivoxLidarKeyValueParam.unpack_from', lambda: legacy_kvp_unpack(kvp_bytes), lambda: LivoxLidarKeyValueParam.unpack_from(kvp_bytes)),
+        ('LivoxLidarCartesianHighRawPoint.pack', lambda: legacy_point_pack(point), point.pack),
+    ]
+
+
+def run(number=100000, repeat=5):
+    print(f"{'case':40s} {'legacy ns':>10s} {'struct ns':>10s} {'speedup':>8s}")
+    for name, legacy, current in cases():
+        t_legacy = min(timeit.repeat(legacy, number=number, repeat=repeat)) / number * 1e9
+        t_current = min(timeit.repeat(current, number=number, repeat=repeat)) / number * 1e9
+        print(f"{name:40s} {t_legacy:10.0f} {t_current:10.0f} {t_legacy / t_current:7.2f}x")
+
+
+if __name__ == '__main__':
+    run(int(sys.argv[1]) if len(sys.argv) > 1 else 100000)
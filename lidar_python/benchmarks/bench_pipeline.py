@@ -0,0 +1,141 @@
+# benchmarks/bench_pipeline.py
+# Benchmark cases over the real encode/CRC/send paths. Each case takes a
+# LoopbackReceiver and a quick flag and returns a list of harness results.
+import os
+import socket
+import struct
+import tempfile
+import time
+import numpy as np
+from lidar import device, metrics, protocol
+from lidar.config import PCL_POINTS_PER_FRAME, PCL_FILE_UNIT_MM
+from lidar.crc import calculate_crc16, calculate_crc32
+from lidar.enums import ParamKeyName
+from lidar.packet import DirectLidarStateInfo, LivoxLidarCmdPacket
+from lidar.pcd import PcdReader
+from benchmarks.harness import measure, result
+
+INQUIRE_KEYS = (
+    ParamKeyName.kKeyPclDataType, ParamKeyName.kKeyPatternMode, ParamKeyName.kKeyLidarIpCfg,
+    ParamKeyName.kKeyStateInfoHostIpCfg, ParamKeyName.kKeyInstallAttitude, ParamKeyName.kKeyFovCfg0,
+    ParamKeyName.kKeySn, ParamKeyName.kKeyProductInfo, ParamKeyName.kKeyVersionApp, ParamKeyName.kKeyMac,
+    ParamKeyName.kKeyCoreTemp, ParamKeyName.kKeyLocalTimeNow, ParamKeyName.kKeyHmsCode,
+)
+
+
+def _cmd_request(cmd_id, data):
+    packet = LivoxLidarCmdPacket(0xAA, 0, LivoxLidarCmdPacket.size + len(data), 1, cmd_id, 0, 0, b'\x00' * 6, 0, 0, data)
+    return LivoxLidarCmdPacket.unpack(protocol.pack_cmd_response(packet))
+
+def _points(n, seed=0):
+    # (n, 4) x, y, z, reflectivity in the legacy cm unit.
+    rng = np.random.default_rng(seed)
+    points = np.empty((n, 4), np.int32)
+    points[:, :3] = rng.normal(0, 2000, (n, 3))
+    points[:, 3] = rng.integers(0, 256, n)
+    return points
+
+def _write_pcd(path, n, seed=0):
+    dtype = np.dtype([('x', '<f4'), ('y', '<f4'), ('z', '<f4'), ('intensity', 'u1')])
+    cloud = np.zeros(n, dtype)
+    rng = np.random.default_rng(seed)
+    for name in ('x', 'y', 'z'):
+        cloud[name] = rng.normal(0, 20, n)
+    cloud['intensity'] = rng.integers(0, 256, n)
+    header = (f"VERSION 0.7\nFIELDS x y z intensity\nSIZE 4 4 4 1\nTYPE F F F U\nCOUNT 1 1 1 1\n"
+              f"WIDTH {n}\nHEIGHT 1\nVIEWPOINT 0 0 0 1 0 0 0\nPOINTS {n}\nDATA binary\n")
+    with open(path, 'wb') as f:
+        f.write(header.encode('ascii'))
+        f.write(cloud.tobytes())
+
+
+def bench_crc(receiver, quick):
+    header = os.urandom(18)
+    payload = os.urandom(1380 - 28)
+    n = 2000 if quick else 20000
+    return [
+        measure('crc16_header', lambda: calculate_crc16(header), len(header), n, unit='B'),
+        measure('crc32_packet', lambda: calculate_crc32(payload), len(payload), n, unit='B'),
+    ]
+
+def bench_encode(receiver, quick):
+    points = _points(PCL_POINTS_PER_FRAME)
+    results = []
+    for data_type in (1, 2, 3):
+        protocol.g_lidar_info.pcl_data_type = data_type
+        results.append(measure(f'encode_frame_type{data_type}',
+                               lambda: protocol.handle_parameter_pointcloud_data(points, 0, PCL_FILE_UNIT_MM),
+                               len(points), 20 if quick else 200, warmup=3, unit='points'))
+    protocol.g_lidar_info.pcl_data_type = 2
+    return results
+
+def bench_state_pack(receiver, quick):
+    info = DirectLidarStateInfo()
+    out = bytearray(info.size)
+    n = 2000 if quick else 20000
+    return [
+        measure('state_info_pack', info.pack, 1, n, unit='packs'),
+        measure('state_info_pack_into', lambda: info.pack_into(out), 1, n, unit='packs'),
+    ]
+
+def bench_commands(receiver, quick):
+    sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+    keys = [key.value for key in INQUIRE_KEYS]
+    inquire = _cmd_request(0x0101, struct.pack(f'<HH{len(keys)}H', len(keys), 0, *keys))
+    config = _cmd_request(0x0100, struct.pack('<HHHHB', 1, 0, ParamKeyName.kKeyPatternMode.value, 1, 0))
+    n = 500 if quick else 5000
+    try:
+        receiver.reset()
+        results = [
+            measure('cmd_parameter_inquire', lambda: protocol.handle_parameter_inquire(sock, receiver.addr, inquire),
+                    1, n, unit='cmds'),
+            measure('cmd_parameter_config', lambda: protocol.handle_parameter_configuration(sock, receiver.addr, config),
+                    1, n, unit='cmds'),
+        ]
+        receiver.wait_for(2 * (n + 50), 0.5)
+    finally:
+        sock.close()
+    return results
+
+def bench_replay(receiver, quick):
+    n_points = 100000 if quick else 1000000
+    runs = 1 if quick else 3
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, 'replay.pcd')
+        _write_pcd(path, n_points)
+        if not device.open_pcl_socket(('127.0.0.1', 0), receiver.addr):
+            raise RuntimeError("could not open loopback point socket")
+        send_time = metrics.SEND_TIME
+        send_time.reset()
+        packets = metrics.SENT_PACKETS.value
+        elapsed = 0.0
+        received = 0
+        invalid = 0
+        lost = 0
+        for _ in range(runs):
+            reader = PcdReader(path)
+            receiver.reset(check=True)
+            start = time.perf_counter()
+            rc = protocol.replay_pcl_data(reader, points_per_second=0, frames_per_second=0)
+            elapsed += time.perf_counter() - start
+            reader.close()
+            if rc < 0:
+                raise RuntimeError("replay failed")
+            sent = metrics.SENT_PACKETS.value - packets
+            received += receiver.wait_for(sent // runs, 0.5)
+            invalid += receiver.invalid()
+            lost += receiver.lost()
+        sent = metrics.SENT_PACKETS.value - packets
+    # Latency percentiles are per sendmmsg()/sendto() batch.
+    return [result('replay_end_to_end', runs, n_points * runs, elapsed, send_time, unit='points',
+                   packets_sent=sent, packets_received=received, packets_invalid=invalid, packets_lost=lost,
+                   loss=1 - received / sent if sent else 0.0)]
+
+
+CASES = {
+    'crc': bench_crc,
+    'encode': bench_encode,
+    'state': bench_state_pack,
+    'commands': bench_commands,
+    'replay': bench_replay,
+}
@@ -0,0 +1,139 @@
+# benchmarks/harness.py
+import json
+import platform
+import socket
+import threading
+import time
+from lidar.metrics import Histogram
+from lidar.receiver import PacketReceiver, PointDecoder
+
+
+class LoopbackReceiver:
+    # Counts datagrams sent to 127.0.0.1 from a background thread with the
+    # host-side PacketReceiver, standing in for the host SDK. After
+    # reset(check=True) point packets are also validated and udp_cnt gaps
+    # counted.
+
+    def __init__(self, rcvbuf=1 << 24):
+        self.sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+        self.sock.setsockopt(socket.SOL_SOCKET, socket.SO_RCVBUF, rcvbuf)
+        self.sock.bind(('127.0.0.1', 0))
+        self.addr = self.sock.getsockname()
+        self.receiver = PacketReceiver(self.sock)
+        self.packets = 0
+        self.bytes = 0
+        self.decoder = None
+        self._running = True
+        self._thread = threading.Thread(target=self._run, daemon=True)
+        self._thread.start()
+
+    def _run(self):
+        receiver = self.receiver
+        while self._running:
+            n = receiver.recv(0.1)
+            if n < 0:
+                break
+            if n == 0:
+                continue
+            decoder = self.decoder
+            if decoder is not None:
+                decoder.process(receiver.slots[:n], receiver.lengths[:n], receiver.headers(n))
+            self.packets += n
+            self.bytes += int(receiver.lengths[:n].sum())
+
+    def reset(self, check=False):
+        self.decoder = PointDecoder() if check else None
+        self.packets = 0
+        self.bytes = 0
+
+    def invalid(self):
+        return self.decoder.invalid if self.decoder is not None else 0
+
+    def lost(self):
+        return self.decoder.sequence.lost if self.decoder is not None else 0
+
+    def wait_for(self, packets, timeout=1.0):
+        # Waits until packets have arrived or nothing new arrives for timeout.
+        last, deadline = self.packets, time.monotonic() + timeout
+        while self.packets < packets and time.monotonic() < deadline:
+            time.sleep(0.01)
+            if self.packets != last:
+                last, deadline = self.packets, time.monotonic() + timeout
+        return self.packets
+
+    def close(self):
+        self._running = False
+        self._thread.join()
+        self.sock.close()
+
+
+def result(name, calls, items, elapsed_s, hist, unit='items', **extra):
+    scale = hist.unit * 1e6
+    return {
+        'name': name,
+        'unit': unit,
+        'calls': calls,
+        'items': items,
+        'elapsed_s': elapsed_s,
+        'calls_per_s': calls / elapsed_s if elapsed_s else 0.0,
+        'items_per_s': items / elapsed_s if elapsed_s else 0.0,
+        'p50_us': hist.quantile(0.5) * scale,
+        'p99_us': hist.quantile(0.99) * scale,
+        'max_us': hist.max * scale,
+        **extra,
+    }
+
+def measure(name, fn, items=1, iterations=1000, warmup=50, unit='items'):
+    # Times iterations calls of fn(); each call processes items units.
+    for _ in range(warmup):
+        fn()
+    hist = Histogram(name, '')
+    clock = time.perf_counter_ns
+    start = clock()
+    for _ in range(iterations):
+        t0 = clock()
+        fn()
+        hist.record(clock() - t0)
+    elapsed = (clock() - start) / 1e9
+    return result(name, iterations, items * iterations, elapsed, hist, unit)
+
+
+def save_results(path, results):
+    doc = {
+        'created': time.strftime('%Y-%m-%dT%H:%M:%S%z'),
+        'host': platform.node(),
+        'platform': platform.platform(),
+        'python': platform.python_version(),
+        'results': {r['name']: r for r in results},
+    }
+    with open(path, 'w') as f:
+        json.dump(doc, f, indent=2, sort_keys=True)
+
+def load_results(path):
+    with open(path) as f:
+        return json.load(f)['results']
+
+def compare(results, baseline, threshold):
+    # Returns one message per case whose throughput fell, or whose median
+    # latency rose, by more than threshold (a fraction) against baseline.
+    regressions = []
+    for r in results:
+        base = baseline.get(r['name'])
+        if base is None:
+            continue
+        if base['items_per_s'] and r['items_per_s'] < base['items_per_s'] * (1 - threshold):
+            regressions.append(f"{r['name']}: throughput {r['items_per_s']:.4g} {r['unit']}/s "
+                               f"vs baseline {base['items_per_s']:.4g} ({r['items_per_s'] / base['items_per_s'] - 1:+.1%})")
+        if base['p50_us'] and r['p50_us'] > base['p50_us'] * (1 + threshold):
+            regressions.append(f"{r['name']}: p50 {r['p50_us']:.1f} us vs baseline {base['p50_us']:.1f} us "
+                               f"({r['p50_us'] / base['p50_us'] - 1:+.1%})")
+    return regressions
+
+def format_table(results, baseline=None):
+    lines = [f"{'case':28s} {'throughput':>22s} {'p50 us':>10s} {'p99 us':>10s} {'max us':>10s} {'vs base':>8s}"]
+    for r in results:
+        base = (baseline or {}).get(r['name'])
+        delta = f"{r['items_per_s'] / base['items_per_s'] - 1:+.1%}" if base and base['items_per_s'] else ''
+        throughput = f"{r['items_per_s']:.4g} {r['unit']}/s"
+        lines.append(f"{r['name']:28s} {throughput:>22s} {r['p50_us']:10.1f} {r['p99_us']:10.1f} {r['max_us']:10.1f} {delta:>8s}")
+    return '\n'.join(lines)
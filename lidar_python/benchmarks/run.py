@@ -0,0 +1,61 @@
+# benchmarks/run.py
+# Runs the pipeline benchmarks against a loopback receiver. From lidar_python/:
+#     python -m benchmarks.run [--quick] [--cases crc,replay] [--output results.json]
+#                              [--baseline previous.json] [--threshold 0.10]
+# Exits with status 1 if any case regressed beyond the threshold.
+import argparse
+import sys
+from lidar import protocol
+from lidar.log import configure
+from benchmarks.bench_pipeline import CASES
+from benchmarks.harness import LoopbackReceiver, save_results, load_results, compare, format_table
+
+DEFAULT_THRESHOLD = 0.10
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmark the lidar encode/CRC/send pipeline.")
+    parser.add_argument('--cases', default=','.join(CASES), help="comma-separated subset of: " + ', '.join(CASES))
+    parser.add_argument('--quick', action='store_true', help="fewer iterations, for smoke runs")
+    parser.add_argument('--output', help="write results to this JSON file")
+    parser.add_argument('--baseline', help="compare against results from an earlier run")
+    parser.add_argument('--threshold', type=float, default=DEFAULT_THRESHOLD,
+                        help="allowed fractional slowdown before failing (default %(default)s)")
+    args = parser.parse_args(argv)
+
+    names = [name.strip() for name in args.cases.split(',') if name.strip()]
+    unknown = [name for name in names if name not in CASES]
+    if unknown:
+        parser.error(f"unknown cases: {', '.join(unknown)}")
+
+    configure('WARNING')
+    protocol.init_livox_lidar_info_data()
+    receiver = LoopbackReceiver()
+    results = []
+    try:
+        for name in names:
+            results.extend(CASES[name](receiver, args.quick))
+    finally:
+        receiver.close()
+
+    baseline = load_results(args.baseline) if args.baseline else None
+    print(format_table(results, baseline))
+    for r in results:
+        if 'loss' in r:
+            print(f"{r['name']}: {r['packets_sent']} packets sent, {r['packets_received']} received ({r['loss']:.2%} loss), "
+                  f"{r.get('packets_invalid', 0)} invalid, {r.get('packets_lost', 0)} udp_cnt gaps")
+    if args.output:
+        save_results(args.output, results)
+        print(f"Results written to {args.output}")
+
+    if baseline is not None:
+        regressions = compare(results, baseline, args.threshold)
+        for message in regressions:
+            print(f"REGRESSION {message}")
+        if regressions:
+            return 1
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
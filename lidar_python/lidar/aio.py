@@ -0,0 +1,289 @@
+# lidar/aio.py
+import asyncio
+import signal
+import time
+from .config import broadcast_port, USE_UVLOOP, IMU_STREAM_ENABLED, PUSH_ENABLED, PUSH_PERIOD, PCL_IDLE_POLL
+from .device import create_lidar_udp_socket, get_default_device
+from .metrics import CMD_PACKETS, CMD_ERRORS, CMD_PARSE, CMD_HANDLE
+from .packet import LivoxLidarCmdPacket
+from .protocol import dispatch_command, point_streams, stream_gauges, next_due_batch, close_point_sockets
+from .registry import DeviceRegistry
+from .imu import imu_streams
+from .push import StatePusher
+from .log import get_logger, CMD, REPLAY
+
+try:
+    import uvloop
+except ImportError:
+    uvloop = None
+
+log = get_logger(CMD)
+replay_log = get_logger(REPLAY)
+
+# All endpoints of all devices run on one event loop thread. Point frames
+# are still encoded by a producer thread per device (numpy releases the
+# GIL there); the loop only paces and sends the encoded packets.
+
+
+# Largest UDP payload, so no command datagram is ever truncated.
+CMD_RECV_SIZE = 65535
+
+
+class CommandReader:
+    # One device's command port, or the shared broadcast port if dev is
+    # None. asyncio has no buffered protocol for datagrams, so the socket
+    # is watched with add_reader and each datagram is read with
+    # recvfrom_into into one buffer allocated up front; only the payload
+    # is copied out by the packet parser. Replies go straight out of sock.
+
+    def __init__(self, registry, sock, dev=None):
+        self.registry = registry
+        self.sock = sock
+        self.dev = dev
+        self.buf = bytearray(CMD_RECV_SIZE)
+        self.loop = None
+
+    def start(self, loop):
+        self.sock.setblocking(False)
+        self.loop = loop
+        loop.add_reader(self.sock.fileno(), self.readable)
+
+    def close(self):
+        if self.loop is not None:
+            self.loop.remove_reader(self.sock.fileno())
+            self.loop = None
+
+    def readable(self):
+        # Drains every queued datagram per wakeup.
+        while True:
+            try:
+                n, addr = self.sock.recvfrom_into(self.buf)
+            except (BlockingIOError, InterruptedError):
+                return
+            except OSError as e:
+                log.warning("Command endpoint error: %s", e)
+                return
+            self.datagram_received(n, addr)
+
+    def datagram_received(self, n, addr):
+        t0 = time.perf_counter_ns()
+        CMD_PACKETS.add()
+        if n < LivoxLidarCmdPacket.size:
+            CMD_ERRORS.add()
+            log.warning("Short command packet (%d bytes) from %s:%d", n, *addr)
+            return
+        pkt = LivoxLidarCmdPacket.unpack_from(self.buf, 0, n)
+        CMD_PARSE.record(time.perf_counter_ns() - t0)
+
+        log.debug("Command from %s:%d, cmd_type 0x%x, cmd_id 0x%x, length %d",
+                  *addr, pkt.cmd_type, pkt.cmd_id, n)
+        try:
+            dispatch_command(self.sock, addr, pkt, self.dev, self.registry)
+        except OSError as e:
+            CMD_ERRORS.add()
+            log.warning("Reply to %s:%d failed: %s", *addr, e)
+        CMD_HANDLE.record(time.perf_counter_ns() - t0)
+
+
+class DiscardProtocol(asyncio.DatagramProtocol):
+    # Send-side endpoints (IMU) read and drop whatever the host sends them
+    # so their receive queues never fill.
+
+    def __init__(self, name):
+        self.name = name
+        self.transport = None
+
+    def connection_made(self, transport):
+        self.transport = transport
+
+    def datagram_received(self, data, addr):
+        log.debug("%s: ignoring %d bytes from %s:%d", self.name, len(data), *addr)
+
+    def error_received(self, exc):
+        log.debug("%s endpoint error: %s", self.name, exc)
+
+
+async def push_state(devices, period=PUSH_PERIOD):
+    pushers = [StatePusher(dev) for dev in devices]
+    next_ns = time.perf_counter_ns()
+    while True:
+        for pusher in pushers:
+            pusher.push()
+        next_ns += int(period * 1e9)
+        await asyncio.sleep(max(0, next_ns - time.perf_counter_ns()) / 1e9)
+
+def _wake_on_change(devices):
+    # An asyncio.Event set whenever a device's work state changes, from
+    # whichever thread changed it. Returns (event, unsubscribe).
+    loop = asyncio.get_running_loop()
+    wake = asyncio.Event()
+    notify = lambda: loop.call_soon_threadsafe(wake.set)
+    for dev in devices:
+        dev.work.add_listener(notify)
+    def unsubscribe():
+        for dev in devices:
+            dev.work.remove_listener(notify)
+    return wake, unsubscribe
+
+async def send_imu(streams, start_ns):
+    # IMU packets are due every 5 ms, so they get their own task rather
+    # than waiting behind point batches.
+    wake, unsubscribe = _wake_on_change([stream.dev for stream in streams])
+    for stream in streams:
+        stream.start(start_ns)
+    try:
+        while True:
+            wake.clear()
+            live = [stream for stream in streams if not stream.finished]
+            if not live:
+                return 0
+            waits = [wait for wait in (stream.due_in_ns() for stream in live) if wait is not None]
+            if not waits:
+                await wake.wait()
+                continue
+            wait = min(waits)
+            if wait > 0:
+                await asyncio.sleep(wait / 1e9)
+                continue
+            for stream in live:
+                stream.send_due()
+    finally:
+        unsubscribe()
+        for stream in streams:
+            stream.close()
+
+async def replay_points(devices, imu=IMU_STREAM_ENABLED):
+    # Event-loop version of protocol.replay_streams: awaits each batch's
+    # whole delay on the loop and only reserves its slot, so nothing ever
+    # sleeps or spins on the loop thread and commands, pushes and IMU
+    # packets are served in the gaps. Paused devices are skipped, and the
+    # loop sleeps while all of them are.
+    streams = point_streams(devices)
+    start_ns = time.perf_counter_ns()
+    for stream in streams:
+        stream.start(start_ns)
+    stream_gauges(streams)
+    imu_task = asyncio.create_task(send_imu(imu_streams(devices), start_ns)) if imu else None
+    wake, unsubscribe = _wake_on_change(devices)
+
+    active = list(streams)
+    try:
+        while active:
+            wake.clear()
+            active = [stream for stream in active if not stream.ring.drained()]
+            flowing = [stream for stream in active if stream.flowing()]
+            if not flowing:
+                if active:
+                    await wake.wait()
+                continue
+            best = next_due_batch(flowing)
+            if best is None:
+                await asyncio.sleep(PCL_IDLE_POLL)
+                continue
+            due, stream, start, count = best
+            if due > 0:
+                await asyncio.sleep(due / 1e9)
+                continue
+            if stream.send_batch(start, count, block=False) < 0:
+                return -1
+            await asyncio.sleep(0)
+    finally:
+        unsubscribe()
+        for stream in streams:
+            stream.close()
+        if imu_task is not None:
+            imu_task.cancel()
+            try:
+                await imu_task
+            except asyncio.CancelledError:
+                pass
+        close_point_sockets(devices)
+
+    return 0
+
+
+async def _endpoint(loop, factory, sock, transports):
+    transport, _ = await loop.create_datagram_endpoint(factory, sock=sock)
+    transports.append(transport)
+    return transport
+
+async def serve(registry=None, replay=True, stop=None):
+    # Serves the broadcast, command, IMU and push endpoints of every
+    # device, pushes their state and replays their point data, until stop
+    # is set, SIGINT/SIGTERM arrives or the task is cancelled. Closes every
+    # socket on the way out.
+    loop = asyncio.get_running_loop()
+    if registry is None:
+        registry = DeviceRegistry()
+        registry.add(get_default_device())
+    if stop is None:
+        stop = asyncio.Event()
+
+    signals = []
+    for sig in (signal.SIGINT, signal.SIGTERM):
+        try:
+            loop.add_signal_handler(sig, stop.set)
+            signals.append(sig)
+        except (NotImplementedError, RuntimeError, ValueError):
+            pass
+
+    transports = []
+    readers = []
+    tasks = []
+    broadcast_sock = None
+    try:
+        registry.open_sockets()
+        broadcast_sock = create_lidar_udp_socket('0.0.0.0', broadcast_port, 1, 'broadcast')
+        if broadcast_sock is not None:
+            readers.append(CommandReader(registry, broadcast_sock))
+        for dev in registry:
+            if dev.cmd_sock is not None:
+                readers.append(CommandReader(registry, dev.cmd_sock, dev))
+            if dev.imu_sock is not None:
+                await _endpoint(loop, lambda dev=dev: DiscardProtocol(f"{dev.sn} IMU"), dev.imu_sock, transports)
+            if dev.push_sock is not None:
+                await _endpoint(loop, lambda dev=dev: DiscardProtocol(f"{dev.sn} push"), dev.push_sock, transports)
+        for reader in readers:
+            reader.start(loop)
+        log.info("Serving %d devices on %d endpoints (%s)", len(registry), len(readers) + len(transports),
+                 type(loop).__module__)
+
+        if PUSH_ENABLED:
+            tasks.append(asyncio.create_task(push_state(list(registry))))
+        if replay:
+            tasks.append(asyncio.create_task(replay_points(list(registry))))
+        await stop.wait()
+        log.info("Shutting down.")
+    finally:
+        for task in tasks:
+            task.cancel()
+            try:
+                await task
+            except asyncio.CancelledError:
+                pass
+            except Exception as e:
+                replay_log.error("%s failed: %s", task.get_coro().__name__, e)
+        for reader in readers:
+            reader.close()
+        for transport in transports:
+            transport.close()
+        # Let the transports finish closing before the sockets go.
+        await asyncio.sleep(0)
+        registry.close()
+        if broadcast_sock is not None:
+            broadcast_sock.close()
+        for sig in signals:
+            loop.remove_signal_handler(sig)
+
+    return 0
+
+def run(registry=None, replay=True, use_uvloop=USE_UVLOOP):
+    if use_uvloop and uvloop is not None:
+        asyncio.set_event_loop_policy(uvloop.EventLoopPolicy())
+    elif use_uvloop:
+        log.debug("uvloop is not installed, using the default event loop")
+    try:
+        return asyncio.run(serve(registry, replay))
+    except KeyboardInterrupt:
+        log.info("Terminating event loop.")
+        return 0
@@ -0,0 +1,127 @@
+# lidar/attitude.py
+import math
+import threading
+import numpy as np
+
+# kKeyInstallAttitude as a rigid transform from the sensor frame to the
+# vehicle frame: rotate by roll about x, pitch about y and yaw about z,
+# R = Rz(yaw) Ry(pitch) Rx(roll), then offset by x/y/z mm.
+
+
+def attitude_matrix(att):
+    # 4x4 homogeneous matrix of a LivoxLidarInstallAttitude, translation in mm.
+    cr, sr = math.cos(math.radians(att.roll_deg)), math.sin(math.radians(att.roll_deg))
+    cp, sp = math.cos(math.radians(att.pitch_deg)), math.sin(math.radians(att.pitch_deg))
+    cy, sy = math.cos(math.radians(att.yaw_deg)), math.sin(math.radians(att.yaw_deg))
+    matrix = np.eye(4)
+    matrix[:3, :3] = [[cy * cp, cy * sp * sr - sy * cr, cy * sp * cr + sy * sr],
+                      [sy * cp, sy * sp * sr + cy * cr, sy * sp * cr - cy * sr],
+                      [-sp, cp * sr, cp * cr]]
+    matrix[:3, 3] = [att.x_mm, att.y_mm, att.z_mm]
+    return matrix
+
+
+def invert_rigid(matrix):
+    inverse = np.eye(4)
+    inverse[:3, :3] = matrix[:3, :3].T
+    inverse[:3, 3] = -matrix[:3, :3].T @ matrix[:3, 3]
+    return inverse
+
+
+def _store(field, values):
+    # Writes float values into a structured field, rounding for integer ones.
+    if field.dtype.kind in 'iu':
+        info = np.iinfo(field.dtype)
+        values = np.clip(np.rint(values), info.min, info.max)
+    field[...] = values
+
+
+class PointTransform:
+    # Moves whole frames by a 4x4 rigid transform (translation in mm) with
+    # one matmul: x/y/z go into a homogeneous (N, 4) buffer whose last
+    # column is 1 and are multiplied by the (4, 3) affine matrix for their
+    # unit, so rotation and offset come out of the same product. The
+    # scratch buffers grow to the largest frame and are reused, one set per
+    # thread; results are always fresh arrays.
+
+    def __init__(self, matrix=None):
+        self._local = threading.local()
+        self.set_matrix(np.eye(4) if matrix is None else matrix)
+
+    @classmethod
+    def from_attitude(cls, att):
+        return cls(attitude_matrix(att))
+
+    def set_matrix(self, matrix):
+        matrix = np.array(matrix, np.float64)
+        if matrix.shape != (4, 4):
+            raise ValueError(f"Expected a 4x4 matrix, got shape {matrix.shape}")
+        # Swapped in one assignment, so a frame being transformed on another
+        # thread sees the old matrix or the new one, never a mix.
+        self._state = (matrix, bool(np.allclose(matrix, np.eye(4))), {})
+
+    @property
+    def matrix(self):
+        return self._state[0]
+
+    @property
+    def identity(self):
+        return self._state[1]
+
+    def inverse(self):
+        return PointTransform(invert_rigid(self.matrix))
+
+    def _affine(self, unit_mm):
+        matrix, _, affine = self._state
+        a = affine.get(unit_mm)
+        if a is None:
+            a = np.empty((4, 3), np.float32)
+            a[:3] = matrix[:3, :3].T
+            a[3] = matrix[:3, 3] / unit_mm
+            affine[unit_mm] = a
+        return a
+
+    def _xyz(self, x, y, z, unit_mm):
+        # Transformed (N, 3) coordinates in this thread's scratch buffer,
+        # valid until its next call.
+        local = self._local
+        n = len(x)
+        if getattr(local, 'homog', None) is None or len(local.homog) < n:
+            local.homog = np.empty((n, 4), np.float32)
+            local.homog[:, 3] = 1
+            local.xyz = np.empty((n, 3), np.float32)
+        homog, xyz = local.homog[:n], local.xyz[:n]
+        homog[:, 0] = x
+        homog[:, 1] = y
+        homog[:, 2] = z
+        np.matmul(homog, self._affine(unit_mm), out=xyz)
+        return xyz
+
+    def apply(self, points, unit_mm):
+        # points in unit_mm millimetre units, in any form the encoder takes.
+        # Returns a transformed copy in the same form, or points itself for
+        # the identity. Structured arrays keep every field, e.g. per-point
+        # timestamps, and integer fields are rounded; plain integer arrays
+        # come back as float32.
+        if self.identity or not len(points):
+            return points
+        points = np.asarray(points)
+        if points.dtype.names:
+            out = points.copy()
+            xyz = self._xyz(points['x'], points['y'], points['z'], unit_mm)
+            for i, name in enumerate(('x', 'y', 'z')):
+                _store(out[name], xyz[:, i])
+            return out
+        out = points.astype(points.dtype if points.dtype.kind == 'f' else np.float32)
+        out[:, :3] = self._xyz(points[:, 0], points[:, 1], points[:, 2], unit_mm)
+        return out
+
+    def apply_fields(self, points, unit_mm):
+        # Transforms a structured array with x/y/z fields in place, e.g. a
+        # receiver frame.
+        if self.identity or not len(points):
+            return points
+        xyz = self._xyz(points['x'], points['y'], points['z'], unit_mm)
+        for i, name in enumerate(('x', 'y', 'z')):
+            _store(points[name], xyz[:, i])
+        return points
@@ -14,13 +14,84 @@ log_data_port_device = 56500  # LOG Data
 log_data_port_host = 56501  # LOG Data
 
 MAXLEN = 1400
-MAX_SOCKETS = 20
+MAX_SOCKETS = 32
 POINTCLOUDDATAMAX = 96
+PCL_POINTS_PER_FRAME = 20000  # Mid-360: ~200k points/s at 10 Hz
+PCL_FILE_UNIT_MM = 10  # Replay file coordinates are in cm
+PCL_SEND_BATCH_SIZE = 32  # Packets per sendmmsg() call
+PCL_POINTS_PER_SECOND = 200000  # Point replay rate, 0 sends as fast as possible
+PCL_FRAMES_PER_SECOND = 0  # If set, pace whole frames instead of points
+PCL_REPLAY_LOOP = False  # Wrap from the end of the range back to its start
+PCL_REPLAY_START = 0  # First frame to replay; negative counts from the end
+PCL_REPLAY_END = None  # Frame to stop before; None plays to the end
+PCL_REPLAY_SPEED = 1.0  # Playback speed multiplier on the replay rate
+PCL_INDEX_STRIDE = 1000  # Points between indexed lines of ASCII PCD bodies
+PCL_INDEX_CACHE = True  # Keep ASCII PCD indexes in <file>.idx.npz
+PCL_VOXEL_SIZE = 0.0  # Metres; keep one point per voxel of this size, 0 disables
+PCL_DECIMATE = 1  # Keep 1 in this many points after voxelization, 1 disables
+PCL_DECIMATE_MODE = 'stride'  # 'stride' keeps evenly spaced points, 'random' a random subset
+PCL_FRAME_BUDGET = 0  # Max points per frame after reduction, thinned like PCL_DECIMATE_MODE; 0 = unlimited
+PCL_FOV_CULLING = True  # Drop points outside FOV windows or inside the blind spot, once the host sets them
+PCL_PIPELINE_CACHE_FRAMES = 600  # Processed frames kept for looped replay (1 min at 10 Hz); 0 disables
+PCL_SCHED_POLICY = 'catchup'  # 'catchup' bursts to recover lag, 'drop' skips late batches
+PCL_SCHED_SPIN_NS = 200000  # Busy-wait this close to a deadline instead of sleeping
+PCL_SCHED_MAX_LAG_NS = 100000000  # Lag beyond this is forgiven rather than caught up
+PCL_RING_SLOTS = 4096  # Packet slots between encoder and transmitter (~2 s at 2000 packets/s)
+PCL_RING_PUT_TIMEOUT = 1.0  # Seconds the encoder waits for free slots before dropping
+PCL_IDLE_POLL = 0.0005  # Seconds the sender sleeps when no stream has packets ready
+USE_UVLOOP = True  # Run the event loop on uvloop when it is installed
+PUSH_ENABLED = True  # Push state info (cmd 0x0102) to the host in kKeyStateInfoHostIpCfg
+PUSH_PERIOD = 1.0  # Seconds between state pushes
+PUSH_FULL_EVERY = 10  # Every Nth push carries all keys, the rest only changed ones; 0 = changed only
+PUSH_KEYS = None  # ParamKeyName members to push; None pushes every supported key
+RECV_BATCH_SIZE = 64  # Datagrams per recvmmsg() call in the host receiver
+RECV_SLOT_SIZE = 2048  # Receive slot size; longer datagrams are dropped as truncated
+RECV_FRAME_POINTS = 32768  # Initial frame buffer size; grows on demand
+RECV_FRAME_IDLE = 0.2  # Seconds without point data before an open frame is finished
+SIM_QUEUE_FRAMES = 2  # Frames stream_frame() queues; the oldest is dropped when the sender falls behind
+SIM_FRAME_PERIOD_NS = 100000000  # Span a streamed frame's points are stamped over (Mid-360: 10 Hz)
+IMU_STREAM_ENABLED = True  # Send IMU packets alongside the point stream (imu_data_en still applies)
+IMU_RATE_HZ = 200  # Mid-360 IMU sample rate
+IMU_BLOCK_SAMPLES = 20  # IMU packets encoded at a time
+IMU_SOURCE = None  # CSV or .npy of [t,] gyro x/y/z (rad/s), acc x/y/z (g); None = synthetic
+# Synthetic IMU: level sensor yawing back and forth and rolling gently,
+# with white noise. Rates in rad/s, periods in s, noise std in rad/s and g.
+IMU_SYNTHETIC = {'yaw_rate': 0.2, 'yaw_period': 10.0, 'roll': 0.05, 'roll_period': 2.0,
+                 'gyro_noise': 0.002, 'acc_noise': 0.01}
+
+# Socket options per endpoint kind, applied by lidar.sockopt.apply_profile.
+# Buffer sizes are in bytes; the kernel caps them at net.core.[rw]mem_max
+# unless force_buffers is set and we have CAP_NET_ADMIN. priority is
+# SO_PRIORITY (0-6 without CAP_NET_ADMIN), dscp the IP DSCP code point
+# (46 = EF), busy_poll SO_BUSY_POLL in microseconds (0 disables). A
+# nonblocking point socket drops packets when its send buffer is full
+# instead of stalling the replay; drops are counted, not retried.
+SOCKET_PROFILES = {
+    'command': {'rcvbuf': 1 << 16, 'sndbuf': 1 << 16},
+    'broadcast': {'rcvbuf': 1 << 16, 'sndbuf': 1 << 16},
+    'point': {'rcvbuf': 1 << 16, 'sndbuf': 1 << 22, 'priority': 6, 'dscp': 46, 'busy_poll': 0,
+              'nonblocking': True, 'force_buffers': False},
+    'imu': {'rcvbuf': 1 << 16, 'sndbuf': 1 << 18, 'priority': 6, 'dscp': 46, 'busy_poll': 0,
+            'nonblocking': True, 'force_buffers': False},
+    'receive': {'rcvbuf': 1 << 24, 'sndbuf': 1 << 16, 'busy_poll': 0, 'force_buffers': False},
+}
+LOG_LEVEL = 'INFO'  # Default level for all lidar.* loggers
+LOG_LEVELS = {}  # Per-subsystem overrides, e.g. {'cmd': 'DEBUG', 'replay': 'WARNING'}
+LOG_HEXDUMP = False  # Hex-dump command packets at DEBUG level
+LOG_SAMPLE_EVERY = 100  # Replay summary every N frames, 0 disables
+LOG_FORMAT = '%(asctime)s %(name)s %(levelname)s: %(message)s'
+METRICS_HTTP_ADDR = '127.0.0.1'
+METRICS_HTTP_PORT = 0  # Serve Prometheus text on http://addr:port/metrics, 0 disables
+METRICS_SUMMARY_AT_EXIT = True
 
 LIDAR_HOST_IP = "192.168.1.47"
 LIDAR_DEVICE_IP = "192.168.1.44"
 LIDAR_DEVICE_SN = "Tux-LivoxLidar1"
 LIDAR_DEVICE_MASK = "255.255.255.0"
 LIDAR_DEVICE_GATEWAY = "192.168.68.1"
+# With several devices, device i uses LIDAR_DEVICE_IP + i on the standard
+# ports (one IP alias each), or, if this is set, LIDAR_DEVICE_IP with every
+# port offset by i * LIDAR_DEVICE_PORT_STRIDE.
+LIDAR_DEVICE_PORT_STRIDE = 0
 
 DEVICE_MAC = (0x7c, 0x7a, 0x91, 0x33, 0xbe, 0x3b)
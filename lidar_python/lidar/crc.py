@@ -1,23 +1,102 @@
 # lidar/crc.py
-def calculate_crc16(data):
-    crc = 0xFFFF
+import binascii
+import zlib
+
+CRC16_INIT = 0xFFFF
+CRC16_POLY = 0x1021
+CRC32_POLY = 0xEDB88320
+
+
+def _make_crc16_table():
+    table = []
+    for i in range(256):
+        crc = i << 8
+        for _ in range(8):
+            if crc & 0x8000:
+                crc = (crc << 1) ^ CRC16_POLY
+            else:
+                crc <<= 1
+        table.append(crc & 0xFFFF)
+    return tuple(table)
+
+CRC16_TABLE = _make_crc16_table()
+
+
+# CRC-16/CCITT-FALSE (poly 0x1021, init 0xFFFF) as used in the command header.
+# binascii.crc_hqx implements the same table-driven algorithm in C and reads
+# any contiguous buffer (bytes, bytearray, memoryview, numpy) without copying.
+def calculate_crc16(data, crc=CRC16_INIT):
+    return binascii.crc_hqx(data, crc)
+
+# CRC-32 (IEEE, reflected, init/xorout 0xFFFFFFFF), identical to zlib.crc32.
+# Pass a previous result as crc to continue a running checksum.
+def calculate_crc32(data, crc=0):
+    return zlib.crc32(data, crc)
+
+
+def calculate_crc16_table(data, crc=CRC16_INIT):
+    table = CRC16_TABLE
+    for byte in memoryview(data).cast('B'):
+        crc = ((crc << 8) & 0xFF00) ^ table[(crc >> 8) ^ byte]
+    return crc
+
+# Reference bit-loop implementations, kept for verification and benchmarks.
+def calculate_crc16_bitwise(data):
+    crc = CRC16_INIT
     for byte in data:
         crc ^= byte << 8
         for _ in range(8):
             if crc & 0x8000:
-                crc = (crc << 1) ^ 0x1021
+                crc = (crc << 1) ^ CRC16_POLY
             else:
                 crc <<= 1
     return crc & 0xFFFF
 
-def calculate_crc32(data):
+def calculate_crc32_bitwise(data):
     crc = 0xFFFFFFFF
     for b in data:
         crc ^= b
         for _ in range(8):
             if crc & 1:
-                crc = (crc >> 1) ^ 0xEDB88320
+                crc = (crc >> 1) ^ CRC32_POLY
             else:
                 crc >>= 1
     return crc ^ 0xFFFFFFFF
 
+
+class Crc16:
+    __slots__ = ('value',)
+
+    def __init__(self, data=None, crc=CRC16_INIT):
+        self.value = crc
+        if data is not None:
+            self.update(data)
+
+    def update(self, data):
+        self.value = binascii.crc_hqx(data, self.value)
+        return self
+
+    def digest(self):
+        return self.value
+
+    def copy(self):
+        return Crc16(crc=self.value)
+
+
+class Crc32:
+    __slots__ = ('value',)
+
+    def __init__(self, data=None, crc=0):
+        self.value = crc
+        if data is not None:
+            self.update(data)
+
+    def update(self, data):
+        self.value = zlib.crc32(data, self.value)
+        return self
+
+    def digest(self):
+        return self.value
+
+    def copy(self):
+        return Crc32(crc=self.value)
@@ -1,95 +1,216 @@
 # lidar/device.py
 import socket
 import struct
-from .config import LIDAR_DEVICE_IP, point_data_port_device, LIDAR_HOST_IP, point_data_port_host, DEVICE_MAC
-
-pcl_sockfd = None
-pcl_host_socket = None
-pcl_file = None
-original_ip = None
-
-def get_pcl_host_socket():
-    return pcl_host_socket
-
-def set_pcl_socket(ip_addr, pcl_port_host):
-    global pcl_sockfd, pcl_host_socket, original_ip
-
-    if pcl_sockfd is not None:
-        print(f"Closing existing socket with descriptor: {pcl_sockfd}")
-        pcl_sockfd.close()
-        pcl_sockfd = None
-
-    try:
-        pcl_sockfd = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
-        if pcl_sockfd.fileno() < 0:
-            raise socket.error(f"Error creating socket. IP: {ip_addr} port: {pcl_port_host}")
-        print(f"Socket created successfully. Descriptor: {pcl_sockfd.fileno()}")
-        print(f"set_pcl_socket...............IP ADDR : {ip_addr} PORT : {pcl_port_host}")
-    except socket.error as e:
-        print(f"Error creating socket. IP: {ip_addr} port: {pcl_port_host} Error: {e}")
-        return 0
-
+from .config import LIDAR_DEVICE_IP, point_data_port_device, LIDAR_HOST_IP, point_data_port_host, DEVICE_MAC, LIDAR_DEVICE_SN, ctrl_cmd_port_device, imu_data_port_device, push_cmd_port_device
+from .packet import DirectLidarStateInfo
+from .params import ParamStore
+from .timing import PacketClock
+from .transmit import PacketTransmitter
+from .pcd import PcdReader
+from .source import ReplaySource
+from .sockopt import apply_profile
+from .workmode import WorkModeMachine
+from .pipeline import PointPipeline
+from .log import get_logger, DEVICE
+
+log = get_logger(DEVICE)
+
+
+def resolve_host_ip(ip_addr):
+    # Host IPs arrive in key-value params as the four address bytes read
+    # through a native 'I', so packing them back little-endian restores
+    # the on-wire byte order.
     if isinstance(ip_addr, int):
-        ip_addr = socket.inet_ntoa(struct.pack('!I', ip_addr))
-
-    pcl_host_socket = (ip_addr, int(pcl_port_host))
-    original_ip = ip_addr  # Store the original IP address
-
-    device_addr = (LIDAR_DEVICE_IP, point_data_port_device)
+        return socket.inet_ntoa(struct.pack('<I', ip_addr))
+    return ip_addr
 
-    print(f"Binding to device address - IP: {LIDAR_DEVICE_IP} Port: {point_data_port_device}")
+def create_lidar_udp_socket(s_addr, port, broadcast_enable=0, profile='command'):
+    try:
+        sockfd = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+    except socket.error as err:
+        log.error("Socket creation failed on port %d: %s", port, err)
+        return None
+
+    if broadcast_enable:
+        try:
+            sockfd.setsockopt(socket.SOL_SOCKET, socket.SO_BROADCAST, 1)
+        except socket.error as err:
+            log.error("Set socket broadcast option failed on port %d: %s", port, err)
+            sockfd.close()
+            return None
 
     try:
-        pcl_sockfd.bind(device_addr)
-        print(f"Socket successfully bound. Descriptor: {pcl_sockfd.fileno()}")
-    except socket.error as e:
-        print(f"Error binding to port {point_data_port_device} Error: {e}")
-        pcl_sockfd.close()
-        pcl_sockfd = None
+        sockfd.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+        apply_profile(sockfd, profile, f"{profile} {port}")
+        sockfd.bind((s_addr, port))
+    except socket.error as err:
+        log.error("Socket bind failed on port %d: %s", port, err)
+        sockfd.close()
+        return None
+
+    return sockfd
+
+
+class LidarDevice:
+    # One emulated sensor: its state, parameter store and clock, its own
+    # command, point and IMU sockets, and its replay source. Ports are the
+    # standard Mid-360 ones plus port_offset, so several devices can share
+    # one IP when they cannot each have an alias.
+
+    def __init__(self, index=0, ip=LIDAR_DEVICE_IP, sn=LIDAR_DEVICE_SN, mac=DEVICE_MAC, port_offset=0,
+                 host_ip=LIDAR_HOST_IP):
+        self.index = index
+        self.ip = ip
+        self.sn = sn
+        self.mac = tuple(mac)
+        self.host_ip = host_ip
+        self.port_offset = port_offset
+        self.cmd_port = ctrl_cmd_port_device + port_offset
+        self.point_port = point_data_port_device + port_offset
+        self.imu_port = imu_data_port_device + port_offset
+        self.push_port = push_cmd_port_device + port_offset
+
+        self.cmd_sock = None
+        self.imu_sock = None
+        self.push_sock = None
+        self.pcl_sockfd = None
+        self.pcl_host_socket = None
+        self.pcl_transmitter = None
+        self.pcl_sockopts = {}
+        self.pcl_reader = None
+        self.pcl_source = None
+        self.reset_state()
+
+    def __repr__(self):
+        return f"LidarDevice({self.index}, {self.sn}, {self.ip}:{self.cmd_port})"
+
+    def reset_state(self):
+        self.info = DirectLidarStateInfo(self.ip, self.sn, self.mac, self.host_ip)
+        self.clock = PacketClock(self.info)
+        self.store = ParamStore(self.info, self.clock, self)
+        self.work = WorkModeMachine(self)
+        self.pipeline = PointPipeline(self)
+
+    def open_sockets(self):
+        # Command, IMU and state push sockets; the point socket is opened
+        # once the host configures its address. Returns -1 if the command
+        # socket failed.
+        if self.cmd_sock is None:
+            self.cmd_sock = create_lidar_udp_socket(self.ip, self.cmd_port, 0)
+        if self.imu_sock is None:
+            self.imu_sock = create_lidar_udp_socket(self.ip, self.imu_port, 0, 'imu')
+        if self.push_sock is None:
+            self.push_sock = create_lidar_udp_socket(self.ip, self.push_port, 0, 'command')
+        return 0 if self.cmd_sock is not None else -1
+
+    def set_pcl_socket(self, ip_addr, pcl_port_host):
+        log.info("set_pcl_socket: %s IP ADDR %s PORT %s", self.sn, ip_addr, pcl_port_host)
+        return self.open_pcl_socket((self.ip, self.point_port),
+                                    (resolve_host_ip(ip_addr), point_data_port_host + self.port_offset))
+
+    def open_pcl_socket(self, device_addr, host_addr):
+        # Binds the point data socket to device_addr and sends to host_addr.
+        try:
+            return self._open_pcl_socket(device_addr, host_addr)
+        finally:
+            self.work.update()
+
+    def _open_pcl_socket(self, device_addr, host_addr):
+        self.pcl_transmitter = None
+
+        if self.pcl_sockfd is not None:
+            log.info("Closing existing socket with descriptor: %s", self.pcl_sockfd)
+            self.pcl_sockfd.close()
+            self.pcl_sockfd = None
+
+        try:
+            self.pcl_sockfd = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+            if self.pcl_sockfd.fileno() < 0:
+                raise socket.error(f"Error creating socket. IP: {host_addr[0]} port: {host_addr[1]}")
+            log.debug("Socket created successfully. Descriptor: %d", self.pcl_sockfd.fileno())
+            self.pcl_sockopts = apply_profile(self.pcl_sockfd, 'point', f"{self.sn} point")
+        except socket.error as e:
+            log.error("Error creating socket. IP: %s port: %s Error: %s", host_addr[0], host_addr[1], e)
+            return 0
+
+        self.pcl_host_socket = host_addr
+
+        log.debug("Binding to device address - IP: %s Port: %d", *device_addr)
+
+        try:
+            self.pcl_sockfd.bind(device_addr)
+            log.info("Point socket bound to %s:%d, sending to %s:%d", *self.pcl_sockfd.getsockname(), *self.pcl_host_socket)
+        except socket.error as e:
+            log.error("Error binding to port %d Error: %s", device_addr[1], e)
+            self.pcl_sockfd.close()
+            self.pcl_sockfd = None
+            return 0
+
+        self.pcl_transmitter = PacketTransmitter(self.pcl_sockfd, self.pcl_host_socket)
+        return self.pcl_sockfd
+
+    def send_pcl_packets(self, buffer, offsets, lengths=None):
+        if self.pcl_sockfd is None or self.pcl_sockfd.fileno() <= 0 or self.pcl_transmitter is None:
+            log.error("Invalid socket descriptor: %s", self.pcl_sockfd)
+            return -1
+        return self.pcl_transmitter.send_packets(buffer, offsets, lengths)
+
+    def setup_pcl_file_handle(self, filename):
+        try:
+            self.pcl_reader = PcdReader(filename)
+            self.pcl_source = ReplaySource(self.pcl_reader)
+            self.pipeline.clear()
+        except (OSError, ValueError) as e:
+            log.error("Failed to open file: %s Error: %s", filename, e)
+            return -1
+        source = self.pcl_source
+        log.info("%s: opened %s PCD with %d points, fields %s; replaying frames %d-%d of %d%s at %gx", self.sn,
+                 self.pcl_reader.data, self.pcl_reader.points, self.pcl_reader.fields, source.start, source.end,
+                 source.frame_count, ", looped" if source.loop else "", source.speed)
         return 0
 
-    return pcl_sockfd
+    def close_pcl_socket(self):
+        if self.pcl_sockfd is None:
+            return
+        log.info("Closing socket with descriptor: %d", self.pcl_sockfd.fileno())
+        self.pcl_sockfd.close()
+        self.pcl_sockfd = None
+        self.pcl_transmitter = None
+        self.work.update()
 
+    def close(self):
+        for sock in (self.cmd_sock, self.imu_sock, self.push_sock, self.pcl_sockfd):
+            if sock is not None:
+                sock.close()
+        self.cmd_sock = self.imu_sock = self.push_sock = self.pcl_sockfd = self.pcl_transmitter = None
+        if self.pcl_reader is not None:
+            self.pcl_reader.close()
 
-def send_pcl_data(buffer2, length):
-    global pcl_sockfd, pcl_host_socket, original_ip
-    if pcl_sockfd is None or pcl_sockfd.fileno() <= 0:
-        print(f"Invalid socket descriptor: {pcl_sockfd}")
-        return -1
-    correct_port = point_data_port_host
 
-    # Temporarily reverse the IP address
-    reversed_ip = socket.inet_ntoa(socket.inet_aton(pcl_host_socket[0])[::-1])
-    pcl_host_socket = (reversed_ip, correct_port)
+# The module-level functions act on the first device, which is the only
+# one in a single-sensor setup.
+default_device = LidarDevice()
 
-    try:
-        bytes_sent = pcl_sockfd.sendto(buffer2[:length], pcl_host_socket)
-    except socket.error as e:
-        print(f"Error sending message to host. Error: {e}")
-        return -1
+def get_default_device():
+    return default_device
 
-    if bytes_sent < 0:
-        print("Error sending message to host")
-        return -1
-    else:
-        print(f"Sent {bytes_sent} bytes to host")
+def get_pcl_host_socket():
+    return default_device.pcl_host_socket
 
-    # Reset the IP address to the original
-    pcl_host_socket = (original_ip, correct_port)
-    return bytes_sent
+def get_pcl_transmitter():
+    return default_device.pcl_transmitter
 
+def set_pcl_socket(ip_addr, pcl_port_host):
+    return default_device.set_pcl_socket(ip_addr, pcl_port_host)
 
-def setup_pcl_file_handle(filename):
-    global pcl_file
-    pcl_file = open(filename, 'r')
-    if pcl_file is None:
-        print(f"Failed to open file: {filename}")
-        return -1
-    for _ in range(11):
-        pcl_file.readline()
-    return 0
+def open_pcl_socket(device_addr, host_addr):
+    return default_device.open_pcl_socket(device_addr, host_addr)
 
+def send_pcl_packets(buffer, offsets, lengths=None):
+    return default_device.send_pcl_packets(buffer, offsets, lengths)
 
+def setup_pcl_file_handle(filename):
+    return default_device.setup_pcl_file_handle(filename)
 
-def get_pcl_file():
-    return pcl_file
+def get_pcl_reader():
+    return default_device.pcl_reader
@@ -0,0 +1,287 @@
+# lidar/encoder.py
+import time
+import numpy as np
+from .config import POINTCLOUDDATAMAX, MAXLEN
+from .crc import calculate_crc32
+from .metrics import PACKET_CRC
+
+# Mirrors LivoxLidarEthernetPacket.fmt ('<BHHHHBBB12sLQ'), packed without padding.
+HEADER_DTYPE = np.dtype([
+    ('version', 'u1'),
+    ('length', '<u2'),
+    ('time_interval', '<u2'),
+    ('dot_num', '<u2'),
+    ('udp_cnt', '<u2'),
+    ('frame_cnt', 'u1'),
+    ('data_type', 'u1'),
+    ('time_type', 'u1'),
+    ('rsvd', 'V12'),
+    ('crc32', '<u4'),
+    ('timestamp', '<u8'),
+])
+HEADER_SIZE = HEADER_DTYPE.itemsize
+CRC32_OFFSET = HEADER_DTYPE.fields['timestamp'][1]  # CRC32 covers timestamp + points
+
+# Mirrors LivoxLidarCartesianHighRawPoint.fmt ('<iiiBB'), coordinates in mm.
+CARTESIAN_HIGH_DTYPE = np.dtype([
+    ('x', '<i4'),
+    ('y', '<i4'),
+    ('z', '<i4'),
+    ('reflectivity', 'u1'),
+    ('tag', 'u1'),
+])
+
+# Mirrors LivoxLidarCartesianLowRawPoint.fmt ('<hhhBB'), coordinates in cm.
+CARTESIAN_LOW_DTYPE = np.dtype([
+    ('x', '<i2'),
+    ('y', '<i2'),
+    ('z', '<i2'),
+    ('reflectivity', 'u1'),
+    ('tag', 'u1'),
+])
+
+# Mirrors LivoxLidarSpherPoint.fmt ('<IHHBB'): depth in mm, zenith (theta)
+# and azimuth (phi) in 0.01 degree.
+SPHERICAL_DTYPE = np.dtype([
+    ('depth', '<u4'),
+    ('theta', '<u2'),
+    ('phi', '<u2'),
+    ('reflectivity', 'u1'),
+    ('tag', 'u1'),
+])
+
+# Mirrors LivoxLidarImuRawPoint.fmt ('<ffffff'): gyro in rad/s, acc in g.
+IMU_DTYPE = np.dtype([
+    ('gyro_x', '<f4'),
+    ('gyro_y', '<f4'),
+    ('gyro_z', '<f4'),
+    ('acc_x', '<f4'),
+    ('acc_y', '<f4'),
+    ('acc_z', '<f4'),
+])
+IMU_DATA_TYPE = 0
+IMU_PACKET_SIZE = HEADER_SIZE + IMU_DTYPE.itemsize
+
+POINT_DTYPES = {
+    1: CARTESIAN_HIGH_DTYPE,
+    2: CARTESIAN_LOW_DTYPE,
+    3: SPHERICAL_DTYPE,
+}
+
+# Points per packet for each data type, capped by the datagram size.
+DOTS_PER_PACKET = {
+    data_type: min(POINTCLOUDDATAMAX, (MAXLEN - HEADER_SIZE) // dt.itemsize)
+    for data_type, dt in POINT_DTYPES.items()
+}
+
+_packet_dtypes = {}
+
+def packet_dtype(point_dtype, dot_num):
+    key = (point_dtype, dot_num)
+    dt = _packet_dtypes.get(key)
+    if dt is None:
+        dt = np.dtype([('header', HEADER_DTYPE), ('points', point_dtype, (dot_num,))])
+        _packet_dtypes[key] = dt
+    return dt
+
+
+def split_points(points):
+    # Accepts an (N, 3..5) numeric array of x, y, z[, reflectivity[, tag]] or a
+    # structured array with x/y/z and optional reflectivity (or intensity)/tag.
+    points = np.asarray(points)
+    names = points.dtype.names
+    if names:
+        x, y, z = points['x'], points['y'], points['z']
+        if 'reflectivity' in names:
+            refl = points['reflectivity']
+        elif 'intensity' in names:
+            refl = points['intensity']
+        else:
+            refl = 0
+        tag = points['tag'] if 'tag' in names else 0
+    else:
+        if points.ndim != 2 or points.shape[1] < 3:
+            raise ValueError(f"Expected (N, 3..5) point array, got shape {points.shape}")
+        x, y, z = points[:, 0], points[:, 1], points[:, 2]
+        refl = points[:, 3] if points.shape[1] > 3 else 0
+        tag = points[:, 4] if points.shape[1] > 4 else 0
+    return x, y, z, refl, tag
+
+
+def _to_int(values, scale, lo, hi, dtype):
+    values = np.asarray(values)
+    if scale != 1 or values.dtype.kind == 'f':
+        values = np.rint(values * scale)
+    return np.clip(values, lo, hi).astype(dtype, copy=False)
+
+
+def _fill_common(out, refl, tag):
+    out['reflectivity'] = _to_int(refl, 1, 0, 255, np.uint8)
+    out['tag'] = np.asarray(tag).astype(np.uint8, copy=False)
+    return out
+
+
+def encode_cartesian_high(points, scale=1.0):
+    # scale converts the input unit to millimetres, which is the wire unit.
+    x, y, z, refl, tag = split_points(points)
+    out = np.empty(len(x), CARTESIAN_HIGH_DTYPE)
+    out['x'] = _to_int(x, scale, -2147483648, 2147483647, np.int32)
+    out['y'] = _to_int(y, scale, -2147483648, 2147483647, np.int32)
+    out['z'] = _to_int(z, scale, -2147483648, 2147483647, np.int32)
+    return _fill_common(out, refl, tag)
+
+
+def encode_cartesian_low(points, scale=1.0):
+    # scale converts the input unit to millimetres; the wire unit is cm.
+    x, y, z, refl, tag = split_points(points)
+    out = np.empty(len(x), CARTESIAN_LOW_DTYPE)
+    s = scale / 10.0
+    out['x'] = _to_int(x, s, -32768, 32767, np.int16)
+    out['y'] = _to_int(y, s, -32768, 32767, np.int16)
+    out['z'] = _to_int(z, s, -32768, 32767, np.int16)
+    return _fill_common(out, refl, tag)
+
+
+def encode_spherical(points, scale=1.0):
+    x, y, z, refl, tag = split_points(points)
+    x = np.asarray(x, dtype=np.float64) * scale
+    y = np.asarray(y, dtype=np.float64) * scale
+    z = np.asarray(z, dtype=np.float64) * scale
+    depth = np.sqrt(x * x + y * y + z * z)
+    with np.errstate(invalid='ignore', divide='ignore'):
+        theta = np.degrees(np.arccos(np.clip(np.where(depth > 0, z / depth, 1.0), -1.0, 1.0)))
+    phi = np.degrees(np.arctan2(y, x)) % 360.0
+    out = np.empty(len(x), SPHERICAL_DTYPE)
+    out['depth'] = _to_int(depth, 1, 0, 4294967295, np.uint32)
+    out['theta'] = _to_int(theta, 100, 0, 18000, np.uint16)
+    out['phi'] = _to_int(phi, 100, 0, 35999, np.uint16)
+    return _fill_common(out, refl, tag)
+
+
+POINT_ENCODERS = {
+    1: encode_cartesian_high,
+    2: encode_cartesian_low,
+    3: encode_spherical,
+}
+
+def encode_points(points, data_type=2, scale=1.0):
+    encoder = POINT_ENCODERS.get(data_type)
+    if encoder is None:
+        raise ValueError(f"Unsupported point data type: {data_type}")
+    return encoder(points, scale)
+
+
+def _write_packets(flat, stride, encoded, dot_num, udp_cnt, frame_cnt, timestamp,
+                   time_interval, time_type, data_type):
+    # Writes packets whose starts are stride bytes apart into the flat uint8
+    # buffer and returns their lengths. Only the last packet may be short.
+    n = len(encoded)
+    n_full, rem = divmod(n, dot_num)
+    n_pkts = n_full + (1 if rem else 0)
+    point_size = encoded.dtype.itemsize
+
+    lengths = np.full(n_pkts, HEADER_SIZE + dot_num * point_size, np.int64)
+    counts = np.full(n_pkts, dot_num, np.int64)
+    if rem:
+        lengths[-1] = HEADER_SIZE + rem * point_size
+        counts[-1] = rem
+
+    headers = np.zeros(n_pkts, HEADER_DTYPE)
+    headers['length'] = lengths
+    headers['time_interval'] = time_interval
+    headers['dot_num'] = counts
+    headers['udp_cnt'] = (udp_cnt + np.arange(n_pkts)) & 0xFFFF
+    headers['frame_cnt'] = frame_cnt & 0xFF
+    headers['data_type'] = data_type
+    headers['time_type'] = time_type
+    headers['timestamp'] = timestamp
+
+    if n_full:
+        full = np.ndarray((n_full,), packet_dtype(encoded.dtype, dot_num), buffer=flat, strides=(stride,))
+        full['header'] = headers[:n_full]
+        full['points'] = encoded[:n_full * dot_num].reshape(n_full, dot_num)
+    if rem:
+        tail = flat[n_full * stride:n_full * stride + lengths[-1]].view(packet_dtype(encoded.dtype, rem))
+        tail['header'] = headers[n_full:]
+        tail['points'] = encoded[n_full * dot_num:].reshape(1, rem)
+
+    # The crc32 fields form a single strided view into the buffer.
+    crc_field = np.ndarray((n_pkts,), '<u4', buffer=flat,
+                           offset=HEADER_DTYPE.fields['crc32'][1], strides=(stride,))
+    mv = memoryview(flat)
+    t0 = time.perf_counter_ns()
+    crc_field[:] = [calculate_crc32(mv[start + CRC32_OFFSET:start + length])
+                    for start, length in zip(range(0, n_pkts * stride, stride), lengths.tolist())]
+    PACKET_CRC.record(time.perf_counter_ns() - t0)
+    return lengths
+
+
+def encode_packets(points, udp_cnt=0, frame_cnt=0, timestamp=0, time_interval=0,
+                   time_type=0, scale=1.0, data_type=2, dot_num=None):
+    # Packetizes a whole frame in one pass. Returns a contiguous uint8 buffer
+    # holding every LivoxLidarEthernetPacket back to back, plus an offsets
+    # array of len(packets) + 1 so packet i is buf[offsets[i]:offsets[i + 1]].
+    encoded = encode_points(points, data_type, scale)
+    if dot_num is None:
+        dot_num = DOTS_PER_PACKET[data_type]
+    if len(encoded) == 0:
+        return np.zeros(0, np.uint8), np.zeros(1, np.int64)
+
+    n_pkts = -(-len(encoded) // dot_num)
+    stride = HEADER_SIZE + dot_num * encoded.dtype.itemsize
+    buf = np.zeros((n_pkts - 1) * stride + HEADER_SIZE + (len(encoded) - (n_pkts - 1) * dot_num) * encoded.dtype.itemsize, np.uint8)
+    lengths = _write_packets(buf, stride, encoded, dot_num, udp_cnt, frame_cnt, timestamp,
+                             time_interval, time_type, data_type)
+    offsets = np.zeros(n_pkts + 1, np.int64)
+    np.cumsum(lengths, out=offsets[1:])
+    return buf, offsets
+
+
+def shift_timestamps(slots, rows, lengths, delta_ns):
+    # Moves the timestamp of the packets in rows of the 2-D slots array by
+    # delta_ns and refreshes their CRC32, e.g. to restamp queued packets
+    # after a pause. lengths gives each listed packet's length.
+    rows = np.asarray(rows, np.int64)
+    if len(rows) == 0:
+        return
+    stride = slots.shape[1]
+    headers = np.ndarray((slots.shape[0],), HEADER_DTYPE, buffer=slots, strides=(stride,))
+    timestamps = headers['timestamp']
+    timestamps[rows] = timestamps[rows] + np.uint64(delta_ns)
+    mv = memoryview(slots.reshape(-1))
+    headers['crc32'][rows] = [calculate_crc32(mv[start + CRC32_OFFSET:start + length])
+                              for start, length in zip((rows * stride).tolist(), np.asarray(lengths).tolist())]
+
+
+def encode_imu_packets_into(out, samples, udp_cnt=0, timestamp=0, time_type=0):
+    # One IMU packet per row of the (N, 6) gyro/acc samples, written into
+    # rows of out like encode_packets_into. Returns the packet lengths.
+    samples = np.asarray(samples)
+    if len(samples) == 0:
+        return np.zeros(0, np.int64)
+    if len(samples) > out.shape[0] or IMU_PACKET_SIZE > out.shape[1]:
+        raise ValueError(f"{len(samples)} IMU packets do not fit in output of shape {out.shape}")
+    encoded = np.empty(len(samples), IMU_DTYPE)
+    for i, name in enumerate(IMU_DTYPE.names):
+        encoded[name] = samples[:, i]
+    return _write_packets(out.reshape(-1), out.shape[1], encoded, 1, udp_cnt, 0, timestamp,
+                          0, time_type, IMU_DATA_TYPE)
+
+
+def encode_packets_into(out, points, udp_cnt=0, frame_cnt=0, timestamp=0, time_interval=0,
+                        time_type=0, scale=1.0, data_type=2, dot_num=None):
+    # Same as encode_packets, but writes packet i into row i of the
+    # preallocated 2-D uint8 array out (e.g. PacketRing slots) and returns
+    # the packet lengths. out must have a row for every packet.
+    encoded = encode_points(points, data_type, scale)
+    if dot_num is None:
+        dot_num = DOTS_PER_PACKET[data_type]
+    if len(encoded) == 0:
+        return np.zeros(0, np.int64)
+    n_pkts = -(-len(encoded) // dot_num)
+    if n_pkts > out.shape[0] or HEADER_SIZE + dot_num * encoded.dtype.itemsize > out.shape[1]:
+        raise ValueError(f"{n_pkts} packets do not fit in output of shape {out.shape}")
+    if not out.flags.c_contiguous:
+        raise ValueError("Output rows must be C-contiguous")
+    return _write_packets(out.reshape(-1), out.shape[1], encoded, dot_num, udp_cnt, frame_cnt,
+                          timestamp, time_interval, time_type, data_type)
@@ -13,6 +13,22 @@ class LivoxLidarDeviceType(Enum):
     kLivoxLidarTypeHAP = 15
     kLivoxLidarTypePA = 16
 
+class LivoxLidarWorkMode(Enum):
+    kLivoxLidarNormal = 0x01  # Sampling
+    kLivoxLidarWakeUp = 0x02  # Idle
+    kLivoxLidarSleep = 0x03  # Standby
+    kLivoxLidarError = 0x04
+    kLivoxLidarPowerOnSelfTest = 0x05
+    kLivoxLidarMotorStarting = 0x06
+    kLivoxLidarMotorStoping = 0x07
+    kLivoxLidarUpgrade = 0x08
+
+class LivoxLidarRetCode(Enum):
+    kLivoxLidarRetSuccess = 0x00
+    kLivoxLidarRetFailure = 0x01
+    kLivoxLidarRetNotPermitNow = 0x02
+    kLivoxLidarRetOutOfRange = 0x03
+
 class ParamKeyName(Enum):
     kKeyPclDataType = 0x0000
     kKeyPatternMode = 0x0001
@@ -0,0 +1,244 @@
+# lidar/imu.py
+import math
+import time
+import numpy as np
+from .config import IMU_RATE_HZ, IMU_BLOCK_SAMPLES, IMU_SOURCE, IMU_SYNTHETIC
+from .device import resolve_host_ip
+from .encoder import encode_imu_packets_into, shift_timestamps, IMU_DTYPE, IMU_PACKET_SIZE
+from .metrics import IMU_SEND
+from .timing import source_timestamps_ns
+from .transmit import PacketTransmitter
+from .log import get_logger, IMU
+
+log = get_logger(IMU)
+
+IMU_FIELDS = IMU_DTYPE.names
+TIMESTAMP_FIELDS = ('timestamp', 'time', 't')
+
+# IMU sources return blocks of samples as (offsets_ns, values): offsets
+# from the source's first sample and an (n, 6) float32 array of gyro x/y/z
+# in rad/s and acc x/y/z in g. An empty block means the source has ended.
+
+
+class SyntheticImu:
+    # A level sensor yawing back and forth and rolling gently, so both gyro
+    # and the gravity vector move. Never ends.
+
+    def __init__(self, yaw_rate=0.2, yaw_period=10.0, roll=0.05, roll_period=2.0,
+                 gyro_noise=0.002, acc_noise=0.01, seed=0):
+        self.yaw_rate = yaw_rate
+        self.yaw_period = yaw_period
+        self.roll = roll
+        self.roll_period = roll_period
+        self.gyro_noise = gyro_noise
+        self.acc_noise = acc_noise
+        self.rng = np.random.default_rng(seed)
+        self.index = 0
+
+    def read(self, n, period_ns):
+        offsets = np.rint((self.index + np.arange(n)) * period_ns).astype(np.int64)
+        self.index += n
+        t = offsets / 1e9
+        w_roll = 2 * math.pi / self.roll_period
+        roll = self.roll * np.sin(w_roll * t)
+
+        values = np.empty((n, 6), np.float32)
+        values[:, 0] = self.roll * w_roll * np.cos(w_roll * t)
+        values[:, 1] = 0.0
+        values[:, 2] = self.yaw_rate * np.sin(2 * math.pi / self.yaw_period * t)
+        values[:, 3] = 0.0
+        values[:, 4] = np.sin(roll)
+        values[:, 5] = np.cos(roll)
+        values[:, :3] += self.rng.normal(0, self.gyro_noise, (n, 3))
+        values[:, 3:] += self.rng.normal(0, self.acc_noise, (n, 3))
+        return offsets, values
+
+
+def _columns(names):
+    # Maps a CSV header or structured dtype onto (timestamp, six IMU fields).
+    names = [name.strip().lower() for name in names]
+    missing = [field for field in IMU_FIELDS if field not in names]
+    if missing:
+        return None
+    stamp = next((names.index(name) for name in TIMESTAMP_FIELDS if name in names), None)
+    return stamp, [names.index(field) for field in IMU_FIELDS]
+
+def load_imu_samples(path):
+    # Reads a CSV (optionally with a header naming gyro_x ... acc_z and a
+    # timestamp column) or a .npy array (structured, or N x 6 / N x 7 with
+    # the timestamp first). Returns (timestamps_ns or None, (N, 6) float32).
+    if path.lower().endswith('.npy'):
+        data = np.load(path)
+        if data.dtype.names:
+            cols = _columns(data.dtype.names)
+            if cols is None:
+                raise ValueError(f"{path}: structured IMU array needs fields {', '.join(IMU_FIELDS)}")
+            stamp, _ = cols
+            values = np.stack([data[field] for field in IMU_FIELDS], axis=1)
+            stamps = data[data.dtype.names[stamp]] if stamp is not None else None
+            return (source_timestamps_ns(stamps) if stamps is not None else None), values.astype(np.float32)
+        header = None
+    else:
+        with open(path) as f:
+            first = f.readline()
+        header = first.split(',') if any(c.isalpha() for c in first) else None
+        data = np.loadtxt(path, delimiter=',', skiprows=1 if header else 0, ndmin=2)
+
+    if header is not None:
+        cols = _columns(header)
+        if cols is None:
+            raise ValueError(f"{path}: IMU header needs columns {', '.join(IMU_FIELDS)}")
+        stamp, fields = cols
+    elif data.ndim == 2 and data.shape[1] in (6, 7):
+        stamp = 0 if data.shape[1] == 7 else None
+        fields = list(range(data.shape[1] - 6, data.shape[1]))
+    else:
+        raise ValueError(f"{path}: expected 6 or 7 IMU columns, got shape {data.shape}")
+    stamps = source_timestamps_ns(data[:, stamp]) if stamp is not None else None
+    return stamps, data[:, fields].astype(np.float32)
+
+
+class ImuFile:
+    # Replays recorded samples. Recorded timestamps keep their spacing,
+    # re-based onto the stream start; without them samples are period_ns
+    # apart.
+
+    def __init__(self, path):
+        self.path = path
+        self.timestamps, self.values = load_imu_samples(path)
+        self.index = 0
+        log.info("Opened IMU replay %s with %d samples%s", path, len(self.values),
+                 "" if self.timestamps is not None else " (no timestamps)")
+
+    def read(self, n, period_ns):
+        start, end = self.index, min(self.index + n, len(self.values))
+        self.index = end
+        if self.timestamps is not None:
+            offsets = self.timestamps[start:end] - self.timestamps[0]
+        else:
+            offsets = np.rint(np.arange(start, end) * period_ns).astype(np.int64)
+        return offsets, self.values[start:end]
+
+def open_imu_source(path=IMU_SOURCE, seed=0):
+    if path is None:
+        return SyntheticImu(seed=seed, **IMU_SYNTHETIC)
+    return ImuFile(path)
+
+
+class ImuStream:
+    # Sends one device's IMU packets from its IMU socket to the host in
+    # imu_host_ipcfg. Sample times are laid on the perf_counter_ns()
+    # timeline from start_ns, the same one the point streams are paced and
+    # stamped on, so IMU and point timestamps line up. Packets are encoded
+    # IMU_BLOCK_SAMPLES at a time and sent as each comes due.
+
+    def __init__(self, dev, source, rate=IMU_RATE_HZ, block=IMU_BLOCK_SAMPLES):
+        self.dev = dev
+        self.source = source
+        self.period_ns = 1e9 / rate
+        self.slots = np.zeros((block, IMU_PACKET_SIZE), np.uint8)
+        self.lengths = np.zeros(block, np.int64)
+        self.due = np.zeros(block, np.int64)
+        self.count = 0
+        self.next = 0
+        self.udp_cnt = 0
+        self.start_ns = None
+        self.finished = False
+        self.sent = 0
+        self.skipped = 0
+        self.paused_ns = 0
+        self._transmitter = None
+        self._flowing = True
+        self._paused_at = 0
+
+    def start(self, start_ns=None):
+        self.start_ns = time.perf_counter_ns() if start_ns is None else start_ns
+        self._fill()
+        self.flowing(self.start_ns)
+
+    def flowing(self, now_ns=None):
+        # Follows the device's IMU gate. On resuming, the sample timeline and
+        # the encoded but unsent packets move past the pause.
+        on = self.dev.work.imu.is_set()
+        if on != self._flowing:
+            now_ns = time.perf_counter_ns() if now_ns is None else now_ns
+            if on:
+                paused = now_ns - self._paused_at
+                self.start_ns += paused
+                self.due[self.next:self.count] += paused
+                rows = np.arange(self.next, self.count)
+                shift_timestamps(self.slots, rows, self.lengths[rows], paused)
+                self.paused_ns += paused
+            else:
+                self._paused_at = now_ns
+            self._flowing = on
+        return on
+
+    def _fill(self):
+        offsets, values = self.source.read(len(self.slots), self.period_ns)
+        n = len(values)
+        self.next = 0
+        self.count = n
+        if n == 0:
+            self.finished = True
+            return
+        clock = self.dev.clock
+        due = self.start_ns + offsets
+        # to_lidar_ns() is a fixed offset from perf_counter_ns().
+        timestamps = due + clock.to_lidar_ns(0)
+        self.lengths[:n] = encode_imu_packets_into(self.slots, values, self.udp_cnt, timestamps, clock.time_type())
+        self.due[:n] = due
+        self.udp_cnt = (self.udp_cnt + n) & 0xFFFF
+
+    def due_in_ns(self, now_ns=None):
+        # None once the source has ended or while paused.
+        if self.finished:
+            return None
+        now_ns = time.perf_counter_ns() if now_ns is None else now_ns
+        if not self.flowing(now_ns):
+            return None
+        return max(0, int(self.due[self.next]) - now_ns)
+
+    def transmitter(self):
+        # Follows the host address in imu_host_ipcfg as the host changes it.
+        sock = self.dev.imu_sock
+        if sock is None:
+            return None
+        cfg = self.dev.info.imu_host_ipcfg
+        dest = (resolve_host_ip(cfg.dest_ip), cfg.dest_port)
+        tx = self._transmitter
+        if tx is None or tx.sock is not sock or tx.dest != dest:
+            self._transmitter = tx = PacketTransmitter(sock, dest, metrics=IMU_SEND)
+            log.info("%s: IMU stream to %s:%d", self.dev.sn, *dest)
+        return tx
+
+    def send_due(self, now_ns=None):
+        # Sends every packet whose time has come; returns how many.
+        now_ns = time.perf_counter_ns() if now_ns is None else now_ns
+        total = 0
+        if not self.flowing(now_ns):
+            return 0
+        while not self.finished:
+            k = int(np.searchsorted(self.due[self.next:self.count], now_ns, 'right'))
+            if k == 0:
+                break
+            tx = self.transmitter() if self.dev.info.imu_data_en else None
+            if tx is not None:
+                offsets = np.arange(self.next, self.next + k) * IMU_PACKET_SIZE
+                if tx.send_packets(self.slots.reshape(-1), offsets, self.lengths[self.next:self.next + k]) >= 0:
+                    self.sent += k
+            else:
+                self.skipped += k
+            total += k
+            self.next += k
+            if self.next == self.count:
+                self._fill()
+        return total
+
+    def close(self):
+        log.info("%s: IMU stream sent %d packets, skipped %d (IMU disabled or no socket), paused %.1f s",
+                 self.dev.sn, self.sent, self.skipped, self.paused_ns / 1e9)
+
+
+def imu_streams(devices, path=IMU_SOURCE):
+    return [ImuStream(dev, open_imu_source(path, seed=dev.index)) for dev in devices]
@@ -0,0 +1,90 @@
+# lidar/log.py
+import logging
+import sys
+from .config import LOG_LEVEL, LOG_LEVELS, LOG_HEXDUMP, LOG_SAMPLE_EVERY, LOG_FORMAT
+from .utils import format_buffer
+
+# Subsystem loggers are children of 'lidar', so levels can be set per
+# subsystem or for the whole package. Messages use %-style arguments and
+# are only formatted if a handler will emit them.
+CMD = 'cmd'          # Control-port command handling
+PARAMS = 'params'    # Key-value parameter get/set
+DEVICE = 'device'    # Point socket and replay source setup
+REPLAY = 'replay'    # Point cloud producer/consumer loop
+IMU = 'imu'          # IMU sample source and stream
+TRANSMIT = 'transmit'
+RECEIVE = 'receive'  # Host-side point/IMU receiver
+METRICS = 'metrics'
+
+hexdump_enabled = LOG_HEXDUMP
+
+
+def get_logger(subsystem):
+    return logging.getLogger('lidar.' + subsystem)
+
+def configure(level=LOG_LEVEL, levels=None, stream=None):
+    root = logging.getLogger('lidar')
+    if not root.handlers:
+        handler = logging.StreamHandler(stream or sys.stderr)
+        handler.setFormatter(logging.Formatter(LOG_FORMAT))
+        root.addHandler(handler)
+        root.propagate = False
+    root.setLevel(level)
+    for subsystem, subsystem_level in (LOG_LEVELS if levels is None else levels).items():
+        get_logger(subsystem).setLevel(subsystem_level)
+
+def set_level(subsystem, level):
+    get_logger(subsystem).setLevel(level)
+
+def set_hexdump(enabled):
+    global hexdump_enabled
+    hexdump_enabled = enabled
+
+
+class _HexDump:
+    # Defers formatting until the record is emitted.
+    __slots__ = ('buf',)
+
+    def __init__(self, buf):
+        self.buf = buf
+
+    def __str__(self):
+        return format_buffer(self.buf)
+
+class _Hex:
+    __slots__ = ('buf',)
+
+    def __init__(self, buf):
+        self.buf = buf
+
+    def __str__(self):
+        return bytes(self.buf).hex()
+
+def lazy_hex(buf):
+    # For %s arguments: hex string built only if the record is emitted.
+    return _Hex(buf)
+
+def log_hexdump(logger, buf, msg, *args):
+    if hexdump_enabled and logger.isEnabledFor(logging.DEBUG):
+        logger.debug(msg + " (%d bytes):%s", *args, len(buf), _HexDump(bytes(buf)))
+
+
+class Sampler:
+    # Counts events and reports True on every Nth one when its logger would
+    # emit at level, so per-packet paths only pay for an increment.
+
+    def __init__(self, logger, every=LOG_SAMPLE_EVERY, level=logging.INFO):
+        self.logger = logger
+        self.every = every
+        self.level = level
+        self.count = 0
+        self.items = 0
+        self._next = every
+
+    def tick(self, items=1):
+        self.count += 1
+        self.items += items
+        if self.every <= 0 or self.count < self._next:
+            return False
+        self._next += self.every
+        return self.logger.isEnabledFor(self.level)
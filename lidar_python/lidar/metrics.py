@@ -0,0 +1,260 @@
+# lidar/metrics.py
+import atexit
+import math
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from .config import METRICS_HTTP_ADDR, METRICS_HTTP_PORT, METRICS_SUMMARY_AT_EXIT
+from .log import get_logger, METRICS
+
+log = get_logger(METRICS)
+
+# Metrics are updated once per batch, frame or command rather than per
+# point. Updates are not locked: each metric has one writer thread in
+# practice, and a rare lost increment is acceptable for monitoring.
+
+HIST_SUB_BITS = 7  # 2**(HIST_SUB_BITS - 1) buckets per power of two, <1.6% error
+HIST_MAX_VALUE = 1 << 40  # ~18 minutes in ns; larger values land in the top bucket
+SUMMARY_QUANTILES = (0.5, 0.9, 0.99, 0.999)
+
+_registry = {}
+_start_ns = time.perf_counter_ns()
+
+
+class Counter:
+    kind = 'counter'
+
+    def __init__(self, name, help):
+        self.name = name
+        self.help = help
+        self.value = 0
+
+    def add(self, n=1):
+        self.value += n
+
+    def samples(self):
+        yield self.name, '', self.value
+
+
+class Gauge:
+    # Reads its value from fn() at scrape time, so the hot path pays nothing.
+    kind = 'gauge'
+
+    def __init__(self, name, help, fn):
+        self.name = name
+        self.help = help
+        self.fn = fn
+
+    def samples(self):
+        yield self.name, '', self.fn()
+
+
+class Histogram:
+    # HdrHistogram-style log-linear buckets over integer values (ns by
+    # default): values below 2**HIST_SUB_BITS get one bucket each, and
+    # every power of two above that is split into 2**(HIST_SUB_BITS - 1)
+    # equal buckets. Exported as a Prometheus summary, scaled by unit.
+    kind = 'summary'
+
+    def __init__(self, name, help, unit=1e-9):
+        self.name = name
+        self.help = help
+        self.unit = unit
+        self.sub_count = 1 << HIST_SUB_BITS
+        self.half_count = self.sub_count >> 1
+        self.counts = [0] * (self._index(HIST_MAX_VALUE) + 1)
+        self.count = 0
+        self.sum = 0
+        self.min = None
+        self.max = 0
+
+    def _index(self, value):
+        if value < self.sub_count:
+            return value
+        shift = value.bit_length() - HIST_SUB_BITS
+        return self.sub_count + (shift - 1) * self.half_count + (value >> shift) - self.half_count
+
+    def _upper(self, index):
+        # Largest value that maps to bucket index.
+        if index < self.sub_count:
+            return index
+        shift, m = divmod(index - self.sub_count, self.half_count)
+        shift += 1
+        return ((m + self.half_count + 1) << shift) - 1
+
+    def record(self, value):
+        value = int(value)
+        if value < 0:
+            value = 0
+        self.counts[self._index(min(value, HIST_MAX_VALUE))] += 1
+        self.count += 1
+        self.sum += value
+        if value > self.max:
+            self.max = value
+        if self.min is None or value < self.min:
+            self.min = value
+
+    def reset(self):
+        self.counts = [0] * len(self.counts)
+        self.count = 0
+        self.sum = 0
+        self.min = None
+        self.max = 0
+
+    def quantile(self, q):
+        # Upper bound of the bucket holding the q-th value, capped at max.
+        if self.count == 0:
+            return 0
+        target = max(1, math.ceil(q * self.count))
+        seen = 0
+        for index, n in enumerate(self.counts):
+            seen += n
+            if seen >= target:
+                return min(self._upper(index), self.max)
+        return self.max
+
+    def mean(self):
+        return self.sum / self.count if self.count else 0.0
+
+    def samples(self):
+        for q in SUMMARY_QUANTILES:
+            yield self.name, f'{{quantile="{q}"}}', self.quantile(q) * self.unit
+        yield self.name + '_sum', '', self.sum * self.unit
+        yield self.name + '_count', '', self.count
+
+
+def _register(cls, name, *args):
+    metric = _registry.get(name)
+    if metric is None:
+        metric = cls(name, *args)
+        _registry[name] = metric
+    return metric
+
+class SendMetrics:
+    # The metrics a PacketTransmitter reports its flushes to, one set per
+    # kind of stream so IMU traffic does not skew point throughput.
+    __slots__ = ('packets', 'bytes', 'errors', 'drops', 'time')
+
+    def __init__(self, packets, bytes, errors, drops, time):
+        self.packets = packets
+        self.bytes = bytes
+        self.errors = errors
+        self.drops = drops
+        self.time = time
+
+
+def counter(name, help):
+    return _register(Counter, name, help)
+
+def histogram(name, help, unit=1e-9):
+    return _register(Histogram, name, help, unit)
+
+def gauge(name, help, fn):
+    # Re-registering a gauge rebinds it to the new fn.
+    metric = _register(Gauge, name, help, fn)
+    metric.fn = fn
+    return metric
+
+def get_metric(name):
+    return _registry.get(name)
+
+def render():
+    # Prometheus text exposition format, version 0.0.4.
+    lines = []
+    for metric in list(_registry.values()):
+        lines.append(f"# HELP {metric.name} {metric.help}")
+        lines.append(f"# TYPE {metric.name} {metric.kind}")
+        for name, labels, value in metric.samples():
+            lines.append(f"{name}{labels} {value}")
+    return '\n'.join(lines) + '\n'
+
+def summary():
+    uptime = (time.perf_counter_ns() - _start_ns) / 1e9
+    lines = [f"Metrics after {uptime:.1f} s:"]
+    for metric in list(_registry.values()):
+        if isinstance(metric, Counter):
+            lines.append(f"  {metric.name:40s} {metric.value:>14} ({metric.value / uptime if uptime else 0:.1f}/s)")
+        elif isinstance(metric, Histogram) and metric.count:
+            scale = metric.unit * 1e6
+            lines.append(f"  {metric.name:40s} n={metric.count} mean={metric.mean() * scale:.1f}us "
+                         f"p50={metric.quantile(0.5) * scale:.1f}us p99={metric.quantile(0.99) * scale:.1f}us "
+                         f"max={metric.max * scale:.1f}us")
+    return '\n'.join(lines)
+
+def log_summary():
+    log.info("%s", summary())
+
+
+class _MetricsHandler(BaseHTTPRequestHandler):
+    def do_GET(self):
+        if self.path.split('?', 1)[0] not in ('/', '/metrics'):
+            self.send_error(404)
+            return
+        body = render().encode('utf-8')
+        self.send_response(200)
+        self.send_header('Content-Type', 'text/plain; version=0.0.4; charset=utf-8')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        log.debug(format, *args)
+
+def start_http_server(addr=METRICS_HTTP_ADDR, port=METRICS_HTTP_PORT):
+    try:
+        server = ThreadingHTTPServer((addr, port), _MetricsHandler)
+    except OSError as e:
+        log.error("Failed to start metrics endpoint on %s:%d: %s", addr, port, e)
+        return None
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, name='metrics-http', daemon=True).start()
+    log.info("Serving metrics on http://%s:%d/metrics", *server.server_address)
+    return server
+
+def start(port=METRICS_HTTP_PORT, addr=METRICS_HTTP_ADDR, summary_at_exit=METRICS_SUMMARY_AT_EXIT):
+    server = start_http_server(addr, port) if port else None
+    if summary_at_exit:
+        atexit.register(log_summary)
+    return server
+
+
+# Command plane
+CMD_PACKETS = counter('lidar_cmd_packets_total', 'Command packets received')
+CMD_ERRORS = counter('lidar_cmd_errors_total', 'Command packets with unknown type or id')
+CMD_PARSE = histogram('lidar_cmd_parse_seconds', 'Time to parse a command packet header')
+CMD_CRC = histogram('lidar_cmd_crc_seconds', 'Time to compute CRCs of a command response')
+PUSH_PACKETS = counter('lidar_push_packets_total', 'State info push messages sent')
+CMD_HANDLE = histogram('lidar_cmd_handle_seconds', 'Time to handle a command packet, including the reply')
+
+# Point data plane
+ENCODED_POINTS = counter('lidar_encoded_points_total', 'Points encoded into packets')
+ENCODED_PACKETS = counter('lidar_encoded_packets_total', 'Point packets encoded')
+ENCODE_TIME = histogram('lidar_encode_seconds', 'Time to encode one frame of points into packets')
+PACKET_CRC = histogram('lidar_packet_crc_seconds', 'Time to compute CRC32 over one batch of point packets')
+SENT_PACKETS = counter('lidar_sent_packets_total', 'Point packets handed to the kernel')
+SENT_BYTES = counter('lidar_sent_bytes_total', 'Point packet bytes handed to the kernel')
+SEND_ERRORS = counter('lidar_send_errors_total', 'Point packets the kernel refused')
+SEND_DROPS = counter('lidar_send_dropped_total', 'Point packets dropped because the socket send buffer was full')
+PIPELINE_IN_POINTS = counter('lidar_pipeline_in_points_total', 'Points entering the point pipeline')
+PIPELINE_OUT_POINTS = counter('lidar_pipeline_out_points_total', 'Points the point pipeline passes on to the encoder')
+PIPELINE_CACHE_HITS = counter('lidar_pipeline_cache_hits_total', 'Looped replay frames served from the point pipeline cache')
+PIPELINE_TIME = histogram('lidar_pipeline_seconds', 'Time to run one frame through the point pipeline')
+SIM_FRAMES = counter('lidar_sim_frames_total', 'Frames handed over by a simulator through stream_frame()')
+SIM_DROPPED_FRAMES = counter('lidar_sim_dropped_frames_total', 'Simulator frames dropped because the sender fell behind')
+SEND_TIME = histogram('lidar_send_seconds', 'Time spent in one point packet sendmmsg()/sendto() batch flush')
+POINT_SEND = SendMetrics(SENT_PACKETS, SENT_BYTES, SEND_ERRORS, SEND_DROPS, SEND_TIME)
+
+# IMU data plane
+IMU_PACKETS = counter('lidar_imu_packets_total', 'IMU packets handed to the kernel')
+IMU_BYTES = counter('lidar_imu_sent_bytes_total', 'IMU packet bytes handed to the kernel')
+IMU_SEND_ERRORS = counter('lidar_imu_send_errors_total', 'IMU packets the kernel refused')
+IMU_SEND_DROPS = counter('lidar_imu_send_dropped_total', 'IMU packets dropped because the socket send buffer was full')
+IMU_SEND_TIME = histogram('lidar_imu_send_seconds', 'Time spent in one IMU packet sendmmsg()/sendto() batch flush')
+IMU_SEND = SendMetrics(IMU_PACKETS, IMU_BYTES, IMU_SEND_ERRORS, IMU_SEND_DROPS, IMU_SEND_TIME)
+
+# Host-side receiver
+RECV_PACKETS = counter('lidar_recv_packets_total', 'Datagrams received by the host receiver')
+RECV_BYTES = counter('lidar_recv_bytes_total', 'Datagram bytes received by the host receiver')
+RECV_INVALID = counter('lidar_recv_invalid_total', 'Received packets dropped for bad length or CRC32')
+RECV_LOST = counter('lidar_recv_lost_total', 'Packets missing from the received udp_cnt sequence')
+RECV_FRAMES = counter('lidar_recv_frames_total', 'Point frames assembled by the host receiver')
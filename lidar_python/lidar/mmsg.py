@@ -0,0 +1,56 @@
+# lidar/mmsg.py
+import ctypes
+import ctypes.util
+
+# ctypes layouts of the Linux structures behind sendmmsg() and recvmmsg(),
+# shared by the transmitter and the receiver, and the two libc calls
+# themselves; each is None where libc lacks it (e.g. macOS), and callers
+# fall back to one sendto()/recv_into() per datagram.
+
+
+class iovec(ctypes.Structure):
+    _fields_ = [
+        ('iov_base', ctypes.c_void_p),
+        ('iov_len', ctypes.c_size_t),
+    ]
+
+class msghdr(ctypes.Structure):
+    _fields_ = [
+        ('msg_name', ctypes.c_void_p),
+        ('msg_namelen', ctypes.c_uint32),
+        ('msg_iov', ctypes.POINTER(iovec)),
+        ('msg_iovlen', ctypes.c_size_t),
+        ('msg_control', ctypes.c_void_p),
+        ('msg_controllen', ctypes.c_size_t),
+        ('msg_flags', ctypes.c_int),
+    ]
+
+class mmsghdr(ctypes.Structure):
+    _fields_ = [
+        ('msg_hdr', msghdr),
+        ('msg_len', ctypes.c_uint),
+    ]
+
+class sockaddr_in(ctypes.Structure):
+    _fields_ = [
+        ('sin_family', ctypes.c_ushort),
+        ('sin_port', ctypes.c_ubyte * 2),
+        ('sin_addr', ctypes.c_ubyte * 4),
+        ('sin_zero', ctypes.c_ubyte * 8),
+    ]
+
+
+def _load(name, argtypes):
+    try:
+        libc = ctypes.CDLL(ctypes.util.find_library('c'), use_errno=True)
+        fn = getattr(libc, name)
+    except (OSError, AttributeError, TypeError):
+        return None
+    fn.argtypes = argtypes
+    fn.restype = ctypes.c_int
+    return fn
+
+# int sendmmsg(int fd, struct mmsghdr *msgvec, unsigned int vlen, int flags)
+sendmmsg = _load('sendmmsg', [ctypes.c_int, ctypes.c_void_p, ctypes.c_uint, ctypes.c_int])
+# int recvmmsg(int fd, struct mmsghdr *msgvec, unsigned int vlen, int flags, struct timespec *timeout)
+recvmmsg = _load('recvmmsg', [ctypes.c_int, ctypes.c_void_p, ctypes.c_uint, ctypes.c_int, ctypes.c_void_p])
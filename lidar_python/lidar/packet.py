@@ -1,9 +1,27 @@
+import functools
 import struct
 import socket
+from struct import Struct
 from .config import LIDAR_DEVICE_IP, LIDAR_DEVICE_MASK, LIDAR_DEVICE_GATEWAY, LIDAR_HOST_IP, DEVICE_MAC, point_data_port_device, point_data_port_host, push_cmd_port_device, push_cmd_port_host, imu_data_port_device, imu_data_port_host, log_data_port_device, log_data_port_host, LIDAR_DEVICE_SN
 
+# Every class keeps its format string in fmt and a precompiled Struct in
+# _struct. pack_into()/unpack_from() work on any writable buffer/memoryview
+# at an offset so headers can be written straight into send buffers.
+
+_U32_BE = Struct('!L')
+
+
+@functools.lru_cache(maxsize=64)
+def _key_list_struct(key_num):
+    # Key lists vary in length, so their Structs are compiled on first use.
+    return Struct(f'<{key_num}H')
+
+
 class LivoxLidarInfo:
-    fmt = 'B16s16s'  # Define the format string for struct packing/unpacking
+    __slots__ = ('dev_type', 'sn', 'lidar_ip')
+    fmt = 'B16s16s'
+    _struct = Struct(fmt)
+    size = _struct.size
 
     def __init__(self, dev_type, sn, lidar_ip):
         self.dev_type = dev_type
@@ -11,15 +29,26 @@ class LivoxLidarInfo:
         self.lidar_ip = lidar_ip
 
     def pack(self):
-        return struct.pack(self.fmt, self.dev_type, self.sn.encode('utf-8'), self.lidar_ip.encode('utf-8'))
+        return self._struct.pack(self.dev_type, self.sn.encode('utf-8'), self.lidar_ip.encode('utf-8'))
+
+    def pack_into(self, buffer, offset=0):
+        self._struct.pack_into(buffer, offset, self.dev_type, self.sn.encode('utf-8'), self.lidar_ip.encode('utf-8'))
+        return self.size
 
     @classmethod
     def unpack(cls, data):
-        dev_type, sn, lidar_ip = struct.unpack(cls.fmt, data)
+        return cls.unpack_from(data)
+
+    @classmethod
+    def unpack_from(cls, buffer, offset=0):
+        dev_type, sn, lidar_ip = cls._struct.unpack_from(buffer, offset)
         return cls(dev_type, sn.decode('utf-8').strip('\x00'), lidar_ip.decode('utf-8').strip('\x00'))
 
 class LivoxLidarDeviceAck:
+    __slots__ = ('ret_code', 'dev_type', 'sn', 'lidar_ip', 'cmd_port')
     fmt = '<BB16s4sH'
+    _struct = Struct(fmt)
+    size = _struct.size
 
     def __init__(self, ret_code, dev_type, sn, lidar_ip, cmd_port):
         self.ret_code = ret_code
@@ -29,35 +58,48 @@ class LivoxLidarDeviceAck:
         self.cmd_port = cmd_port
 
     def pack(self):
-        return struct.pack(self.fmt, self.ret_code, self.dev_type, self.sn[:16], struct.pack("!L", self.lidar_ip), self.cmd_port)
+        return self._struct.pack(self.ret_code, self.dev_type, self.sn[:16], _U32_BE.pack(self.lidar_ip), self.cmd_port)
+
+    def pack_into(self, buffer, offset=0):
+        self._struct.pack_into(buffer, offset, self.ret_code, self.dev_type, self.sn[:16], _U32_BE.pack(self.lidar_ip), self.cmd_port)
+        return self.size
 
     @classmethod
     def unpack(cls, buffer):
-        ret_code, dev_type, sn, lidar_ip_packed, cmd_port = struct.unpack(cls.fmt, buffer)
+        return cls.unpack_from(buffer)
+
+    @classmethod
+    def unpack_from(cls, buffer, offset=0):
+        ret_code, dev_type, sn, lidar_ip_packed, cmd_port = cls._struct.unpack_from(buffer, offset)
         sn = sn.decode('utf-8').rstrip('\x00')
-        lidar_ip = struct.unpack("!L", socket.inet_ntoa(lidar_ip_packed).encode('utf-8'))[0]
+        lidar_ip = _U32_BE.unpack(lidar_ip_packed)[0]
         return cls(ret_code, dev_type, sn, lidar_ip, cmd_port)
 
 
 class LivoxLidarParamInquire:
+    __slots__ = ('key_num', 'key_list')
+    _key = Struct('<H')
+
     def __init__(self, key_num, key_list):
         self.key_num = key_num
         self.key_list = key_list
 
     @staticmethod
     def unpack(buffer):
-        key_num, = struct.unpack_from('<H', buffer, 0)
-        key_list = []
-        offset = 4
-        for _ in range(key_num):
-            key, = struct.unpack_from('<H', buffer, offset)
-            key_list.append(key)
-            offset += 2
+        return LivoxLidarParamInquire.unpack_from(buffer)
+
+    @staticmethod
+    def unpack_from(buffer, offset=0):
+        key_num, = LivoxLidarParamInquire._key.unpack_from(buffer, offset)
+        key_list = list(_key_list_struct(key_num).unpack_from(buffer, offset + 4))
         return LivoxLidarParamInquire(key_num, key_list)
 
 
 class LivoxLidarParamInquireAck:
+    __slots__ = ('ret_code', 'key_num', 'key_value_list')
     fmt = "BHH"
+    _struct = Struct(fmt)
+    size = _struct.size
 
     def __init__(self, ret_code, key_num, key_value_list):
         self.ret_code = ret_code
@@ -65,11 +107,18 @@ class LivoxLidarParamInquireAck:
         self.key_value_list = key_value_list
 
     def pack(self):
-        return struct.pack(self.fmt, self.ret_code, self.key_num, self.key_value_list)
+        return self._struct.pack(self.ret_code, self.key_num, self.key_value_list)
+
+    def pack_into(self, buffer, offset=0):
+        self._struct.pack_into(buffer, offset, self.ret_code, self.key_num, self.key_value_list)
+        return self.size
 
 
 class LivoxLidarParamConfig:
+    __slots__ = ('key_num', 'rsvd', 'key_list')
     fmt = "HH"
+    _struct = Struct(fmt)
+    size = _struct.size
 
     def __init__(self, key_num, rsvd, key_list):
         self.key_num = key_num
@@ -77,36 +126,61 @@ class LivoxLidarParamConfig:
         self.key_list = key_list
 
     def pack(self):
-        return struct.pack(self.fmt, self.key_num, self.rsvd) + b''.join([param.pack() for param in self.key_list])
+        return self._struct.pack(self.key_num, self.rsvd) + b''.join([param.pack() for param in self.key_list])
+
+    def pack_into(self, buffer, offset=0):
+        self._struct.pack_into(buffer, offset, self.key_num, self.rsvd)
+        pos = offset + self.size
+        for param in self.key_list:
+            pos += param.pack_into(buffer, pos)
+        return pos - offset
 
     @classmethod
     def unpack(cls, data):
-        key_num, rsvd = struct.unpack(cls.fmt, data[:struct.calcsize(cls.fmt)])
+        return cls.unpack_from(data)
+
+    @classmethod
+    def unpack_from(cls, buffer, offset=0):
+        key_num, rsvd = cls._struct.unpack_from(buffer, offset)
         key_list = []
-        offset = struct.calcsize(cls.fmt)
+        offset += cls.size
         for _ in range(key_num):
-            param = LivoxLidarKeyValueParam.unpack(data[offset:])
+            param = LivoxLidarKeyValueParam.unpack_from(buffer, offset)
             key_list.append(param)
-            offset += struct.calcsize(LivoxLidarKeyValueParam.fmt) + param.length
+            offset += LivoxLidarKeyValueParam.size + param.length
         return cls(key_num, rsvd, key_list)
 
 class LivoxLidarAsyncControlResponse:
+    __slots__ = ('ret_code', 'error_key')
     fmt = "BH"
+    _struct = Struct(fmt)
+    size = _struct.size
 
     def __init__(self, ret_code, error_key):
         self.ret_code = ret_code
         self.error_key = error_key
 
     def pack(self):
-        return struct.pack(self.fmt, self.ret_code, self.error_key)
+        return self._struct.pack(self.ret_code, self.error_key)
+
+    def pack_into(self, buffer, offset=0):
+        self._struct.pack_into(buffer, offset, self.ret_code, self.error_key)
+        return self.size
 
     @classmethod
     def unpack(cls, data):
-        return cls(*struct.unpack(cls.fmt, data[:struct.calcsize(cls.fmt)]))
+        return cls.unpack_from(data)
+
+    @classmethod
+    def unpack_from(cls, buffer, offset=0):
+        return cls(*cls._struct.unpack_from(buffer, offset))
 
 
 class LivoxLidarKeyValueParam:
+    __slots__ = ('key', 'length', 'value')
     fmt = "HH"
+    _struct = Struct(fmt)
+    size = _struct.size
 
     def __init__(self, key, length, value):
         self.key = key
@@ -114,20 +188,35 @@ class LivoxLidarKeyValueParam:
         self.value = value
 
     def pack(self):
-        return struct.pack(self.fmt, self.key, self.length) + self.value
+        return self._struct.pack(self.key, self.length) + self.value
+
+    def pack_into(self, buffer, offset=0):
+        self._struct.pack_into(buffer, offset, self.key, self.length)
+        end = offset + self.size + len(self.value)
+        buffer[offset + self.size:end] = self.value
+        return end - offset
 
     @classmethod
     def unpack(cls, data):
-        if len(data) < struct.calcsize(cls.fmt):
+        return cls.unpack_from(data)
+
+    @classmethod
+    def unpack_from(cls, buffer, offset=0):
+        # value is a slice of buffer, so a memoryview input is not copied.
+        if len(buffer) - offset < cls.size:
             raise ValueError("Data too short to unpack header")
-        key, length = struct.unpack(cls.fmt, data[:struct.calcsize(cls.fmt)])
-        if len(data) < struct.calcsize(cls.fmt) + length:
+        key, length = cls._struct.unpack_from(buffer, offset)
+        start = offset + cls.size
+        if len(buffer) < start + length:
             raise ValueError("Data too short to unpack value")
-        value = data[struct.calcsize(cls.fmt):struct.calcsize(cls.fmt) + length]
-        return cls(key, length, value)
+        return cls(key, length, buffer[start:start + length])
 
 class LivoxLidarEthernetPacket:
+    __slots__ = ('version', 'length', 'time_interval', 'dot_num', 'udp_cnt', 'frame_cnt',
+                 'data_type', 'time_type', 'rsvd', 'crc32', 'timestamp', 'data')
     fmt = '<BHHHHBBB12sLQ'
+    _struct = Struct(fmt)
+    size = _struct.size
 
     def __init__(self, version, length, time_interval, dot_num, udp_cnt, frame_cnt, data_type, time_type, rsvd, crc32, timestamp, data):
         self.version = version & 0xFF
@@ -144,19 +233,29 @@ class LivoxLidarEthernetPacket:
         self.data = data
 
     def pack(self):
-        header = struct.pack(self.fmt, self.version, self.length, self.time_interval, self.dot_num, self.udp_cnt, self.frame_cnt, self.data_type, self.time_type, self.rsvd, self.crc32, self.timestamp)
-        return header 
+        # Header only; the point data follows it on the wire.
+        return self._struct.pack(self.version, self.length, self.time_interval, self.dot_num, self.udp_cnt, self.frame_cnt,
+                                 self.data_type, self.time_type, self.rsvd, self.crc32, self.timestamp)
+
+    def pack_into(self, buffer, offset=0):
+        self._struct.pack_into(buffer, offset, self.version, self.length, self.time_interval, self.dot_num, self.udp_cnt,
+                               self.frame_cnt, self.data_type, self.time_type, self.rsvd, self.crc32, self.timestamp)
+        return self.size
 
     @classmethod
     def unpack(cls, buffer):
-        header_size = struct.calcsize(cls.fmt)
-        header = buffer[:header_size]
-        data = buffer[header_size:]
-        unpacked_data = struct.unpack(cls.fmt, header)
-        return cls(*unpacked_data, data)
+        return cls.unpack_from(buffer)
+
+    @classmethod
+    def unpack_from(cls, buffer, offset=0):
+        return cls(*cls._struct.unpack_from(buffer, offset), buffer[offset + cls.size:])
 
 class LivoxLidarCmdPacket:
+    __slots__ = ('sof', 'version', 'length', 'seq_num', 'cmd_id', 'cmd_type', 'sender_type',
+                 'rsvd', 'crc16_h', 'crc32_d', 'data')
     fmt = '<BBHLHBB6sHL'
+    _struct = Struct(fmt)
+    size = _struct.size
 
     def __init__(self, sof, version, length, seq_num, cmd_id, cmd_type, sender_type, rsvd, crc16_h, crc32_d, data):
         self.sof = sof
@@ -172,19 +271,50 @@ class LivoxLidarCmdPacket:
         self.data = data
 
     def pack(self):
-        header = struct.pack(self.fmt, self.sof, self.version, self.length, self.seq_num, self.cmd_id, self.cmd_type, self.sender_type, self.rsvd, self.crc16_h, self.crc32_d)
-        return header + self.data
+        return self._struct.pack(self.sof, self.version, self.length, self.seq_num, self.cmd_id, self.cmd_type,
+                                 self.sender_type, self.rsvd, self.crc16_h, self.crc32_d) + self.data
+
+    def pack_into(self, buffer, offset=0):
+        # Writes header and data; returns the number of bytes written.
+        self._struct.pack_into(buffer, offset, self.sof, self.version, self.length, self.seq_num, self.cmd_id,
+                               self.cmd_type, self.sender_type, self.rsvd, self.crc16_h, self.crc32_d)
+        end = offset + self.size + len(self.data)
+        buffer[offset + self.size:end] = self.data
+        return end - offset
 
     @staticmethod
     def unpack(buffer):
-        if len(buffer) < struct.calcsize(LivoxLidarCmdPacket.fmt):
-            raise ValueError(f"Buffer too short to unpack: length {len(buffer)}")
-        unpacked = struct.unpack_from(LivoxLidarCmdPacket.fmt, buffer)
-        data = buffer[struct.calcsize(LivoxLidarCmdPacket.fmt):]
-        return LivoxLidarCmdPacket(*unpacked, data)
+        return LivoxLidarCmdPacket.unpack_from(buffer)
+
+    @staticmethod
+    def unpack_from(buffer, offset=0, length=None):
+        # data is a slice of buffer up to offset + length (or its end).
+        end = len(buffer) if length is None else offset + length
+        if end - offset < LivoxLidarCmdPacket.size:
+            raise ValueError(f"Buffer too short to unpack: length {end - offset}")
+        unpacked = LivoxLidarCmdPacket._struct.unpack_from(buffer, offset)
+        return LivoxLidarCmdPacket(*unpacked, buffer[offset + LivoxLidarCmdPacket.size:end])
+
+class _RawPoint:
+    __slots__ = ()
+
+    def pack_into(self, buffer, offset=0):
+        buffer[offset:offset + self.size] = self.pack()
+        return self.size
+
+    @classmethod
+    def unpack(cls, data):
+        return cls.unpack_from(data)
+
+    @classmethod
+    def unpack_from(cls, buffer, offset=0):
+        return cls(*cls._struct.unpack_from(buffer, offset))
 
-class LivoxLidarCartesianHighRawPoint:
-    fmt = "iiiBB"
+class LivoxLidarCartesianHighRawPoint(_RawPoint):
+    __slots__ = ('x', 'y', 'z', 'reflectivity', 'tag')
+    fmt = "<iiiBB"
+    _struct = Struct(fmt)
+    size = _struct.size
 
     def __init__(self, x, y, z, reflectivity, tag=0):
         self.x = x
@@ -194,16 +324,18 @@ class LivoxLidarCartesianHighRawPoint:
         self.tag = tag
 
     def pack(self):
-        return struct.pack(self.fmt, self.x, self.y, self.z, self.reflectivity, self.tag)
+        return self._struct.pack(self.x, self.y, self.z, self.reflectivity, self.tag)
 
-    @classmethod
-    def unpack(cls, data):
-        unpacked_data = struct.unpack(cls.fmt, data[:struct.calcsize(cls.fmt)])
-        return cls(*unpacked_data)
+    def pack_into(self, buffer, offset=0):
+        self._struct.pack_into(buffer, offset, self.x, self.y, self.z, self.reflectivity, self.tag)
+        return self.size
 
 
-class LivoxLidarCartesianLowRawPoint:
+class LivoxLidarCartesianLowRawPoint(_RawPoint):
+    __slots__ = ('x', 'y', 'z', 'reflectivity', 'tag')
     fmt = '<hhhBB'  # Ensure little-endian format with 'hhhBB'
+    _struct = Struct(fmt)
+    size = _struct.size
 
     def __init__(self, x, y, z, reflectivity, tag):
         self.x = x
@@ -212,56 +344,110 @@ class LivoxLidarCartesianLowRawPoint:
         self.reflectivity = reflectivity
         self.tag = tag
 
+    def _clamped(self):
+        return (max(-32768, min(32767, self.x)),
+                max(-32768, min(32767, self.y)),
+                max(-32768, min(32767, self.z)),
+                max(0, min(255, self.reflectivity)),
+                self.tag)
+
     def pack(self):
-        x = max(-32768, min(32767, self.x))
-        y = max(-32768, min(32767, self.y))
-        z = max(-32768, min(32767, self.z))
-        reflectivity = max(0, min(255, self.reflectivity))
-        return struct.pack(self.fmt, x, y, z, reflectivity, self.tag)
+        return self._struct.pack(*self._clamped())
 
-    @classmethod
-    def unpack(cls, buffer):
-        unpacked_data = struct.unpack(cls.fmt, buffer)
-        return cls(*unpacked_data)
+    def pack_into(self, buffer, offset=0):
+        self._struct.pack_into(buffer, offset, *self._clamped())
+        return self.size
 
     def __str__(self):
         return f"({self.x}, {self.y}, {self.z}, :{self.reflectivity}, :{self.tag})"
 
-class ip_mask_gw_info:
+class LivoxLidarSpherPoint(_RawPoint):
+    __slots__ = ('depth', 'theta', 'phi', 'reflectivity', 'tag')
+    fmt = '<IHHBB'
+    _struct = Struct(fmt)
+    size = _struct.size
+
+    def __init__(self, depth, theta, phi, reflectivity, tag=0):
+        self.depth = depth
+        self.theta = theta
+        self.phi = phi
+        self.reflectivity = reflectivity
+        self.tag = tag
+
+    def pack(self):
+        return self._struct.pack(self.depth, self.theta, self.phi, self.reflectivity, self.tag)
+
+class LivoxLidarImuRawPoint(_RawPoint):
+    # Gyro in rad/s, acceleration in g.
+    __slots__ = ('gyro_x', 'gyro_y', 'gyro_z', 'acc_x', 'acc_y', 'acc_z')
+    fmt = '<ffffff'
+    _struct = Struct(fmt)
+    size = _struct.size
+
+    def __init__(self, gyro_x, gyro_y, gyro_z, acc_x, acc_y, acc_z):
+        self.gyro_x = gyro_x
+        self.gyro_y = gyro_y
+        self.gyro_z = gyro_z
+        self.acc_x = acc_x
+        self.acc_y = acc_y
+        self.acc_z = acc_z
+
+    def pack(self):
+        return self._struct.pack(self.gyro_x, self.gyro_y, self.gyro_z, self.acc_x, self.acc_y, self.acc_z)
+
+class _Record:
+    # Fixed-layout records whose _fields() map 1:1 onto _struct.
+    __slots__ = ()
+
+    def pack(self):
+        return self._struct.pack(*self._fields())
+
+    def pack_into(self, buffer, offset=0):
+        self._struct.pack_into(buffer, offset, *self._fields())
+        return self.size
+
+    @classmethod
+    def unpack(cls, buffer):
+        return cls(*cls._struct.unpack(buffer))
+
+    @classmethod
+    def unpack_from(cls, buffer, offset=0):
+        return cls(*cls._struct.unpack_from(buffer, offset))
+
+class ip_mask_gw_info(_Record):
+    __slots__ = ('ip', 'mask', 'gateway')
     fmt = '!III'
+    _struct = Struct(fmt)
+    size = _struct.size
 
     def __init__(self, ip, mask, gateway):
         self.ip = ip
         self.mask = mask
         self.gateway = gateway
 
-    def pack(self):
-        return struct.pack(self.fmt, self.ip, self.mask, self.gateway)
+    def _fields(self):
+        return (self.ip, self.mask, self.gateway)
 
-    @classmethod
-    def unpack(cls, buffer):
-        return cls(*struct.unpack(cls.fmt, buffer))
 
-
-class ip_ports_info:
+class ip_ports_info(_Record):
+    __slots__ = ('dest_ip', 'dest_port', 'src_port')
     fmt = 'IHH'
+    _struct = Struct(fmt)
+    size = _struct.size
 
     def __init__(self, dest_ip, dest_port, src_port):
         self.dest_ip = dest_ip
         self.dest_port = dest_port
         self.src_port = src_port
 
-    def pack(self):
-        packed_data = struct.pack(self.fmt, self.dest_ip, self.dest_port, self.src_port)
-        return packed_data
-
-    @classmethod
-    def unpack(cls, buffer):
-        dest_ip, dest_port, src_port = struct.unpack(cls.fmt, buffer)
-        return cls(dest_ip, dest_port, src_port)
+    def _fields(self):
+        return (self.dest_ip, self.dest_port, self.src_port)
 
-class LivoxLidarInstallAttitude:
-    fmt = 'fffIII'
+class LivoxLidarInstallAttitude(_Record):
+    __slots__ = ('roll_deg', 'pitch_deg', 'yaw_deg', 'x_mm', 'y_mm', 'z_mm')
+    fmt = 'fffiii'
+    _struct = Struct(fmt)
+    size = _struct.size
 
     def __init__(self, roll_deg, pitch_deg, yaw_deg, x_mm, y_mm, z_mm):
         self.roll_deg = roll_deg
@@ -271,16 +457,15 @@ class LivoxLidarInstallAttitude:
         self.y_mm = y_mm
         self.z_mm = z_mm
 
-    def pack(self):
-        return struct.pack(self.fmt, self.roll_deg, self.pitch_deg, self.yaw_deg, self.x_mm, self.y_mm, self.z_mm)
-
-    @classmethod
-    def unpack(cls, buffer):
-        return cls(*struct.unpack(cls.fmt, buffer))
+    def _fields(self):
+        return (self.roll_deg, self.pitch_deg, self.yaw_deg, self.x_mm, self.y_mm, self.z_mm)
 
 
-class FovCfg:
+class FovCfg(_Record):
+    __slots__ = ('yaw_start', 'yaw_stop', 'pitch_start', 'pitch_stop', 'rsvd')
     fmt = 'iiiiI'
+    _struct = Struct(fmt)
+    size = _struct.size
 
     def __init__(self, yaw_start, yaw_stop, pitch_start, pitch_stop, rsvd):
         self.yaw_start = yaw_start
@@ -289,18 +474,24 @@ class FovCfg:
         self.pitch_stop = pitch_stop
         self.rsvd = rsvd
 
-    def pack(self):
-        return struct.pack(self.fmt, self.yaw_start, self.yaw_stop, self.pitch_start, self.pitch_stop, self.rsvd)
-
-    @classmethod
-    def unpack(cls, buffer):
-        return cls(*struct.unpack(cls.fmt, buffer))
+    def _fields(self):
+        return (self.yaw_start, self.yaw_stop, self.pitch_start, self.pitch_stop, self.rsvd)
 
 
 class DirectLidarStateInfo:
+    __slots__ = (
+        'pcl_data_type', 'pattern_mode', 'dual_emit_en', 'point_send_en', 'lidar_ipcfg', 'host_info',
+        'pointcloud_host_ipcfg', 'imu_host_ipcfg', 'ctl_host_ipcfg', 'log_host_ipcfg', 'vehicle_speed',
+        'environment_temp', 'install_attitude', 'blind_spot_set', 'frame_rate', 'fov_cfg0', 'fov_cfg1',
+        'fov_cfg_en', 'detect_mode', 'func_io_cfg', 'work_tgt_mode', 'glass_heat', 'imu_data_en', 'fusa_en',
+        'sn', 'product_info', 'version_app', 'version_loader', 'version_hardware', 'mac', 'cur_work_state',
+        'core_temp', 'powerup_cnt', 'local_time_now', 'last_sync_time', 'time_offset', 'time_sync_type',
+        'status_code', 'lidar_diag_status', 'lidar_flash_status', 'fw_type', 'hms_code', 'ROI_Mode',
+    )
     fmt = (
+        '<'
         'BBBB'     # pcl_data_type, pattern_mode, dual_emit_en, point_send_en
-        'III'      # lidar_ipcfg
+        '12s'      # lidar_ipcfg (ip_mask_gw_info, network order)
         'IHH'      # host_info
         'IHH'      # pointcloud_host_ipcfg
         'IHH'      # imu_host_ipcfg
@@ -339,34 +530,36 @@ class DirectLidarStateInfo:
         '8I'       # hms_code
         'B'        # ROI_Mode
     )
+    _struct = Struct(fmt)
+    size = _struct.size
 
-    def __init__(self):
+    def __init__(self, device_ip=LIDAR_DEVICE_IP, sn=LIDAR_DEVICE_SN, mac=DEVICE_MAC, host_ip=LIDAR_HOST_IP):
         self.pcl_data_type = 0x01
         self.pattern_mode = 0x00
         self.dual_emit_en = 0x00
         self.point_send_en = 0x00
         self.lidar_ipcfg = ip_mask_gw_info(
-            struct.unpack("!I", socket.inet_aton(LIDAR_DEVICE_IP))[0],
+            struct.unpack("!I", socket.inet_aton(device_ip))[0],
             struct.unpack("!I", socket.inet_aton(LIDAR_DEVICE_MASK))[0],
             struct.unpack("!I", socket.inet_aton(LIDAR_DEVICE_GATEWAY))[0]
         )
         self.host_info = ip_ports_info(
-            struct.unpack("I", socket.inet_aton(LIDAR_HOST_IP))[0],
+            struct.unpack("I", socket.inet_aton(host_ip))[0],
             56201,  # Correct port for push_cmd_port_host
             56200   # Correct port for push_cmd_port_device
         )
         self.pointcloud_host_ipcfg = ip_ports_info(
-            struct.unpack("I", socket.inet_aton(LIDAR_HOST_IP))[0],
+            struct.unpack("I", socket.inet_aton(host_ip))[0],
             56301,  # Correct port for point_data_port_host
             56300   # Correct port for point_data_port_device
         )
         self.imu_host_ipcfg = ip_ports_info(
-            struct.unpack("I", socket.inet_aton(LIDAR_HOST_IP))[0],
+            struct.unpack("I", socket.inet_aton(host_ip))[0],
             56401,  # Correct port for imu_data_port_host
             56400   # Correct port for imu_data_port_device
         )
-        self.ctl_host_ipcfg = (LIDAR_HOST_IP.encode('utf-8'), 56501, 56500)  # Correct ports for log_data_port_host and log_data_port_device
-        self.log_host_ipcfg = (LIDAR_HOST_IP.encode('utf-8'), 56501, 56500)  # Correct ports for log_data_port_host and log_data_port_device
+        self.ctl_host_ipcfg = (host_ip.encode('utf-8'), 56501, 56500)  # Correct ports for log_data_port_host and log_data_port_device
+        self.log_host_ipcfg = (host_ip.encode('utf-8'), 56501, 56500)  # Correct ports for log_data_port_host and log_data_port_device
         self.vehicle_speed = 0
         self.environment_temp = 0
         self.install_attitude = LivoxLidarInstallAttitude(0.0, 0.0, 0.0, 0, 0, 0)
@@ -381,12 +574,12 @@ class DirectLidarStateInfo:
         self.glass_heat = 0x00
         self.imu_data_en = 0x01
         self.fusa_en = 0x00
-        self.sn = LIDAR_DEVICE_SN.encode('utf-8')
+        self.sn = sn.encode('utf-8')
         self.product_info = "Livox Lidar Mid-360 2021/12/01".encode('utf-8')
         self.version_app = [0x01, 0x02, 0x03, 0x04]
         self.version_loader = [0x01, 0x02, 0x03, 0x04]
         self.version_hardware = [0x01, 0x02, 0x03, 0x04]
-        self.mac = list(DEVICE_MAC)
+        self.mac = list(mac)
         self.cur_work_state = 0x01
         self.core_temp = 30
         self.powerup_cnt = 10
@@ -410,52 +603,55 @@ class DirectLidarStateInfo:
         print("Src Port:", self.host_info.src_port)
         pass
 
-    def pack(self):
+    def _fields(self):
+        att = self.install_attitude
+        fov0 = self.fov_cfg0
+        fov1 = self.fov_cfg1
         return (
-            struct.pack(
-                'BBBB',
-                self.pcl_data_type,
-                self.pattern_mode,
-                self.dual_emit_en,
-                self.point_send_en,
-            )
-            + self.lidar_ipcfg.pack()
-            + self.host_info.pack()
-            + self.pointcloud_host_ipcfg.pack()
-            + self.imu_host_ipcfg.pack()
-            + struct.pack('16sHH', *self.ctl_host_ipcfg)
-            + struct.pack('16sHH', *self.log_host_ipcfg)
-            + struct.pack('ii', self.vehicle_speed, self.environment_temp)
-            + self.install_attitude.pack()
-            + struct.pack('I', self.blind_spot_set)
-            + struct.pack('B', self.frame_rate)
-            + self.fov_cfg0.pack()
-            + self.fov_cfg1.pack()
-            + struct.pack('B', self.fov_cfg_en)
-            + struct.pack('B', self.detect_mode)
-            + struct.pack('4B', *self.func_io_cfg)
-            + struct.pack('B', self.work_tgt_mode)
-            + struct.pack('B', self.glass_heat)
-            + struct.pack('B', self.imu_data_en)
-            + struct.pack('B', self.fusa_en)
-            + struct.pack('16s', self.sn)
-            + struct.pack('64s', self.product_info)
-            + struct.pack('4B', *self.version_app)
-            + struct.pack('4B', *self.version_loader)
-            + struct.pack('4B', *self.version_hardware)
-            + struct.pack('6B', *self.mac)
-            + struct.pack('B', self.cur_work_state)
-            + struct.pack('i', self.core_temp)
-            + struct.pack('I', self.powerup_cnt)
-            + struct.pack('Q', self.local_time_now)
-            + struct.pack('Q', self.last_sync_time)
-            + struct.pack('q', self.time_offset)
-            + struct.pack('B', self.time_sync_type)
-            + struct.pack('32B', *self.status_code)
-            + struct.pack('H', self.lidar_diag_status)
-            + struct.pack('B', self.lidar_flash_status)
-            + struct.pack('B', self.fw_type)
-            + struct.pack('8I', *self.hms_code)
-            + struct.pack('B', self.ROI_Mode)
+            self.pcl_data_type, self.pattern_mode, self.dual_emit_en, self.point_send_en,
+            self.lidar_ipcfg.pack(),
+            self.host_info.dest_ip, self.host_info.dest_port, self.host_info.src_port,
+            self.pointcloud_host_ipcfg.dest_ip, self.pointcloud_host_ipcfg.dest_port, self.pointcloud_host_ipcfg.src_port,
+            self.imu_host_ipcfg.dest_ip, self.imu_host_ipcfg.dest_port, self.imu_host_ipcfg.src_port,
+            *self.ctl_host_ipcfg,
+            *self.log_host_ipcfg,
+            self.vehicle_speed, self.environment_temp,
+            att.roll_deg, att.pitch_deg, att.yaw_deg, att.x_mm, att.y_mm, att.z_mm,
+            self.blind_spot_set,
+            self.frame_rate,
+            fov0.yaw_start, fov0.yaw_stop, fov0.pitch_start, fov0.pitch_stop, fov0.rsvd,
+            fov1.yaw_start, fov1.yaw_stop, fov1.pitch_start, fov1.pitch_stop, fov1.rsvd,
+            self.fov_cfg_en,
+            self.detect_mode,
+            *self.func_io_cfg,
+            self.work_tgt_mode,
+            self.glass_heat,
+            self.imu_data_en,
+            self.fusa_en,
+            self.sn,
+            self.product_info,
+            *self.version_app,
+            *self.version_loader,
+            *self.version_hardware,
+            *self.mac,
+            self.cur_work_state,
+            self.core_temp,
+            self.powerup_cnt,
+            self.local_time_now,
+            self.last_sync_time,
+            self.time_offset,
+            self.time_sync_type,
+            *self.status_code,
+            self.lidar_diag_status,
+            self.lidar_flash_status,
+            self.fw_type,
+            *self.hms_code,
+            self.ROI_Mode,
         )
 
+    def pack(self):
+        return self._struct.pack(*self._fields())
+
+    def pack_into(self, buffer, offset=0):
+        self._struct.pack_into(buffer, offset, *self._fields())
+        return self.size
@@ -0,0 +1,207 @@
+# lidar/params.py
+import struct
+from .enums import ParamKeyName
+from .encoder import POINT_DTYPES
+from .workmode import TARGET_MODES
+from .packet import LivoxLidarKeyValueParam, ip_mask_gw_info, ip_ports_info, LivoxLidarInstallAttitude, FovCfg
+
+
+class ScalarCodec:
+    def __init__(self, fmt):
+        self.struct = struct.Struct(fmt)
+        self.size = self.struct.size
+
+    def encode(self, value):
+        return self.struct.pack(value)
+
+    def decode(self, data):
+        return self.struct.unpack(data)[0]
+
+
+class ArrayCodec:
+    def __init__(self, fmt):
+        self.struct = struct.Struct(fmt)
+        self.size = self.struct.size
+
+    def encode(self, value):
+        return self.struct.pack(*value)
+
+    def decode(self, data):
+        return list(self.struct.unpack(data))
+
+
+class RecordCodec:
+    def __init__(self, cls):
+        self.cls = cls
+        self.size = cls.size
+
+    def encode(self, value):
+        return value.pack()
+
+    def decode(self, data):
+        return self.cls.unpack(data)
+
+
+class ByteListCodec:
+    def __init__(self, size=None):
+        self.size = size
+
+    def encode(self, value):
+        return bytes(value)
+
+    def decode(self, data):
+        return list(data)
+
+
+class PaddedBytesCodec:
+    # Stored as given, zero-padded to size when read back.
+    def __init__(self, size):
+        self.size = size
+
+    def encode(self, value):
+        return value.ljust(self.size, b'\x00')
+
+    def decode(self, data):
+        return bytes(data)
+
+
+class ParamSpec:
+    __slots__ = ('key', 'name', 'attr', 'codec', 'length', 'validate', 'on_set', 'on_get', 'cached')
+
+    def __init__(self, key, attr, codec, length=None, validate=None, on_set=None, on_get=None, cached=False):
+        self.key = key.value
+        self.name = key.name
+        self.attr = attr
+        self.codec = codec
+        # Exact value length required on set; None accepts any length.
+        self.length = length
+        self.validate = validate
+        self.on_set = on_set
+        self.on_get = on_get
+        # Packed value is cached until the key is set again.
+        self.cached = cached
+
+
+def _validate_pcl_data_type(value):
+    if value not in POINT_DTYPES:
+        raise ValueError(f"Unsupported point data type {value} for kKeyPclDataType")
+
+def _validate_work_mode(value):
+    if value not in TARGET_MODES:
+        raise ValueError(f"Unsupported work mode 0x{value:02x} for kKeyWorkMode")
+
+def _refresh_local_time(store):
+    if store.clock is not None:
+        store.info.local_time_now = store.clock.now()
+
+def _set_point_data_host(store, value):
+    if store.device is not None:
+        store.device.set_pcl_socket(value.dest_ip, value.dest_port)
+
+def _set_work_mode(store, value):
+    if store.device is not None:
+        store.device.work.request(value)
+
+def _set_point_send(store, value):
+    if store.device is not None:
+        store.device.work.update()
+
+def _set_fov(store, value):
+    if store.device is not None:
+        store.device.pipeline.configure(fov=True)
+
+def _set_blind_spot(store, value):
+    if store.device is not None:
+        store.device.pipeline.configure(blind_spot=True)
+
+def _set_install_attitude(store, value):
+    if store.device is not None:
+        store.device.pipeline.set_attitude()
+
+
+def _spec(key, attr, codec, sized=True, **kwargs):
+    return ParamSpec(key, attr, codec, length=codec.size if sized else None, **kwargs)
+
+_U8 = ScalarCodec('B')
+
+PARAM_SPECS = {spec.key: spec for spec in (
+    _spec(ParamKeyName.kKeyPclDataType, 'pcl_data_type', _U8, validate=_validate_pcl_data_type),
+    _spec(ParamKeyName.kKeyPatternMode, 'pattern_mode', _U8),
+    _spec(ParamKeyName.kKeyPointSendEn, 'point_send_en', _U8, on_set=_set_point_send),
+    _spec(ParamKeyName.kKeyLidarIpCfg, 'lidar_ipcfg', RecordCodec(ip_mask_gw_info)),
+    _spec(ParamKeyName.kKeyStateInfoHostIpCfg, 'host_info', RecordCodec(ip_ports_info)),
+    _spec(ParamKeyName.kKeyLidarPointDataHostIpCfg, 'pointcloud_host_ipcfg', RecordCodec(ip_ports_info),
+          on_set=_set_point_data_host),
+    _spec(ParamKeyName.kKeyLidarImuHostIpCfg, 'imu_host_ipcfg', RecordCodec(ip_ports_info)),
+    _spec(ParamKeyName.kKeyInstallAttitude, 'install_attitude', RecordCodec(LivoxLidarInstallAttitude),
+          on_set=_set_install_attitude),
+    _spec(ParamKeyName.kKeyBlindSpotSet, 'blind_spot_set', ScalarCodec('I'), on_set=_set_blind_spot),
+    _spec(ParamKeyName.kKeyFovCfg0, 'fov_cfg0', RecordCodec(FovCfg), on_set=_set_fov),
+    _spec(ParamKeyName.kKeyFovCfg1, 'fov_cfg1', RecordCodec(FovCfg), on_set=_set_fov),
+    _spec(ParamKeyName.kKeyFovCfgEn, 'fov_cfg_en', _U8, on_set=_set_fov),
+    _spec(ParamKeyName.kKeyDetectMode, 'detect_mode', _U8),
+    _spec(ParamKeyName.kKeyFuncIoCfg, 'func_io_cfg', ByteListCodec(4)),
+    _spec(ParamKeyName.kKeyWorkMode, 'work_tgt_mode', _U8, validate=_validate_work_mode, on_set=_set_work_mode),
+    _spec(ParamKeyName.kKeyImuDataEn, 'imu_data_en', _U8),
+    _spec(ParamKeyName.kKeySn, 'sn', PaddedBytesCodec(16), sized=False, cached=True),
+    _spec(ParamKeyName.kKeyProductInfo, 'product_info', PaddedBytesCodec(64), sized=False, cached=True),
+    _spec(ParamKeyName.kKeyVersionApp, 'version_app', ByteListCodec(4), cached=True),
+    _spec(ParamKeyName.kKeyVersionLoader, 'version_loader', ByteListCodec(4), cached=True),
+    _spec(ParamKeyName.kKeyVersionHardware, 'version_hardware', ByteListCodec(4), cached=True),
+    _spec(ParamKeyName.kKeyMac, 'mac', ByteListCodec(6), cached=True),
+    _spec(ParamKeyName.kKeyCurWorkState, 'cur_work_state', _U8),
+    _spec(ParamKeyName.kKeyCoreTemp, 'core_temp', ScalarCodec('i')),
+    _spec(ParamKeyName.kKeyPowerUpCnt, 'powerup_cnt', ScalarCodec('I')),
+    _spec(ParamKeyName.kKeyLocalTimeNow, 'local_time_now', ScalarCodec('Q'), on_get=_refresh_local_time),
+    _spec(ParamKeyName.kKeyLastSyncTime, 'last_sync_time', ScalarCodec('Q')),
+    _spec(ParamKeyName.kKeyTimeOffset, 'time_offset', ScalarCodec('q')),
+    _spec(ParamKeyName.kKeyTimeSyncType, 'time_sync_type', _U8),
+    _spec(ParamKeyName.kKeyLidarDiagStatus, 'lidar_diag_status', ScalarCodec('H')),
+    _spec(ParamKeyName.kKeyFwType, 'fw_type', _U8, cached=True),
+    _spec(ParamKeyName.kKeyHmsCode, 'hms_code', ArrayCodec('8I')),
+    _spec(ParamKeyName.kKeyRoiMode, 'ROI_Mode', _U8, on_set=_set_fov),
+)}
+
+
+class ParamStore:
+    # Key-value parameter access for one DirectLidarStateInfo. device, if
+    # given, is the LidarDevice whose sockets follow host address changes.
+
+    def __init__(self, info, clock=None, device=None):
+        self.info = info
+        self.clock = clock
+        self.device = device
+        self._cache = {}
+
+    def get(self, key):
+        # Returns a LivoxLidarKeyValueParam, or None for unsupported keys.
+        kvp = self._cache.get(key)
+        if kvp is not None:
+            return kvp
+        spec = PARAM_SPECS.get(key)
+        if spec is None:
+            return None
+        if spec.on_get is not None:
+            spec.on_get(self)
+        value = spec.codec.encode(getattr(self.info, spec.attr))
+        kvp = LivoxLidarKeyValueParam(key, len(value), value)
+        if spec.cached:
+            self._cache[key] = kvp
+        return kvp
+
+    def set(self, key, value):
+        # Decodes and stores value; raises ValueError if it is malformed.
+        # Returns False for unsupported keys.
+        spec = PARAM_SPECS.get(key)
+        if spec is None:
+            return False
+        if spec.length is not None and len(value) != spec.length:
+            raise ValueError(f"Expected length {spec.length} for {spec.name}, got {len(value)}")
+        decoded = spec.codec.decode(value)
+        if spec.validate is not None:
+            spec.validate(decoded)
+        setattr(self.info, spec.attr, decoded)
+        self._cache.pop(key, None)
+        if spec.on_set is not None:
+            spec.on_set(self, decoded)
+        return True
@@ -0,0 +1,269 @@
+# lidar/pcd.py
+import itertools
+import mmap
+import os
+import struct
+import time
+import zipfile
+import numpy as np
+from .config import PCL_FILE_UNIT_MM, PCL_INDEX_STRIDE, PCL_INDEX_CACHE
+from .log import get_logger, DEVICE
+
+log = get_logger(DEVICE)
+
+try:
+    import lzf
+except ImportError:
+    lzf = None
+
+_PCD_TYPES = {
+    ('F', 4): '<f4', ('F', 8): '<f8',
+    ('I', 1): 'i1', ('I', 2): '<i2', ('I', 4): '<i4', ('I', 8): '<i8',
+    ('U', 1): 'u1', ('U', 2): '<u2', ('U', 4): '<u4', ('U', 8): '<u8',
+}
+
+PCD_METRE_UNIT_MM = 1000
+
+# ASCII bodies have no fixed record size, so seeking needs the byte offset
+# of every PCL_INDEX_STRIDE-th point line. The index is cached next to the
+# file and rebuilt when the file, its header or the stride change.
+INDEX_SUFFIX = '.idx.npz'
+INDEX_VERSION = 1
+
+
+def lzf_decompress(data, expected_size):
+    if lzf is not None:
+        return lzf.decompress(bytes(data), expected_size)
+    data = memoryview(data).cast('B')
+    out = bytearray(expected_size)
+    ip = op = 0
+    end = len(data)
+    while ip < end:
+        ctrl = data[ip]
+        ip += 1
+        if ctrl < 32:
+            ctrl += 1
+            out[op:op + ctrl] = data[ip:ip + ctrl]
+            ip += ctrl
+            op += ctrl
+        else:
+            length = ctrl >> 5
+            ref = op - ((ctrl & 0x1F) << 8) - 1
+            if length == 7:
+                length += data[ip]
+                ip += 1
+            ref -= data[ip]
+            ip += 1
+            length += 2
+            if ref + length <= op:
+                out[op:op + length] = out[ref:ref + length]
+            else:
+                for i in range(length):
+                    out[op + i] = out[ref + i]
+            op += length
+    if op != expected_size:
+        raise ValueError(f"LZF decompressed {op} bytes, expected {expected_size}")
+    return out
+
+
+def scan_line_offsets(buf, start, stride, chunk=1 << 26):
+    # Byte offsets of lines 0, stride, 2 * stride, ... of buf from start.
+    found = [np.array([start], np.int64)]
+    line = 0
+    pos = start
+    while pos < len(buf):
+        block = np.frombuffer(buf, np.uint8, count=min(chunk, len(buf) - pos), offset=pos)
+        # Line line + 1 + i starts after the i-th newline.
+        starts = np.flatnonzero(block == 0x0A) + (pos + 1)
+        found.append(starts[(-(line + 1)) % stride::stride])
+        line += len(starts)
+        pos += len(block)
+    offsets = np.concatenate(found)
+    return offsets[offsets < len(buf)]
+
+def load_line_index(reader, stride=PCL_INDEX_STRIDE, cache=PCL_INDEX_CACHE):
+    path = reader.path + INDEX_SUFFIX
+    st = os.stat(reader.path)
+    key = np.array([INDEX_VERSION, st.st_size, st.st_mtime_ns, reader.data_offset, stride], np.int64)
+    if cache:
+        try:
+            with np.load(path) as cached:
+                if np.array_equal(cached['key'], key):
+                    return cached['offsets']
+        except (OSError, KeyError, ValueError, zipfile.BadZipFile):
+            pass
+
+    t0 = time.perf_counter()
+    offsets = scan_line_offsets(reader._map(), reader.data_offset, stride)
+    log.info("Indexed %s: %d lines in %.2f s", reader.path, (len(offsets) - 1) * stride, time.perf_counter() - t0)
+    if cache:
+        tmp = f"{path}.{os.getpid()}.tmp"
+        try:
+            with open(tmp, 'wb') as f:
+                np.savez(f, key=key, offsets=offsets)
+            os.replace(tmp, path)
+        except OSError as e:
+            log.warning("Could not cache index %s: %s", path, e)
+    return offsets
+
+
+class PcdReader:
+    def __init__(self, path):
+        self.path = path
+        self.header = {}
+        self._file = open(path, 'rb')
+        self._mmap = None
+        self._points = None
+        self._index = None
+        try:
+            self._parse_header()
+        except Exception:
+            self._file.close()
+            raise
+
+    def _parse_header(self):
+        while True:
+            line = self._file.readline()
+            if not line:
+                raise ValueError(f"{self.path}: missing DATA line in PCD header")
+            line = line.decode('ascii', 'replace').strip()
+            if not line or line.startswith('#'):
+                continue
+            key, _, value = line.partition(' ')
+            self.header[key.upper()] = value.split()
+            if key.upper() == 'DATA':
+                break
+        self.data_offset = self._file.tell()
+
+        h = self.header
+        self.fields = h.get('FIELDS', [])
+        sizes = [int(v) for v in h.get('SIZE', [])]
+        types = [v.upper() for v in h.get('TYPE', [])]
+        counts = [int(v) for v in h.get('COUNT', ['1'] * len(self.fields))]
+        if not self.fields or not (len(self.fields) == len(sizes) == len(types) == len(counts)):
+            raise ValueError(f"{self.path}: inconsistent FIELDS/SIZE/TYPE/COUNT in PCD header")
+        for name in ('x', 'y', 'z'):
+            if name not in self.fields:
+                raise ValueError(f"{self.path}: PCD has no '{name}' field")
+
+        width = int(h.get('WIDTH', ['0'])[0])
+        height = int(h.get('HEIGHT', ['1'])[0])
+        self.points = int(h.get('POINTS', [width * height])[0])
+        self.data = h['DATA'][0].lower()
+        if self.data not in ('ascii', 'binary', 'binary_compressed'):
+            raise ValueError(f"{self.path}: unsupported PCD DATA type '{self.data}'")
+        if self.data == 'binary_compressed' and lzf is None:
+            # The fallback decoder runs per byte in Python: minutes for a
+            # large capture, so say so up front rather than seem hung.
+            log.warning("%s: binary_compressed PCD but the lzf module is not installed; decompressing in pure "
+                        "Python will be very slow (pip install python-lzf)", self.path)
+
+        descr = []
+        for i, (name, size, typ, count) in enumerate(zip(self.fields, sizes, types, counts)):
+            fmt = _PCD_TYPES.get((typ, size))
+            if fmt is None:
+                raise ValueError(f"{self.path}: unsupported PCD field type {typ}{size} for '{name}'")
+            if name == '_':
+                name = f"_pad{i}"
+            descr.append((name, fmt) if count == 1 else (name, fmt, (count,)))
+        self.dtype = np.dtype(descr)
+
+        # Float coordinates are metres by convention; integer ones keep the
+        # legacy replay unit.
+        self.scale_mm = PCD_METRE_UNIT_MM if self.dtype['x'].kind == 'f' else PCL_FILE_UNIT_MM
+
+    def _map(self):
+        if self._mmap is None:
+            self._mmap = mmap.mmap(self._file.fileno(), 0, access=mmap.ACCESS_READ)
+        return self._mmap
+
+    def _load_binary(self):
+        # Zero-copy view of the mapped file body.
+        return np.frombuffer(self._map(), self.dtype, count=self.points, offset=self.data_offset)
+
+    def _load_binary_compressed(self):
+        mm = self._map()
+        compressed_size, uncompressed_size = struct.unpack_from('<II', mm, self.data_offset)
+        start = self.data_offset + 8
+        raw = lzf_decompress(memoryview(mm)[start:start + compressed_size], uncompressed_size)
+        # binary_compressed stores each field as its own column.
+        out = np.empty(self.points, self.dtype)
+        offset = 0
+        for name in self.dtype.names:
+            field = self.dtype[name]
+            column = np.frombuffer(raw, field.base, count=self.points * max(1, int(np.prod(field.shape))), offset=offset)
+            out[name] = column.reshape((self.points,) + field.shape)
+            offset += column.nbytes
+        return out
+
+    def _parse_ascii(self, lines):
+        if not lines:
+            return np.empty(0, self.dtype)
+        flat = np.loadtxt(lines, dtype=np.float64, ndmin=2)
+        out = np.empty(len(flat), self.dtype)
+        col = 0
+        for name in self.dtype.names:
+            width = max(1, int(np.prod(self.dtype[name].shape)))
+            values = flat[:, col:col + width]
+            out[name] = values[:, 0] if width == 1 else values.reshape((len(flat),) + self.dtype[name].shape)
+            col += width
+        return out
+
+    def _iter_ascii(self, points_per_chunk):
+        self._file.seek(self.data_offset)
+        while True:
+            lines = list(itertools.islice(self._file, points_per_chunk))
+            if not lines:
+                return
+            yield self._parse_ascii(lines)
+
+    def points_array(self):
+        if self._points is None:
+            if self.data == 'binary':
+                self._points = self._load_binary()
+            elif self.data == 'binary_compressed':
+                self._points = self._load_binary_compressed()
+            else:
+                self._points = np.concatenate(list(self._iter_ascii(1 << 16)) or [np.empty(0, self.dtype)])
+        return self._points
+
+    def line_index(self):
+        if self._index is None:
+            self._index = load_line_index(self)
+        return self._index
+
+    def read_points(self, start, count):
+        # Points [start, start + count) without reading what comes before:
+        # sliced from binary bodies, parsed from the nearest indexed line of
+        # ASCII ones.
+        if self.data != 'ascii' or self._points is not None:
+            return self.points_array()[start:start + count]
+        offsets = self.line_index()
+        block, skip = divmod(start, PCL_INDEX_STRIDE)
+        if block >= len(offsets):
+            return np.empty(0, self.dtype)
+        self._file.seek(int(offsets[block]))
+        return self._parse_ascii(list(itertools.islice(self._file, skip, skip + count)))
+
+    def frames(self, points_per_frame):
+        # Yields consecutive slices of points_per_frame points. Binary bodies
+        # are sliced out of the mapped file; ASCII bodies are parsed one frame
+        # at a time unless already loaded.
+        if self.data == 'ascii' and self._points is None:
+            yield from self._iter_ascii(points_per_frame)
+            return
+        points = self.points_array()
+        for start in range(0, len(points), points_per_frame):
+            yield points[start:start + points_per_frame]
+
+    def close(self):
+        self._points = None
+        self._index = None
+        if self._mmap is not None:
+            try:
+                self._mmap.close()
+            except BufferError:
+                # Views handed out by frames() still reference the mapping.
+                pass
+            self._mmap = None
+        self._file.close()
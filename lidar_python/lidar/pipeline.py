@@ -0,0 +1,269 @@
+# lidar/pipeline.py
+import collections
+import threading
+import time
+import numpy as np
+from .config import (PCL_VOXEL_SIZE, PCL_DECIMATE, PCL_DECIMATE_MODE, PCL_FRAME_BUDGET, PCL_FOV_CULLING,
+                     PCL_PIPELINE_CACHE_FRAMES)
+from .attitude import PointTransform, attitude_matrix
+from .encoder import split_points
+from .metrics import PIPELINE_IN_POINTS, PIPELINE_OUT_POINTS, PIPELINE_CACHE_HITS, PIPELINE_TIME
+from .pcd import PCD_METRE_UNIT_MM
+from .log import get_logger, REPLAY
+
+log = get_logger(REPLAY)
+
+# Voxel indices are packed into one int64 key, VOXEL_KEY_BITS per axis.
+# Indices wrap beyond +-2**20 voxels (10 km at 1 cm), far outside any
+# lidar's range.
+VOXEL_KEY_BITS = 21
+_VOXEL_MASK = (1 << VOXEL_KEY_BITS) - 1
+DECIMATE_MODES = ('stride', 'random')
+
+
+def voxel_keys(x, y, z, size):
+    keys = np.zeros(len(x), np.int64)
+    for shift, values in ((0, x), (VOXEL_KEY_BITS, y), (2 * VOXEL_KEY_BITS, z)):
+        index = np.floor(np.asarray(values, np.float64) / size).astype(np.int64)
+        keys |= (index & _VOXEL_MASK) << shift
+    return keys
+
+
+def voxel_indices(points, size):
+    # Index of the first point in each occupied voxel of size (in the
+    # points' unit), in scan order so point timestamps stay monotonic.
+    x, y, z = split_points(points)[:3]
+    _, first = np.unique(voxel_keys(x, y, z, size), return_index=True)
+    first.sort()
+    return first
+
+
+class PointReducer:
+    # Thins a frame before it is encoded: one point per voxel_size metres
+    # voxel, then 1 in decimate points, then at most budget points. mode
+    # picks which points decimation and the budget keep: evenly spaced
+    # ('stride') or a random subset ('random'), in scan order either way.
+    # Each step is off at its neutral value (0, 1, 0).
+
+    def __init__(self, voxel_size=PCL_VOXEL_SIZE, decimate=PCL_DECIMATE, mode=PCL_DECIMATE_MODE,
+                 budget=PCL_FRAME_BUDGET, seed=None):
+        if mode not in DECIMATE_MODES:
+            raise ValueError(f"Unknown decimation mode {mode!r}, expected one of {DECIMATE_MODES}")
+        if voxel_size < 0 or decimate < 1 or budget < 0:
+            raise ValueError(f"Invalid reduction voxel_size={voxel_size} decimate={decimate} budget={budget}")
+        self.voxel_size = voxel_size
+        self.decimate = int(decimate)
+        self.mode = mode
+        self.budget = int(budget)
+        self.rng = np.random.default_rng(seed)
+
+    def enabled(self):
+        return self.voxel_size > 0 or self.decimate > 1 or self.budget > 0
+
+    def pick(self, n, keep):
+        # keep sorted indices out of n.
+        if self.mode == 'random':
+            index = self.rng.choice(n, keep, replace=False)
+            index.sort()
+            return index
+        return np.arange(keep, dtype=np.int64) * n // keep
+
+    def __call__(self, points, scale_mm):
+        # points are in the source unit, scale_mm millimetres each.
+        if self.voxel_size > 0 and len(points):
+            points = points[voxel_indices(points, self.voxel_size * PCD_METRE_UNIT_MM / scale_mm)]
+        if self.decimate > 1:
+            if self.mode == 'stride':
+                points = points[::self.decimate]
+            else:
+                points = points[self.pick(len(points), len(points) // self.decimate)]
+        if self.budget and len(points) > self.budget:
+            points = points[self.pick(len(points), self.budget)]
+        return points
+
+
+def polar_coordinates(points, scale_mm):
+    # (azimuth, elevation, range) per point: azimuth in [0, 360) degrees
+    # counter-clockwise from +x, elevation in degrees above the xy plane,
+    # range in millimetres.
+    x, y, z = (np.asarray(v, np.float64) for v in split_points(points)[:3])
+    planar = np.hypot(x, y)
+    azimuth = np.degrees(np.arctan2(y, x)) % 360.0
+    elevation = np.degrees(np.arctan2(z, planar))
+    return azimuth, elevation, np.hypot(planar, z) * scale_mm
+
+
+class FovCuller:
+    # Masks points the way the device's FOV settings do: fov_cfg0/fov_cfg1,
+    # each enabled by its bit of fov_cfg_en, keep points inside their yaw
+    # and pitch window (degrees, yaw may wrap past 360), and blind_spot_set
+    # drops points closer than that many cm. Mid-360 leaves ROI_Mode
+    # undocumented; here a non-zero ROI_Mode turns the enabled windows into
+    # regions that are cut out, e.g. the vehicle body. configure() reads
+    # the settings from the device state, but the windows and the blind
+    # spot only take effect once the host has set them (fov / blind_spot),
+    # so a device nobody configured sends every point.
+
+    def __init__(self, enabled=PCL_FOV_CULLING):
+        self.enabled = enabled
+        self.fov_set = False
+        self.blind_spot_set = False
+        self.windows = []
+        self.exclude = False
+        self.blind_mm = 0
+
+    def configure(self, info, fov=False, blind_spot=False):
+        self.fov_set = self.fov_set or fov
+        self.blind_spot_set = self.blind_spot_set or blind_spot
+        windows = []
+        full = False
+        for bit, fov in enumerate((info.fov_cfg0, info.fov_cfg1)):
+            if not self.fov_set or not info.fov_cfg_en >> bit & 1:
+                continue
+            if fov.yaw_stop - fov.yaw_start >= 360:
+                yaw = None
+            else:
+                yaw = (fov.yaw_start % 360, fov.yaw_stop % 360)
+            pitch = None if fov.pitch_start <= -90 and fov.pitch_stop >= 90 else (fov.pitch_start, fov.pitch_stop)
+            full = full or (yaw is None and pitch is None)
+            windows.append((yaw, pitch))
+        self.exclude = info.ROI_Mode != 0
+        # A window covering every direction keeps (or cuts) everything.
+        if full:
+            windows = [(None, None)] if self.exclude else []
+        self.windows = windows
+        self.blind_mm = info.blind_spot_set * 10 if self.blind_spot_set else 0
+
+    def active(self):
+        return self.enabled and bool(self.windows or self.blind_mm > 0)
+
+    def mask(self, azimuth, elevation, range_mm):
+        # Boolean mask of the points to keep.
+        keep = np.ones(len(azimuth), bool)
+        if self.windows:
+            inside = np.zeros(len(azimuth), bool)
+            for yaw, pitch in self.windows:
+                hit = np.ones(len(azimuth), bool)
+                if yaw is not None:
+                    start, stop = yaw
+                    if start <= stop:
+                        hit &= (azimuth >= start) & (azimuth <= stop)
+                    else:
+                        hit &= (azimuth >= start) | (azimuth <= stop)
+                if pitch is not None:
+                    hit &= (elevation >= pitch[0]) & (elevation <= pitch[1])
+                inside |= hit
+            keep = ~inside if self.exclude else inside
+        if self.blind_mm > 0:
+            keep &= range_mm >= self.blind_mm
+        return keep
+
+
+class _Frame:
+    # One frame's intermediate results: the reduced points, their polar
+    # coordinates once needed, and the output for settings generation.
+    __slots__ = ('points', 'polar', 'out', 'generation')
+
+    def __init__(self, points):
+        self.points = points
+        self.polar = None
+        self.out = None
+        self.generation = -1
+
+
+class PointPipeline:
+    # The stages one device's frames pass between the point source and the
+    # encoder: reduction, FOV culling in the sensor frame, then the install
+    # attitude transform into the vehicle frame. Replayed frames may carry
+    # a key (their frame index): looped replay then reduces each frame and
+    # converts it to polar coordinates once, serving later passes from a
+    # cache of up to cache_frames frames, least recently used out first.
+    # configure() rereads the device's culling settings and set_attitude()
+    # its install attitude; call clear() when the source changes.
+
+    def __init__(self, dev, reducer=None, culler=None, cache_frames=PCL_PIPELINE_CACHE_FRAMES):
+        self.dev = dev
+        self.reducer = reducer or PointReducer()
+        self.culler = culler or FovCuller()
+        self.transform = PointTransform()
+        self.cache_frames = cache_frames
+        self.generation = 0
+        self._cache = collections.OrderedDict()
+        self._lock = threading.Lock()
+        self.set_attitude()
+
+    def configure(self, fov=False, blind_spot=False):
+        # Called from parameter hooks, so it must not raise. fov and
+        # blind_spot say which settings the host has just set.
+        try:
+            self.culler.configure(self.dev.info, fov, blind_spot)
+        except (AttributeError, TypeError) as e:
+            log.error("%s: bad FOV settings, culling unchanged: %s", self.dev.sn, e)
+            return
+        # Cached frames are culled again on their next use.
+        self.generation += 1
+        log.debug("%s: FOV windows %s%s, blind spot %d mm", self.dev.sn, self.culler.windows or 'off',
+                  " (cut out)" if self.culler.exclude else "", self.culler.blind_mm)
+
+    def set_attitude(self):
+        # Rebuilds the transform matrix; called from a parameter hook, so it
+        # must not raise.
+        att = self.dev.info.install_attitude
+        try:
+            self.transform.set_matrix(attitude_matrix(att))
+        except (AttributeError, TypeError, ValueError) as e:
+            log.error("%s: bad install attitude, transform unchanged: %s", self.dev.sn, e)
+            return
+        log.debug("%s: install attitude roll %g pitch %g yaw %g deg, offset %s mm", self.dev.sn, att.roll_deg,
+                  att.pitch_deg, att.yaw_deg, self.transform.matrix[:3, 3].tolist())
+
+    def enabled(self):
+        return self.reducer.enabled() or self.culler.active() or not self.transform.identity
+
+    def clear(self):
+        with self._lock:
+            self._cache.clear()
+
+    def _cached(self, key):
+        if key is None:
+            return None
+        with self._lock:
+            frame = self._cache.get(key)
+            if frame is not None:
+                self._cache.move_to_end(key)
+        return frame
+
+    def _store(self, key, frame):
+        if key is None or self.cache_frames <= 0:
+            return
+        with self._lock:
+            self._cache[key] = frame
+            while len(self._cache) > self.cache_frames:
+                self._cache.popitem(last=False)
+
+    def process(self, points, scale_mm, key=None):
+        # Returns the frame to encode; points itself when no stage is on.
+        if not self.enabled():
+            return points
+        t0 = time.perf_counter_ns()
+        generation = self.generation
+        frame = self._cached(key)
+        if frame is None:
+            frame = _Frame(self.reducer(points, scale_mm) if self.reducer.enabled() else points)
+            self._store(key, frame)
+        else:
+            PIPELINE_CACHE_HITS.add()
+        if frame.generation != generation:
+            out = frame.points
+            if self.culler.active() and len(out):
+                if frame.polar is None:
+                    frame.polar = polar_coordinates(out, scale_mm)
+                out = out[self.culler.mask(*frame.polar)]
+            frame.out = out
+            frame.generation = generation
+        # Cheap next to the other stages, so applied afresh every time.
+        out = self.transform.apply(frame.out, scale_mm)
+        PIPELINE_TIME.record(time.perf_counter_ns() - t0)
+        PIPELINE_IN_POINTS.add(len(points))
+        PIPELINE_OUT_POINTS.add(len(out))
+        return out
@@ -1,356 +1,95 @@
 # lidar/protocol.py
 import socket
 import struct
-from select import poll, POLLIN
 import threading
 import time
-from .packet import *
-from .packet import LivoxLidarDeviceAck, LivoxLidarCmdPacket, DirectLidarStateInfo, LivoxLidarEthernetPacket, LivoxLidarCartesianLowRawPoint, LivoxLidarKeyValueParam
-from .config import *
-from .constants import *
+import numpy as np
+from .packet import LivoxLidarDeviceAck, LivoxLidarCmdPacket, LivoxLidarKeyValueParam, LivoxLidarParamInquireAck
+from .config import (MAXLEN, PCL_FILE_UNIT_MM, PCL_POINTS_PER_SECOND, PCL_FRAMES_PER_SECOND, PCL_SCHED_POLICY,
+                     PCL_SEND_BATCH_SIZE, PCL_RING_PUT_TIMEOUT, PCL_IDLE_POLL)
 from .crc import calculate_crc16, calculate_crc32
-from .device import set_pcl_socket, send_pcl_data, setup_pcl_file_handle, get_pcl_file, pcl_sockfd
-from .utils import error, print_buffer
-from .enums import LivoxLidarDeviceType, ParamKeyName
-
+from .encoder import encode_packets, encode_packets_into, shift_timestamps, POINT_DTYPES, DOTS_PER_PACKET, HEADER_SIZE
+from .ring import PacketRing
+from .metrics import gauge, CMD_ERRORS, CMD_CRC, ENCODED_POINTS, ENCODED_PACKETS, ENCODE_TIME
+from .scheduler import RateScheduler
+from .timing import PacketClock, source_timestamps_ns, NOMINAL_POINT_PERIOD_NS
+from .device import get_default_device
+from .source import replay_source
+from .log import get_logger, log_hexdump, lazy_hex, Sampler, CMD, PARAMS, REPLAY
+from .enums import LivoxLidarDeviceType, LivoxLidarRetCode
+
+log = get_logger(CMD)
+params_log = get_logger(PARAMS)
+replay_log = get_logger(REPLAY)
+
+# Functions below take an optional LidarDevice and default to g_device,
+# whose state g_lidar_info/g_lidar_clock/g_param_store alias.
+g_device = None
 g_lidar_info = None
+g_lidar_clock = None
+g_param_store = None
 
 def init_livox_lidar_info_data():
-    global g_lidar_info
-    g_lidar_info = DirectLidarStateInfo()
-
-def get_livox_lidar_info_data(key):
+    global g_device, g_lidar_info, g_lidar_clock, g_param_store
+    g_device = get_default_device()
+    g_device.reset_state()
+    g_lidar_info = g_device.info
+    g_lidar_clock = g_device.clock
+    g_param_store = g_device.store
+
+def get_livox_lidar_info_data(key, dev=None):
     kvp = None
     try:
-        if key == ParamKeyName.kKeyPclDataType.value:
-            kvp = LivoxLidarKeyValueParam(key, 1, struct.pack('B', g_lidar_info.pcl_data_type))
-        elif key == ParamKeyName.kKeyPatternMode.value:
-            kvp = LivoxLidarKeyValueParam(key, 1, struct.pack('B', g_lidar_info.pattern_mode))
-        elif key == ParamKeyName.kKeyLidarIpCfg.value:
-            kvp = LivoxLidarKeyValueParam(key, struct.calcsize(ip_mask_gw_info.fmt), g_lidar_info.lidar_ipcfg.pack())
-        elif key == ParamKeyName.kKeyStateInfoHostIpCfg.value:
-            kvp = LivoxLidarKeyValueParam(key, struct.calcsize(ip_ports_info.fmt), g_lidar_info.host_info.pack())
-        elif key == ParamKeyName.kKeyLidarPointDataHostIpCfg.value:           
-            kvp = LivoxLidarKeyValueParam(key, struct.calcsize(ip_ports_info.fmt), g_lidar_info.pointcloud_host_ipcfg.pack())
-        elif key == ParamKeyName.kKeyLidarImuHostIpCfg.value:
-            kvp = LivoxLidarKeyValueParam(key, struct.calcsize(ip_ports_info.fmt), g_lidar_info.imu_host_ipcfg.pack())
-        elif key == ParamKeyName.kKeyInstallAttitude.value:
-            kvp = LivoxLidarKeyValueParam(key, struct.calcsize(LivoxLidarInstallAttitude.fmt), g_lidar_info.install_attitude.pack())
-        elif key == ParamKeyName.kKeyFovCfg0.value:
-            kvp = LivoxLidarKeyValueParam(key, struct.calcsize(FovCfg.fmt), g_lidar_info.fov_cfg0.pack())
-        elif key == ParamKeyName.kKeyFovCfg1.value:
-            kvp = LivoxLidarKeyValueParam(key, struct.calcsize(FovCfg.fmt), g_lidar_info.fov_cfg1.pack())
-        elif key == ParamKeyName.kKeyFovCfgEn.value:
-            kvp = LivoxLidarKeyValueParam(key, 1, struct.pack('B', g_lidar_info.fov_cfg_en))
-        elif key == ParamKeyName.kKeyDetectMode.value:
-            kvp = LivoxLidarKeyValueParam(key, 1, struct.pack('B', g_lidar_info.detect_mode))
-        elif key == ParamKeyName.kKeyFuncIoCfg.value:
-            kvp = LivoxLidarKeyValueParam(key, len(g_lidar_info.func_io_cfg), bytes(g_lidar_info.func_io_cfg))
-        elif key == ParamKeyName.kKeyWorkMode.value:
-            kvp = LivoxLidarKeyValueParam(key, 1, struct.pack('B', g_lidar_info.work_tgt_mode))
-        elif key == ParamKeyName.kKeyImuDataEn.value:
-            kvp = LivoxLidarKeyValueParam(key, 1, struct.pack('B', g_lidar_info.imu_data_en))
-        elif key == ParamKeyName.kKeySn.value:
-            sn_padded = g_lidar_info.sn.ljust(16, b'\x00')
-            kvp = LivoxLidarKeyValueParam(key, 16, sn_padded)
-        elif key == ParamKeyName.kKeyProductInfo.value:
-            product_info_padded = g_lidar_info.product_info + b'\x00' * (64 - len(g_lidar_info.product_info))
-            kvp = LivoxLidarKeyValueParam(key, 64, product_info_padded)
-        elif key == ParamKeyName.kKeyVersionApp.value:
-            kvp = LivoxLidarKeyValueParam(key, 4, bytes(g_lidar_info.version_app))
-        elif key == ParamKeyName.kKeyVersionLoader.value:
-            kvp = LivoxLidarKeyValueParam(key, 4, bytes(g_lidar_info.version_loader))
-        elif key == ParamKeyName.kKeyVersionHardware.value:
-            kvp = LivoxLidarKeyValueParam(key, 4, bytes(g_lidar_info.version_hardware))
-        elif key == ParamKeyName.kKeyMac.value:
-            kvp = LivoxLidarKeyValueParam(key, 6, bytes(g_lidar_info.mac))
-        elif key == ParamKeyName.kKeyCurWorkState.value:
-            kvp = LivoxLidarKeyValueParam(key, 1, struct.pack('B', g_lidar_info.cur_work_state))
-        elif key == ParamKeyName.kKeyCoreTemp.value:
-            kvp = LivoxLidarKeyValueParam(key, 4, struct.pack('i', g_lidar_info.core_temp))
-        elif key == ParamKeyName.kKeyPowerUpCnt.value:
-            kvp = LivoxLidarKeyValueParam(key, 4, struct.pack('I', g_lidar_info.powerup_cnt))
-        elif key == ParamKeyName.kKeyLocalTimeNow.value:
-            kvp = LivoxLidarKeyValueParam(key, 8, struct.pack('Q', g_lidar_info.local_time_now))
-        elif key == ParamKeyName.kKeyLastSyncTime.value:
-            kvp = LivoxLidarKeyValueParam(key, 8, struct.pack('Q', g_lidar_info.last_sync_time))
-        elif key == ParamKeyName.kKeyTimeOffset.value:
-            kvp = LivoxLidarKeyValueParam(key, 8, struct.pack('q', g_lidar_info.time_offset))
-        elif key == ParamKeyName.kKeyTimeSyncType.value:
-            kvp = LivoxLidarKeyValueParam(key, 1, struct.pack('B', g_lidar_info.time_sync_type))
-        elif key == ParamKeyName.kKeyLidarDiagStatus.value:
-            kvp = LivoxLidarKeyValueParam(key, 2, struct.pack('H', g_lidar_info.lidar_diag_status))
-        elif key == ParamKeyName.kKeyFwType.value:
-            try:
-                print(f"FW Type: {g_lidar_info.fw_type}")
-                fw_type_packed = struct.pack('B', g_lidar_info.fw_type)
-                kvp = LivoxLidarKeyValueParam(key, len(fw_type_packed), fw_type_packed)
-            except Exception as e:
-                print(f"Error processing kKeyFwType: {str(e)}")
-                kvp = None
-        elif key == ParamKeyName.kKeyHmsCode.value:
-            kvp = LivoxLidarKeyValueParam(key, 32, struct.pack('8I', *g_lidar_info.hms_code))
-        if kvp is not None:
-            pass
-        else:
-            print(f"get_livox_lidar_info_data: Key {key} not found or unsupported.")
+        kvp = (dev or g_device).store.get(key)
+        if kvp is None:
+            params_log.warning("get_livox_lidar_info_data: Key %s not found or unsupported.", key)
     except struct.error as e:
-        print(f"Struct error in get_livox_lidar_info_data: {e}")
+        params_log.error("Struct error in get_livox_lidar_info_data: %s", e)
     except Exception as e:
-        print(f"Error in get_livox_lidar_info_data: {e}")
+        params_log.error("Error in get_livox_lidar_info_data: %s", e)
 
     return kvp
 
-def set_livox_lidar_info_data(key, kvp):
-    print(f"Processing key: {key}, Value: {kvp.value.hex()}")
-    global g_lidar_info, pcl_sockfd
-
-    if key == ParamKeyName.kKeyPclDataType.value:
-        print("kKeyPclDataType .......................................")
-        if len(kvp.value) != 1:
-            raise ValueError(f"Expected length 1 for kKeyPclDataType, got {len(kvp.value)}")
-        g_lidar_info.pcl_data_type, = struct.unpack('B', kvp.value)
-
-    elif key == ParamKeyName.kKeyPatternMode.value:
-        print("kKeyPatternMode.......................................")
-        if len(kvp.value) != 1:
-            raise ValueError(f"Expected length 1 for kKeyPatternMode, got {len(kvp.value)}")
-        g_lidar_info.pattern_mode, = struct.unpack('B', kvp.value)
-
-    elif key == ParamKeyName.kKeyLidarIpCfg.value:
-        print("kKeyLidarIpCfg.......................................")
-        if len(kvp.value) != struct.calcsize(ip_mask_gw_info.fmt):
-            raise ValueError(f"Expected length {struct.calcsize(ip_mask_gw_info.fmt)} for kKeyLidarIpCfg, got {len(kvp.value)}")
-        g_lidar_info.lidar_ipcfg = ip_mask_gw_info.unpack(kvp.value)
-
-    elif key == ParamKeyName.kKeyStateInfoHostIpCfg.value:
-        print("kKeyStateInfoHostIpCfg.......................................")
-        if len(kvp.value) != struct.calcsize(ip_ports_info.fmt):
-            raise ValueError(f"Expected length {struct.calcsize(ip_ports_info.fmt)} for kKeyStateInfoHostIpCfg, got {len(kvp.value)}")
-        g_lidar_info.host_info = ip_ports_info.unpack(kvp.value)
-        dest_port = socket.ntohs(g_lidar_info.host_info.dest_port)
-        src_port = socket.ntohs(g_lidar_info.host_info.src_port)
-        print_ipcfg(g_lidar_info.host_info.dest_ip, dest_port, src_port)
-
-    elif key == ParamKeyName.kKeyLidarPointDataHostIpCfg.value:
-        print("kKeyLidarPointDataHostIpCfg.......................................")
-        if len(kvp.value) != struct.calcsize(ip_ports_info.fmt):
-            raise ValueError(f"Expected length {struct.calcsize(ip_ports_info.fmt)} for kKeyLidarPointDataHostIpCfg, got {len(kvp.value)}")
-        g_lidar_info.pointcloud_host_ipcfg = ip_ports_info.unpack(kvp.value)
-        dest_port = g_lidar_info.pointcloud_host_ipcfg.dest_port
-        dest_ip = g_lidar_info.pointcloud_host_ipcfg.dest_ip
-        src_port = socket.ntohs(g_lidar_info.pointcloud_host_ipcfg.src_port)
-        print(f"POINT CLOUD DATA.......................................")
-        print_ipcfg(dest_ip, dest_port, src_port)
-        if not isinstance(dest_port, int):
-            raise ValueError(f"Expected integer for dest_port, got {type(dest_port)}")
-
-        if set_pcl_socket(dest_ip, dest_port):
-           pass
-
-    elif key == ParamKeyName.kKeyLidarImuHostIpCfg.value:
-        print("kKeyLidarImuHostIpCfg.......................................")
-        if len(kvp.value) != struct.calcsize(ip_ports_info.fmt):
-            raise ValueError(f"Expected length {struct.calcsize(ip_ports_info.fmt)} for kKeyLidarImuHostIpCfg, got {len(kvp.value)}")
-        g_lidar_info.imu_host_ipcfg = ip_ports_info.unpack(kvp.value)
-        dest_port = socket.ntohs(g_lidar_info.imu_host_ipcfg.dest_port)
-        src_port = socket.ntohs(g_lidar_info.imu_host_ipcfg.src_port)
-        print_ipcfg(g_lidar_info.imu_host_ipcfg.dest_ip, dest_port, src_port)
-
-    elif key == ParamKeyName.kKeyInstallAttitude.value:
-        print("kKeyInstallAttitude.......................................")
-        if len(kvp.value) != struct.calcsize(LivoxLidarInstallAttitude.fmt):
-            raise ValueError(f"Expected length {struct.calcsize(LivoxLidarInstallAttitude.fmt)} for kKeyInstallAttitude, got {len(kvp.value)}")
-        g_lidar_info.install_attitude = LivoxLidarInstallAttitude.unpack(kvp.value)
-
-    elif key == ParamKeyName.kKeyFovCfg0.value:
-        print("kKeyFovCfg0.......................................")
-        if len(kvp.value) != struct.calcsize(FovCfg.fmt):
-            raise ValueError(f"Expected length {struct.calcsize(FovCfg.fmt)} for kKeyFovCfg0, got {len(kvp.value)}")
-        g_lidar_info.fov_cfg0 = FovCfg.unpack(kvp.value)
-
-    elif key == ParamKeyName.kKeyFovCfg1.value:
-        print("kKeyFovCfg1.......................................")
-        if len(kvp.value) != struct.calcsize(FovCfg.fmt):
-            raise ValueError(f"Expected length {struct.calcsize(FovCfg.fmt)} for kKeyFovCfg1, got {len(kvp.value)}")
-        g_lidar_info.fov_cfg1 = FovCfg.unpack(kvp.value)
-
-    elif key == ParamKeyName.kKeyFovCfgEn.value:
-        print("kKeyFovCfgEn.......................................")
-        if len(kvp.value) != 1:
-            raise ValueError(f"Expected length 1 for kKeyFovCfgEn, got {len(kvp.value)}")
-        g_lidar_info.fov_cfg_en, = struct.unpack('B', kvp.value)
-
-    elif key == ParamKeyName.kKeyDetectMode.value:
-        print("kKeyDetectMode.......................................")
-        if len(kvp.value) != 1:
-            raise ValueError(f"Expected length 1 for kKeyDetectMode, got {len(kvp.value)}")
-        g_lidar_info.detect_mode, = struct.unpack('B', kvp.value)
-
-    elif key == ParamKeyName.kKeyFuncIoCfg.value:
-        print("kKeyFuncIoCfg.......................................")
-        g_lidar_info.func_io_cfg = list(kvp.value)
-
-    elif key == ParamKeyName.kKeyWorkMode.value:
-        print("kKeyWorkMode.......................................")
-        if len(kvp.value) != 1:
-            raise ValueError(f"Expected length 1 for kKeyWorkMode, got {len(kvp.value)}")
-        g_lidar_info.work_tgt_mode, = struct.unpack('B', kvp.value)
-
-    elif key == ParamKeyName.kKeyImuDataEn.value:
-        print("kKeyImuDataEn.......................................")
-        if len(kvp.value) != 1:
-            raise ValueError(f"Expected length 1 for kKeyImuDataEn, got {len(kvp.value)}")
-        g_lidar_info.imu_data_en, = struct.unpack('B', kvp.value)
-
-    elif key == ParamKeyName.kKeySn.value:
-        print("kKeySn.......................................")
-        g_lidar_info.sn = kvp.value
-
-    elif key == ParamKeyName.kKeyProductInfo.value:
-        print("kKeyProductInfo.......................................")
-        g_lidar_info.product_info = kvp.value
-
-    elif key == ParamKeyName.kKeyVersionApp.value:
-        print("kKeyVersionApp.......................................")
-        if len(kvp.value) != 4:
-            raise ValueError(f"Expected length 4 for kKeyVersionApp, got {len(kvp.value)}")
-        g_lidar_info.version_app = list(kvp.value)
-
-    elif key == ParamKeyName.kKeyVersionLoader.value:
-        print("kKeyVersionLoader.......................................")
-        if len(kvp.value) != 4:
-            raise ValueError(f"Expected length 4 for kKeyVersionLoader, got {len(kvp.value)}")
-        g_lidar_info.version_loader = list(kvp.value)
-
-    elif key == ParamKeyName.kKeyVersionHardware.value:
-        print("kKeyVersionHardware.......................................")
-        if len(kvp.value) != 4:
-            raise ValueError(f"Expected length 4 for kKeyVersionHardware, got {len(kvp.value)}")
-        g_lidar_info.version_hardware = list(kvp.value)
-
-    elif key == ParamKeyName.kKeyMac.value:
-        print("kKeyMac.......................................")
-        if len(kvp.value) != 6:
-            raise ValueError(f"Expected length 6 for kKeyMac, got {len(kvp.value)}")
-        g_lidar_info.mac = list(kvp.value)
-
-    elif key == ParamKeyName.kKeyCurWorkState.value:
-        print("kKeyCurWorkState.......................................")
-        if len(kvp.value) != 1:
-            raise ValueError(f"Expected length 1 for kKeyCurWorkState, got {len(kvp.value)}")
-        g_lidar_info.cur_work_state, = struct.unpack('B', kvp.value)
-
-    elif key == ParamKeyName.kKeyCoreTemp.value:
-        print("kKeyCoreTemp.......................................")
-        if len(kvp.value) != 4:
-            raise ValueError(f"Expected length 4 for kKeyCoreTemp, got {len(kvp.value)}")
-        g_lidar_info.core_temp, = struct.unpack('i', kvp.value)
-
-    elif key == ParamKeyName.kKeyPowerUpCnt.value:
-        print("kKeyPowerUpCnt.......................................")
-        if len(kvp.value) != 4:
-            raise ValueError(f"Expected length 4 for kKeyPowerUpCnt, got {len(kvp.value)}")
-        g_lidar_info.powerup_cnt, = struct.unpack('I', kvp.value)
-
-    elif key == ParamKeyName.kKeyLocalTimeNow.value:
-        print("kKeyLocalTimeNow.......................................")
-        if len(kvp.value) != 8:
-            raise ValueError(f"Expected length 8 for kKeyLocalTimeNow, got {len(kvp.value)}")
-        g_lidar_info.local_time_now, = struct.unpack('Q', kvp.value)
-
-    elif key == ParamKeyName.kKeyLastSyncTime.value:
-        print("kKeyLastSyncTime.......................................")
-        if len(kvp.value) != 8:
-            raise ValueError(f"Expected length 8 for kKeyLastSyncTime, got {len(kvp.value)}")
-        g_lidar_info.last_sync_time, = struct.unpack('Q', kvp.value)
-
-    elif key == ParamKeyName.kKeyTimeOffset.value:
-        print("kKeyTimeOffset.......................................")
-        if len(kvp.value) != 8:
-            raise ValueError(f"Expected length 8 for kKeyTimeOffset, got {len(kvp.value)}")
-        g_lidar_info.time_offset, = struct.unpack('q', kvp.value)
-
-    elif key == ParamKeyName.kKeyTimeSyncType.value:
-        print("kKeyTimeSyncType.......................................")
-        if len(kvp.value) != 1:
-            raise ValueError(f"Expected length 1 for kKeyTimeSyncType, got {len(kvp.value)}")
-        g_lidar_info.time_sync_type, = struct.unpack('B', kvp.value)
-
-    elif key == ParamKeyName.kKeyLidarDiagStatus.value:
-        print("kKeyLidarDiagStatus.......................................")
-        if len(kvp.value) != 2:
-            raise ValueError(f"Expected length 2 for kKeyLidarDiagStatus, got {len(kvp.value)}")
-        g_lidar_info.lidar_diag_status, = struct.unpack('H', kvp.value)
-
-    elif key == ParamKeyName.kKeyFwType.value:
-        print("kKeyFwType.......................................")
-        if len(kvp.value) != 1:
-            raise ValueError(f"Expected length 1 for kKeyFwType, got {len(kvp.value)}")
-        g_lidar_info.fw_type, = struct.unpack('B', kvp.value)
-
-    elif key == ParamKeyName.kKeyHmsCode.value:
-        print("kKeyHmsCode.......................................")
-        if len(kvp.value) != 32:
-            raise ValueError(f"Expected length 32 for kKeyHmsCode, got {len(kvp.value)}")
-        g_lidar_info.hms_code = list(struct.unpack('8I', kvp.value))
-
-
-def print_ipcfg(ip, dest, src):
-
-    if not isinstance(ip, int):
-        raise ValueError(f"IP must be an integer, got {type(ip)}")
-
-    ip_str = socket.inet_ntoa(struct.pack('!I', ip))
-
-
-def create_lidar_udp_socket(s_addr, port, broadcast_enable=0):
-    try:
-        sockfd = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
-    except socket.error as err:
-        print(f"Socket creation failed on port {port}: {err}")
-        return None
-
-    if broadcast_enable:
-        try:
-            sockfd.setsockopt(socket.SOL_SOCKET, socket.SO_BROADCAST, 1)
-        except socket.error as err:
-            print(f"Set socket broadcast option failed on port {port}: {err}")
-            sockfd.close()
-            return None
-
-    try:
-        sockfd.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
-        sockfd.setsockopt(socket.SOL_SOCKET, socket.SO_RCVBUF, MAXLEN)
-        sockfd.setsockopt(socket.SOL_SOCKET, socket.SO_SNDBUF, MAXLEN)
-        sockfd.bind((s_addr, port))
-    except socket.error as err:
-        print(f"Socket bind failed on port {port}: {err}")
-        sockfd.close()
-        return None
-
-    return sockfd
-
-def handle_device_type_query(sockfd, client_addr, req):
-    ack = LivoxLidarDeviceAck(0x00, LivoxLidarDeviceType.kLivoxLidarTypeMid360.value, LIDAR_DEVICE_SN.encode('utf-8'), struct.unpack("!L", socket.inet_aton(LIDAR_DEVICE_IP))[0], ctrl_cmd_port_device)
+def set_livox_lidar_info_data(key, kvp, dev=None):
+    params_log.debug("Processing key: %s, Value: %s", key, lazy_hex(kvp.value))
+    (dev or g_device).store.set(key, kvp.value)
+
+
+CMD_CRC16_OFFSET = 18
+_CMD_CRC16 = struct.Struct('<H')
+
+def pack_cmd_response(response):
+    # Packs header and data in one pass: crc32_d covers the data, crc16_h
+    # the first 18 header bytes, written in place once the header is packed.
+    buf = bytearray(LivoxLidarCmdPacket.size + len(response.data))
+    response.length = len(buf)
+    t0 = time.perf_counter_ns()
+    response.crc32_d = calculate_crc32(response.data)
+    response.pack_into(buf)
+    response.crc16_h = calculate_crc16(memoryview(buf)[:CMD_CRC16_OFFSET])
+    _CMD_CRC16.pack_into(buf, CMD_CRC16_OFFSET, response.crc16_h)
+    CMD_CRC.record(time.perf_counter_ns() - t0)
+    return buf
+
+def handle_device_type_query(sockfd, client_addr, req, dev=None):
+    dev = dev or g_device
+    ack = LivoxLidarDeviceAck(0x00, LivoxLidarDeviceType.kLivoxLidarTypeMid360.value, dev.sn.encode('utf-8'), struct.unpack("!L", socket.inet_aton(dev.ip))[0], dev.cmd_port)
     data = ack.pack()
     response = LivoxLidarCmdPacket(req.sof, req.version, len(data) + 24, req.seq_num, 0x0000, 0x01, 0x01, req.rsvd, 0, 0, data)
-    response.crc16_h = calculate_crc16(response.pack()[:18])
-    response.crc32_d = calculate_crc32(response.pack()[24:])
-    packed_response = response.pack()
-    print_buffer(packed_response)
+    packed_response = pack_cmd_response(response)
+    log_hexdump(log, packed_response, "Device type query response")
     sockfd.sendto(packed_response, client_addr)
-    print(f"Sent device type query response to {client_addr[0]}:{client_addr[1]}")
+    log.info("Sent device type query response to %s:%d", *client_addr)
 
-def handle_parameter_inquire(sockfd, client_addr, req):
+def handle_parameter_inquire(sockfd, client_addr, req, dev=None):
     try:
-        print("Received Parameter Inquire request with key list:")
+        log.debug("Received Parameter Inquire request with key list:")
         response_buffer = bytearray(MAXLEN)
         response = LivoxLidarCmdPacket(req.sof, req.version, 0, req.seq_num, req.cmd_id, 0x01, 0x01, req.rsvd, 0, 0, b'')
         response_length = 24
 
         key_num = struct.unpack_from('<H', req.data, 0)[0]
-        print(f"Number of keys: {key_num}")
+        log.debug("Number of keys: %d", key_num)
 
         ack = struct.pack('<BH', 0x00, key_num)
         response_buffer[24:27] = ack
@@ -360,8 +99,8 @@ def handle_parameter_inquire(sockfd, client_addr, req):
 
         for i in range(key_num):
             key = struct.unpack_from('<H', key_list, i * 2)[0]
-            print(f"Key {i}: 0x{key:04x}")
-            kvp = get_livox_lidar_info_data(key)
+            log.debug("Key %d: 0x%04x", i, key)
+            kvp = get_livox_lidar_info_data(key, dev)
             if kvp is None:
                ack = LivoxLidarParamInquireAck(0x01, 1, 0)
                response_buffer[24:27] = ack.pack()
@@ -371,34 +110,31 @@ def handle_parameter_inquire(sockfd, client_addr, req):
             response_buffer[response_length:response_length + len(kvp_packed)] = kvp_packed
             response_length += len(kvp_packed)
 
-            print(f"Packed Key-Value Pair {i}: ", end="")
-            print_buffer(kvp_packed)
+            log_hexdump(log, kvp_packed, "Packed Key-Value Pair %d", i)
 
         response.data = response_buffer[24:response_length]
         response.length = response_length
-        response.crc16_h = calculate_crc16(response.pack()[:18])
-        response.crc32_d = calculate_crc32(response.pack()[24:])
-        packed_response = response.pack()
+        packed_response = pack_cmd_response(response)
 
-        print_buffer(packed_response)
+        log_hexdump(log, packed_response, "Parameter inquire response")
 
         sockfd.sendto(packed_response, client_addr)
-        print(f"Sent parameter inquire response to {client_addr[0]}:{client_addr[1]}")
+        log.info("Sent parameter inquire response to %s:%d", *client_addr)
     except Exception as e:
-        print(f"Error in handle_parameter_inquire: {e}")
+        log.error("Error in handle_parameter_inquire: %s", e)
 
-def handle_parameter_configuration(sockfd, client_addr, req):
+def handle_parameter_configuration(sockfd, client_addr, req, dev=None):
     try:
         kvp_list = []
         data_ptr = 0
         while data_ptr < len(req.data):
             remaining_data = len(req.data) - data_ptr
-            expected_header_size = struct.calcsize(LivoxLidarKeyValueParam.fmt)
+            expected_header_size = LivoxLidarKeyValueParam.size
 
             if remaining_data < expected_header_size:
                 break
 
-            key, length = struct.unpack(LivoxLidarKeyValueParam.fmt, req.data[data_ptr:data_ptr + expected_header_size])
+            key, length = struct.unpack_from(LivoxLidarKeyValueParam.fmt, req.data, data_ptr)
             data_ptr += expected_header_size
 
             if length == 0:
@@ -411,207 +147,360 @@ def handle_parameter_configuration(sockfd, client_addr, req):
             data_ptr += length
             kvp = LivoxLidarKeyValueParam(key, length, value)
             kvp_list.append(kvp)
-            print(f"Unpacked Key: {key}, Length: {length}, Value: {value.hex()}")
+            log.debug("Unpacked Key: %d, Length: %d, Value: %s", key, length, lazy_hex(value))
 
+        # A rejected value keeps the key's old setting; the ack reports the
+        # first rejected key, the others are still applied.
+        ret_code, error_key = LivoxLidarRetCode.kLivoxLidarRetSuccess.value, 0x0000
         for i, kvp in enumerate(kvp_list):
-            print(f"Setting key {i}: {kvp.key}, Value: {kvp.value.hex()}")
-            set_livox_lidar_info_data(kvp.key, kvp)
+            log.debug("Setting key %d: %d, Value: %s", i, kvp.key, lazy_hex(kvp.value))
+            try:
+                set_livox_lidar_info_data(kvp.key, kvp, dev)
+            except ValueError as e:
+                log.warning("Rejected key 0x%04x: %s", kvp.key, e)
+                if ret_code == LivoxLidarRetCode.kLivoxLidarRetSuccess.value:
+                    ret_code, error_key = LivoxLidarRetCode.kLivoxLidarRetOutOfRange.value, kvp.key
 
-        ack = struct.pack('<BH', 0x00, 0x0000)
+        ack = struct.pack('<BH', ret_code, error_key)
 
         response = LivoxLidarCmdPacket(req.sof, req.version, len(ack) + 24, req.seq_num, req.cmd_id, 0x01, 0x01, req.rsvd, 0, 0, ack)
-        response.crc16_h = calculate_crc16(response.pack()[:18])
-        response.crc32_d = calculate_crc32(response.pack()[24:])
-        packed_response = response.pack()
+        packed_response = pack_cmd_response(response)
 
-        print_buffer(packed_response)
+        log_hexdump(log, packed_response, "Parameter configuration response")
 
         sockfd.sendto(packed_response, client_addr)
-        print(f"Sent parameter configuration response to {client_addr[0]}:{client_addr[1]}")
+        log.info("Sent parameter configuration response to %s:%d", *client_addr)
     except Exception as e:
-        print(f"Error in handle_parameter_configuration: {e}")
-        exit()
-
-def handle_command_protocol():
-    sockets = []
-
-    sockets.append(create_lidar_udp_socket('0.0.0.0', broadcast_port, 1))
-    sockets.append(create_lidar_udp_socket(LIDAR_DEVICE_IP, ctrl_cmd_port_device, 0))
-
-    fds = []
-    for sock in sockets:
-        if sock is not None:
-            fds.append({'fd': sock, 'events': POLLIN})
-
-    poller = poll()
-    for fd in fds:
-        poller.register(fd['fd'], fd['events'])
+        # Handlers run on the event loop, so a bad request must not take
+        # every device down with it; the host sees no ack and retries.
+        log.error("Error in handle_parameter_configuration: %s", e)
+
+def dispatch_command(sock, client_address, pkt, dev, registry):
+    cmd_type = pkt.cmd_type
+    cmd_id = pkt.cmd_id
+    if cmd_type == 0x00:
+        if cmd_id == 0x0000:
+            if dev is None:
+                # Discovery on the broadcast port: every device answers
+                # from its own command socket, as separate sensors would.
+                for each in registry:
+                    handle_device_type_query(each.cmd_sock or sock, client_address, pkt, each)
+            else:
+                handle_device_type_query(sock, client_address, pkt, dev)
+        elif cmd_id == 0x0100:
+            handle_parameter_configuration(sock, client_address, pkt, dev or registry[0])
+        elif cmd_id == 0x0101:
+            handle_parameter_inquire(sock, client_address, pkt, dev or registry[0])
+        else:
+            CMD_ERRORS.add()
+            log.warning("Unknown command ID: %d", cmd_id)
+    else:
+        CMD_ERRORS.add()
+        log.warning("Unknown command type: %d", cmd_type)
+
+def pointcloud_frame_params(points, start_perf_ns, point_period_ns, dev=None, timestamp_ns=None):
+    # Packet stamps come from a per-point 'timestamp' field, else from
+    # timestamp_ns (the first point's time on the lidar clock), else from
+    # start_perf_ns on the perf_counter_ns() timeline.
+    dev = dev or g_device
+    clock = dev.clock
+    data_type = dev.info.pcl_data_type
+    dots = DOTS_PER_PACKET[data_type]
+
+    if points.dtype.names and 'timestamp' in points.dtype.names:
+        timestamps, intervals = PacketClock.packet_times_from_source(source_timestamps_ns(points['timestamp']), dots)
+    elif timestamp_ns is not None:
+        timestamps, intervals = PacketClock.packet_times_at(int(timestamp_ns), len(points), dots, point_period_ns)
+    else:
+        if start_perf_ns is None:
+            start_perf_ns = time.perf_counter_ns()
+        timestamps, intervals = clock.packet_times(start_perf_ns, len(points), dots, point_period_ns)
+
+    return {
+        'frame_cnt': clock.next_frame(),
+        'timestamp': timestamps,
+        'time_interval': intervals,
+        'time_type': clock.time_type(),
+        'data_type': data_type,
+        'dot_num': dots,
+    }
+
+def handle_parameter_pointcloud_data(points, data_seq, scale=PCL_FILE_UNIT_MM, start_perf_ns=None, point_period_ns=NOMINAL_POINT_PERIOD_NS, dev=None,
+                                     timestamp_ns=None):
+    t0 = time.perf_counter_ns()
+    params = pointcloud_frame_params(points, start_perf_ns, point_period_ns, dev, timestamp_ns)
+    buf, offsets = encode_packets(points, udp_cnt=data_seq, scale=scale, **params)
+    ENCODE_TIME.record(time.perf_counter_ns() - t0)
+    ENCODED_POINTS.add(len(points))
+    ENCODED_PACKETS.add(len(offsets) - 1)
+    return buf, offsets
+
+def enqueue_pointcloud_data(ring, points, data_seq, scale=PCL_FILE_UNIT_MM, start_perf_ns=None, point_period_ns=NOMINAL_POINT_PERIOD_NS, dev=None,
+                            scheduler=None, lock=None):
+    # Encodes a frame straight into ring slots. Packets that cannot get a
+    # slot within PCL_RING_PUT_TIMEOUT are dropped but keep their udp_cnt,
+    # unless the device has point data paused; then they wait for it.
+    # With a scheduler and lock, start_perf_ns is on the unshifted timeline
+    # and each chunk is stamped with the scheduler's pause shift under lock.
+    t0 = time.perf_counter_ns()
+    dev = dev or g_device
+    params = pointcloud_frame_params(points, start_perf_ns, point_period_ns, dev)
+    timestamps = params.pop('timestamp')
+    intervals = params.pop('time_interval')
+    dots = params['dot_num']
+    point_size = POINT_DTYPES[params['data_type']].itemsize
+    n_pkts = len(timestamps)
+
+    encode_ns = time.perf_counter_ns() - t0
+    done = 0
+    while done < n_pkts:
+        start, count = ring.acquire(n_pkts - done, PCL_RING_PUT_TIMEOUT)
+        if count == 0:
+            if not ring.closed and not dev.work.points.is_set():
+                dev.work.points.wait(0.1)
+                continue
+            ring.drop(n_pkts - done)
+            break
+        t0 = time.perf_counter_ns()
+        if lock is not None:
+            lock.acquire()
+        try:
+            chunk = timestamps[done:done + count]
+            if scheduler is not None and scheduler.shifted_ns:
+                chunk = chunk + np.uint64(scheduler.shifted_ns)
+            lengths = encode_packets_into(
+                ring.slots[start:start + count],
+                points[done * dots:(done + count) * dots],
+                udp_cnt=data_seq + done,
+                timestamp=chunk,
+                time_interval=intervals[done:done + count],
+                scale=scale,
+                **params,
+            )
+            ring.commit(start, count, lengths, (lengths - HEADER_SIZE) // point_size, frame_start=(done == 0))
+        finally:
+            if lock is not None:
+                lock.release()
+        encode_ns += time.perf_counter_ns() - t0
+        done += count
+
+    # Encode time excludes waiting for ring slots.
+    ENCODE_TIME.record(encode_ns)
+    ENCODED_POINTS.add(min(len(points), done * dots))
+    ENCODED_PACKETS.add(done)
+    return n_pkts
+
+def produce_pcl_data_from_file(source, ring, scheduler, pace_frames, dev=None, lock=None):
+    # Encodes the frames of a ReplaySource into ring until it ends. lock,
+    # if given, is the stream's timeline lock (see PointStream.flowing).
+    seq_num = 0
+    produced = 0
+    sampler = Sampler(replay_log)
+    dev = dev or g_device
+    with lock or threading.Lock():
+        origin_ns = scheduler.start_ns - scheduler.shifted_ns
 
     try:
-        while True:
-            events = poller.poll()
-
-            for fd, event in events:
-                if event & POLLIN:
-                    sock = None
-                    for s in sockets:
-                        if s.fileno() == fd:
-                            sock = s
-                            break
-
-                    if sock is None:
-                        print(f"No matching socket found for fd {fd}")
-                        continue
-
-                    buffer = bytearray(MAXLEN)
-                    n, client_address = sock.recvfrom_into(buffer)
-                    if n < 0:
-                        print(f"recvfrom error on socket {sock.fileno()}")
-                        continue
-
-                    print(f"CLIENT IP ......{client_address[0]} PORT .............{client_address[1]}")
-
-                    pkt = LivoxLidarCmdPacket.unpack(buffer)
-                    cmd_type = pkt.cmd_type
-                    cmd_id = pkt.cmd_id
-
-                    print(f"\n cmd_type 0x{cmd_type:x}, cmd_id= 0x{cmd_id:x} length {n}")
-
-                    if cmd_type == 0x00:
-                        if cmd_id == 0x0000:
-                            handle_device_type_query(sock, client_address, pkt)
-                        elif cmd_id == 0x0100:
-                            handle_parameter_configuration(sock, client_address, pkt)
-                        elif cmd_id == 0x0101:
-                            handle_parameter_inquire(sock, client_address, pkt)
-                        else:
-                            print(f"Unknown command ID: {cmd_id}")
-                    else:
-                        print(f"Unknown command type: {cmd_type}")
-    except KeyboardInterrupt:
-        print("Terminating handle_command_protocol.")
+        for index, points in source.indexed_frames():
+            # Encode nothing new while the host has point data paused.
+            while not ring.closed and not dev.work.points.is_set():
+                dev.work.points.wait(0.1)
+            if ring.closed:
+                break
+            # Only looped frames come round again, so only they are cached.
+            points = dev.pipeline.process(points, source.scale_mm, index if source.loop else None)
+            if len(points) == 0:
+                continue
+            # Stamp packets with their nominal slot on the scheduler timeline;
+            # the producer runs ahead of the transmitter by up to a ring.
+            timeline = scheduler
+            if scheduler.period_ns == 0:
+                start_ns, point_period_ns = time.perf_counter_ns(), NOMINAL_POINT_PERIOD_NS
+                timeline = None
+            elif pace_frames:
+                start_ns = origin_ns + produced * scheduler.period_ns
+                point_period_ns = scheduler.period_ns / max(1, len(points))
+            else:
+                start_ns = origin_ns + produced * scheduler.period_ns
+                point_period_ns = scheduler.period_ns
+            n_pkts = enqueue_pointcloud_data(ring, points, seq_num, source.scale_mm, start_ns, point_period_ns, dev,
+                                             timeline, lock)
+            if sampler.tick(n_pkts):
+                replay_log.info("Queued %d frames, %d packets; last %d packets (%d points) from sequence number %d",
+                                sampler.count, sampler.items, n_pkts, len(points), seq_num)
+            seq_num = (seq_num + n_pkts) & 0xFFFF
+            produced += 1 if pace_frames else len(points)
+
+        replay_log.info("No more point cloud data: %d frames, %d packets queued.", sampler.count, sampler.items)
     finally:
-        for sock in sockets:
-            sock.close()
-
-    return 0
-
-def read_pointclouddata_oneline_from_file(file, timestamp):
-    while True:
-        line = file.readline()
-        if not line:
-            return None
-
-        tokens = line.split()
-        if len(tokens) < 4:
-            continue
-
-        try:
-            x = int(tokens[0])
-            y = int(tokens[1])
-            z = int(tokens[2])
-            reflectivity = int(tokens[3])
-        except ValueError:
-            continue
-
-        static_time = getattr(read_pointclouddata_oneline_from_file, "static_time", 0)
-        if static_time == 0:
-            static_time = timestamp[0]
-            setattr(read_pointclouddata_oneline_from_file, "static_time", static_time)
+        ring.close()
+
+class PointStream:
+    # Replay state for one device: a producer thread encoding the device's
+    # frames into its own ring, and the schedule its packets go out on.
+    # source is a ReplaySource or a reader to replay whole; its speed
+    # scales the replay rate.
+
+    def __init__(self, dev, source, points_per_second=PCL_POINTS_PER_SECOND, frames_per_second=PCL_FRAMES_PER_SECOND):
+        self.dev = dev
+        self.source = replay_source(source)
+        self.ring = PacketRing()
+        self.pace_frames = frames_per_second > 0
+        rate = frames_per_second if self.pace_frames else points_per_second
+        self.scheduler = RateScheduler(rate * self.source.speed, PCL_SCHED_POLICY)
+        self.producer = None
+        self.timeline = threading.Lock()
+        self.paused_ns = 0
+        self._send_frame = True
+        self._flowing = True
+        self._paused_at = 0
+
+    def start(self, now_ns=None):
+        self.scheduler.start(now_ns)
+        self.flowing(self.scheduler.start_ns)
+        self.producer = threading.Thread(target=produce_pcl_data_from_file, daemon=True,
+                                         args=(self.source, self.ring, self.scheduler, self.pace_frames, self.dev,
+                                               self.timeline))
+        self.producer.start()
+
+    def flowing(self, now_ns=None):
+        # Follows the device's point data gate; call from the sending
+        # thread. On resuming, the schedule and the timestamps of the packets
+        # already queued move past the pause, so replay carries on from the
+        # same frame without a burst or a jump in time.
+        on = self.dev.work.points.is_set()
+        if on != self._flowing:
+            now_ns = time.perf_counter_ns() if now_ns is None else now_ns
+            if on:
+                paused = now_ns - self._paused_at
+                with self.timeline:
+                    self.scheduler.shift(paused)
+                    rows = self.ring.pending()
+                    shift_timestamps(self.ring.slots, rows, self.ring.lengths[rows], paused)
+                self.paused_ns += paused
+                replay_log.info("%s: point data resumed after %.3f s", self.dev.sn, paused / 1e9)
+            else:
+                self._paused_at = now_ns
+                replay_log.info("%s: point data paused", self.dev.sn)
+            self._flowing = on
+        return on
+
+    def next_batch(self, timeout):
+        # (start, count) of the next run of encoded packets, kept within one
+        # frame when pacing frames so frames are paced whole.
+        start, count = self.ring.peek(PCL_SEND_BATCH_SIZE, timeout)
+        if count and self.pace_frames:
+            boundary = np.flatnonzero(self.ring.frame_start[start + 1:start + count])
+            if len(boundary):
+                count = int(boundary[0]) + 1
+        return start, count
+
+    def due_in_ns(self, start):
+        if self.pace_frames and not self.ring.frame_start[start]:
+            return 0
+        return self.scheduler.remaining_ns()
+
+    def send_batch(self, start, count, block=True):
+        # Waits for the batch's slot unless block is False, for callers that
+        # have already waited out due_in_ns(); then only the slot is reserved.
+        ring = self.ring
+        claim = self.scheduler.wait if block else self.scheduler.reserve
+        if self.pace_frames:
+            if ring.frame_start[start]:
+                self._send_frame = claim(1)
+            send = self._send_frame
         else:
-            static_time += 480765
-            setattr(read_pointclouddata_oneline_from_file, "static_time", static_time)
-        timestamp[0] = static_time
-
-        point = LivoxLidarCartesianLowRawPoint(x, y, z, reflectivity, 0)
-        print(point)
-        return point.pack()
-
-def get_livox_lidar_pointcloud_data(response_buff, timestamp):
-    data = read_pointclouddata_oneline_from_file(get_pcl_file(), timestamp)
-    if data is None:
+            send = claim(int(ring.dots[start:start + count].sum()))
+        if send and self.dev.send_pcl_packets(ring.buf, ring.offsets[start:start + count], ring.lengths[start:start + count]) < 0:
+            replay_log.error("Error sending message to device")
+            return -1
+        ring.release(count)
         return 0
 
-    response_buff.extend(data)
-    return len(data)
-
-def handle_parameter_pointcloud_data(resp_buffer, data_seq):
-    local_buffer = bytearray()
-    save_buffer_start = bytes(resp_buffer)
-    resp_buffer_len = 0
-    len1 = struct.calcsize(LivoxLidarEthernetPacket.fmt)
-    dot_num = 0
-    timestamp = [0]
-
-    while dot_num < POINTCLOUDDATAMAX:
-        resp_buffer_len += len1
-
-        len1 = get_livox_lidar_pointcloud_data(local_buffer, timestamp)
-        if len1 == 0:
-            break
-        dot_num += 1
-
-    print(f"shamil length:::::::::::::::::{resp_buffer_len}")
-
-    packet = LivoxLidarEthernetPacket(
-        version=0,
-        length=resp_buffer_len,
-        time_interval=0,
-        dot_num=dot_num,
-        udp_cnt=data_seq,
-        frame_cnt=1,
-        data_type=2,
-        time_type=0,
-        rsvd=b'\x00' * 12,
-        crc32=0,
-        timestamp=23875872534872,
-        data=local_buffer
-    )
-    packed_packet = packet.pack()
-
-    temp = bytearray()
-    temp = packed_packet + local_buffer
-    hex_data = temp[28:resp_buffer_len].hex()
-    crc32_value = calculate_crc32(bytes.fromhex(hex_data))
-    packet.crc32 = crc32_value
-    packed_packet = packet.pack()
-    resp_buffer.extend(packed_packet)
-    resp_buffer.extend(local_buffer)
-
-    return resp_buffer_len
-
-def handle_pcl_data_from_file():
-    global pcl_sockfd
-    buffer = bytearray()
-    seq_num = 0
-    buffer_len = 0
-
-    time.sleep(10)
-
-    print(f"sizeof data2 {struct.calcsize(LivoxLidarCartesianLowRawPoint.fmt)}")
-
+    def close(self):
+        self.ring.close()
+        transmitter = self.dev.pcl_transmitter
+        replay_log.info("%s: point stream %s, ring drops %d, send drops %d, paused %.1f s, looped %d times",
+                        self.dev.sn, self.scheduler.summary(), self.ring.dropped,
+                        transmitter.dropped if transmitter is not None else 0, self.paused_ns / 1e9, self.source.loops)
+
+def stream_gauges(streams):
+    gauge('lidar_ring_packets', 'Encoded packets waiting in the send rings',
+          lambda: sum(len(stream.ring) for stream in streams))
+    gauge('lidar_ring_dropped_packets', 'Packets dropped because a send ring was full',
+          lambda: sum(stream.ring.dropped for stream in streams))
+    gauge('lidar_sched_late_max_seconds', 'Worst lateness against the replay schedule',
+          lambda: max(stream.scheduler.stats()['late_max_us'] for stream in streams) / 1e6)
+
+def next_due_batch(streams):
+    # (due_in_ns, stream, start, count) for the stream whose next batch is
+    # due first, or None if no stream has packets ready.
+    best = None
+    for stream in streams:
+        start, count = stream.next_batch(0)
+        if count:
+            due = stream.due_in_ns(start)
+            if best is None or due < best[0]:
+                best = (due, stream, start, count)
+    return best
+
+def replay_streams(streams, start_ns=None):
+    # Sends every stream from this thread, always serving the stream whose
+    # next batch is due first.
+    if start_ns is None:
+        start_ns = time.perf_counter_ns()
+    for stream in streams:
+        stream.start(start_ns)
+    stream_gauges(streams)
+    # Wakes the loop when a paused device may resume.
+    wake = threading.Event()
+    for stream in streams:
+        stream.dev.work.add_listener(wake.set)
+
+    active = list(streams)
     try:
-        while True:
-            print(f"Reading point cloud data for sequence number: {seq_num}")
-            buffer_len = handle_parameter_pointcloud_data(buffer, seq_num)
-            if buffer_len < 100:
-                print("Buffer length less than 100, exiting.")
-                return 0
-            print(f"Sending point cloud data for sequence number: {seq_num} with buffer length: {buffer_len}")
-            if send_pcl_data(buffer, buffer_len) < 0:
-                print("Error sending message to device")
+        while active:
+            wake.clear()
+            active = [stream for stream in active if not stream.ring.drained()]
+            flowing = [stream for stream in active if stream.flowing()]
+            if not flowing:
+                if active:
+                    wake.wait(0.1)
+                continue
+            if len(flowing) == 1:
+                stream = flowing[0]
+                start, count = stream.next_batch(0.1)
+                if count and stream.send_batch(start, count) < 0:
+                    return -1
+                continue
+
+            best = next_due_batch(flowing)
+            if best is None:
+                time.sleep(PCL_IDLE_POLL)
+                continue
+            _, stream, start, count = best
+            if stream.send_batch(start, count) < 0:
                 return -1
-            print(f"handlePCLdatafromfile .............{seq_num} Length: {buffer_len}")
-            buffer.clear()
-            seq_num += 1
-            time.sleep(0.01)
 
     except KeyboardInterrupt:
-        print("Terminating handle_pcl_data_from_file.")
+        replay_log.info("Terminating point replay.")
 
     finally:
-        if pcl_sockfd:
-            print(f"Closing socket with descriptor: {pcl_sockfd.fileno()}")
-            pcl_sockfd.close()
+        for stream in streams:
+            stream.dev.work.remove_listener(wake.set)
+            stream.close()
 
     return 0
+
+def replay_pcl_data(reader, points_per_second=PCL_POINTS_PER_SECOND, frames_per_second=PCL_FRAMES_PER_SECOND, dev=None):
+    # Streams every frame of reader to the device's point data socket,
+    # paced by frames_per_second if set, else points_per_second (0 = unpaced).
+    return replay_streams([PointStream(dev or g_device, reader, points_per_second, frames_per_second)])
+
+def point_streams(devices, points_per_second=PCL_POINTS_PER_SECOND, frames_per_second=PCL_FRAMES_PER_SECOND):
+    return [PointStream(dev, dev.pcl_source, points_per_second, frames_per_second)
+            for dev in devices if dev.pcl_source is not None]
+
+def close_point_sockets(devices):
+    for dev in devices:
+        dev.close_pcl_socket()
@@ -0,0 +1,109 @@
+# lidar/push.py
+import struct
+from .config import PUSH_FULL_EVERY, PUSH_KEYS
+from .device import resolve_host_ip
+from .enums import ParamKeyName
+from .metrics import PUSH_PACKETS
+from .packet import LivoxLidarCmdPacket, LivoxLidarKeyValueParam
+from .params import PARAM_SPECS
+from .protocol import pack_cmd_response
+from .log import get_logger, PARAMS
+
+log = get_logger(PARAMS)
+
+PUSH_CMD_ID = 0x0102
+PUSH_CMD_TYPE = 0x00  # Sent unsolicited, not as an ack
+PUSH_SENDER_TYPE = 0x01  # Lidar
+_PUSH_HEADER = struct.Struct('<HH')  # key_num, rsvd
+
+_MISSING = object()
+
+
+def _snapshot(value):
+    # A cheap comparable copy of a state value, so unchanged keys are
+    # recognised without encoding them.
+    if hasattr(value, '_fields'):
+        return value._fields()
+    if isinstance(value, list):
+        return tuple(value)
+    return value
+
+
+class StatePusher:
+    # Builds one device's state-info push messages (cmd 0x0102): key_num,
+    # rsvd and a key-value list of the keys whose value changed since the
+    # last push. Every full_every pushes all keys go out, so a host that
+    # joins late catches up; unchanged keys then reuse their last encoding.
+
+    def __init__(self, dev, keys=PUSH_KEYS, full_every=PUSH_FULL_EVERY):
+        self.dev = dev
+        if keys is None:
+            keys = PARAM_SPECS
+        self.specs = [PARAM_SPECS[key.value if isinstance(key, ParamKeyName) else key] for key in keys]
+        self.full_every = full_every
+        self.seq_num = 0
+        self.pushes = 0
+        self.sent = 0
+        self.failed = 0
+        self._values = {}
+        self._encoded = {}
+
+    def build(self, full=False):
+        # Returns the key-value payload and the number of keys in it.
+        store = self.dev.store
+        info = self.dev.info
+        parts = []
+        for spec in self.specs:
+            if spec.on_get is not None:
+                spec.on_get(store)
+            value = getattr(info, spec.attr)
+            snapshot = _snapshot(value)
+            if self._values.get(spec.key, _MISSING) == snapshot:
+                if not full:
+                    continue
+                packed = self._encoded[spec.key]
+            else:
+                encoded = spec.codec.encode(value)
+                packed = LivoxLidarKeyValueParam(spec.key, len(encoded), encoded).pack()
+                self._values[spec.key] = snapshot
+                self._encoded[spec.key] = packed
+            parts.append(packed)
+        return b''.join(parts), len(parts)
+
+    def packet(self):
+        # The next push as a packed command packet.
+        full = self.full_every > 0 and self.pushes % self.full_every == 0
+        payload, key_num = self.build(full)
+        data = _PUSH_HEADER.pack(key_num, 0) + payload
+        pkt = LivoxLidarCmdPacket(0xAA, 0, LivoxLidarCmdPacket.size + len(data), self.seq_num, PUSH_CMD_ID,
+                                  PUSH_CMD_TYPE, PUSH_SENDER_TYPE, b'\x00' * 6, 0, 0, data)
+        self.seq_num = (self.seq_num + 1) & 0xFFFF
+        self.pushes += 1
+        return pack_cmd_response(pkt), key_num
+
+    def dest(self):
+        cfg = self.dev.info.host_info
+        return resolve_host_ip(cfg.dest_ip), cfg.dest_port
+
+    def push(self):
+        # Sends the next push from the device's push socket to the host in
+        # host_info (kKeyStateInfoHostIpCfg). Returns -1 on error.
+        sock = self.dev.push_sock
+        if sock is None:
+            return -1
+        buf, key_num = self.packet()
+        dest = self.dest()
+        try:
+            sock.sendto(buf, dest)
+        except OSError as e:
+            # Warn once per run of failures; the host may simply be absent.
+            self.failed += 1
+            (log.warning if self.failed == 1 else log.debug)("%s: state push to %s:%d failed: %s", self.dev.sn, *dest, e)
+            return -1
+        if self.failed:
+            log.info("%s: state push to %s:%d recovered after %d failures", self.dev.sn, *dest, self.failed)
+            self.failed = 0
+        self.sent += 1
+        PUSH_PACKETS.add()
+        log.debug("%s: pushed %d keys (%d bytes) to %s:%d", self.dev.sn, key_num, len(buf), *dest)
+        return 0
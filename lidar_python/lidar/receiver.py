@@ -0,0 +1,434 @@
+# lidar/receiver.py
+import ctypes
+import errno
+import select
+import socket
+import time
+import numpy as np
+from .config import (LIDAR_HOST_IP, point_data_port_host, imu_data_port_host, RECV_BATCH_SIZE, RECV_SLOT_SIZE,
+                     RECV_FRAME_POINTS, RECV_FRAME_IDLE)
+from .attitude import PointTransform
+from .crc import calculate_crc32
+from .encoder import HEADER_DTYPE, HEADER_SIZE, CRC32_OFFSET, POINT_DTYPES, IMU_DTYPE, IMU_DATA_TYPE, packet_dtype
+from .sockopt import apply_profile
+from .metrics import RECV_PACKETS, RECV_BYTES, RECV_INVALID, RECV_LOST, RECV_FRAMES
+from .timing import TIME_INTERVAL_UNIT_NS
+from .mmsg import iovec, msghdr, mmsghdr, recvmmsg
+from .log import get_logger, RECEIVE
+
+log = get_logger(RECEIVE)
+
+# The host side of the point and IMU streams: drains datagrams into a
+# preallocated pool of fixed-size slots, validates them, tracks udp_cnt and
+# reassembles point frames. Header and payload views alias the slots, so
+# they stay valid only until the next recv().
+
+# Decoded points, in metres whatever the wire format.
+FRAME_DTYPE = np.dtype([
+    ('x', '<f4'),
+    ('y', '<f4'),
+    ('z', '<f4'),
+    ('reflectivity', 'u1'),
+    ('tag', 'u1'),
+    ('timestamp', '<u8'),
+])
+IMU_PACKET_DTYPE = np.dtype([('header', HEADER_DTYPE), ('imu', IMU_DTYPE)])
+
+FRAME_UNIT_MM = 1000
+
+# Wire unit of the cartesian formats, in metres.
+_CARTESIAN_UNIT_M = {1: 1e-3, 2: 1e-2}
+
+# Point size by data_type; unknown types get -1 so no payload matches.
+_POINT_SIZES = np.full(256, -1, np.int64)
+for _data_type, _dt in POINT_DTYPES.items():
+    _POINT_SIZES[_data_type] = _dt.itemsize
+
+_MSG_DONTWAIT = getattr(socket, 'MSG_DONTWAIT', 0x40)
+_MSG_TRUNC = getattr(socket, 'MSG_TRUNC', 0x20)
+
+
+class PacketReceiver:
+    # Drains one socket into slots (a (batch_size, slot_size) uint8 array)
+    # with a single recvmmsg() call per batch, or a recv_into() loop where
+    # recvmmsg is unavailable. Datagrams longer than slot_size are
+    # truncated and reported with length -1.
+
+    def __init__(self, sock, batch_size=RECV_BATCH_SIZE, slot_size=RECV_SLOT_SIZE, use_recvmmsg=True):
+        self.sock = sock
+        self.slot_size = slot_size
+        self.slots = np.zeros((max(1, int(batch_size)), slot_size), np.uint8)
+        self.lengths = np.zeros(len(self.slots), np.int64)
+        self.use_recvmmsg = use_recvmmsg and recvmmsg is not None
+        self.packets = 0
+        self.bytes = 0
+        self._poll = select.poll()
+        self._poll.register(sock, select.POLLIN)
+
+        if self.use_recvmmsg:
+            n = len(self.slots)
+            base = self.slots.ctypes.data
+            self._iovs = (iovec * n)()
+            self._msgs = (mmsghdr * n)()
+            for i in range(n):
+                self._iovs[i].iov_base = base + i * slot_size
+                self._iovs[i].iov_len = slot_size
+                hdr = self._msgs[i].msg_hdr
+                hdr.msg_iov = ctypes.pointer(self._iovs[i])
+                hdr.msg_iovlen = 1
+            stride = ctypes.sizeof(mmsghdr)
+            self._msg_len = np.ndarray((n,), np.uint32, buffer=self._msgs, offset=mmsghdr.msg_len.offset,
+                                       strides=(stride,))
+            self._msg_flags = np.ndarray((n,), np.int32, buffer=self._msgs,
+                                         offset=mmsghdr.msg_hdr.offset + msghdr.msg_flags.offset, strides=(stride,))
+        else:
+            self._views = [memoryview(slot) for slot in self.slots]
+
+    def recv(self, timeout=None):
+        # Waits up to timeout seconds (None = forever) for the socket to
+        # become readable, then takes whatever is queued, up to a batch.
+        # Returns the number of datagrams now in slots[:n], or -1 if the
+        # socket failed.
+        if not self._poll.poll(None if timeout is None else max(0, int(timeout * 1000))):
+            return 0
+        n = self._recv_mmsg() if self.use_recvmmsg else self._recv_into()
+        if n > 0:
+            total = int(np.maximum(self.lengths[:n], 0).sum())
+            self.packets += n
+            self.bytes += total
+            RECV_PACKETS.add(n)
+            RECV_BYTES.add(total)
+        return n
+
+    def _recv_mmsg(self):
+        while True:
+            n = recvmmsg(self.sock.fileno(), ctypes.addressof(self._msgs), len(self.slots), _MSG_DONTWAIT, None)
+            if n >= 0:
+                break
+            err = ctypes.get_errno()
+            if err == errno.EINTR:
+                continue
+            if err in (errno.EAGAIN, errno.EWOULDBLOCK):
+                return 0
+            log.error("recvmmsg failed: %s", errno.errorcode.get(err, err))
+            return -1
+        self.lengths[:n] = np.where(self._msg_flags[:n] & _MSG_TRUNC, -1, self._msg_len[:n])
+        return n
+
+    def _recv_into(self):
+        recv_into = self.sock.recv_into
+        n = 0
+        while n < len(self.slots):
+            try:
+                length = recv_into(self._views[n], self.slot_size, _MSG_DONTWAIT | _MSG_TRUNC)
+            except (BlockingIOError, InterruptedError):
+                break
+            except OSError as e:
+                log.error("recv_into failed: %s", e)
+                return n or -1
+            self.lengths[n] = length if length <= self.slot_size else -1
+            n += 1
+        return n
+
+    def headers(self, n):
+        # Zero-copy header view of slots[:n].
+        return np.ndarray((n,), HEADER_DTYPE, buffer=self.slots, strides=(self.slot_size,))
+
+
+def valid_packets(slots, lengths, headers, payload_size=None):
+    # Boolean mask of the datagrams that are whole, agree with their header
+    # length and pass the CRC32 over timestamp and payload. payload_size
+    # maps a header view to the payload length each packet must have.
+    ok = (lengths >= HEADER_SIZE) & (headers['length'] == lengths)
+    if payload_size is not None:
+        ok &= lengths == HEADER_SIZE + payload_size(headers)
+    flat = memoryview(slots.reshape(-1))
+    stride = slots.shape[1]
+    crc = headers['crc32']
+    for i in np.flatnonzero(ok).tolist():
+        start = i * stride
+        if calculate_crc32(flat[start + CRC32_OFFSET:start + int(lengths[i])]) != crc[i]:
+            ok[i] = False
+    return ok
+
+def point_payload_size(headers):
+    return _POINT_SIZES[headers['data_type']] * headers['dot_num']
+
+def packet_view(slots, rows, data_type, dot_num):
+    # Zero-copy (header, points) view of slots[rows] when rows is a slice,
+    # for packets of one point data type and dot_num.
+    dt = packet_dtype(POINT_DTYPES[data_type], dot_num)
+    view = np.ndarray((len(slots),), dt, buffer=slots, strides=(slots.shape[1],))
+    return view[rows]
+
+def decode_points(packets, out):
+    # Writes the points of a packet_view() into out (FRAME_DTYPE), in
+    # metres, each stamped from its packet's timestamp and time_interval.
+    header = packets['header']
+    points = packets['points']
+    dots = points.shape[1]
+    data_type = int(header['data_type'][0])
+    flat = points.reshape(-1)
+    if data_type in _CARTESIAN_UNIT_M:
+        unit = _CARTESIAN_UNIT_M[data_type]
+        for axis in ('x', 'y', 'z'):
+            np.multiply(flat[axis], unit, out=out[axis], casting='unsafe')
+    else:
+        depth = flat['depth'] * 1e-3
+        theta = np.radians(flat['theta'] * 0.01)
+        phi = np.radians(flat['phi'] * 0.01)
+        out['x'] = depth * np.sin(theta) * np.cos(phi)
+        out['y'] = depth * np.sin(theta) * np.sin(phi)
+        out['z'] = depth * np.cos(theta)
+    out['reflectivity'] = flat['reflectivity']
+    out['tag'] = flat['tag']
+    step = header['time_interval'].astype(np.float64) * TIME_INTERVAL_UNIT_NS / dots
+    offsets = np.rint(np.arange(dots) * step[:, None]).astype(np.uint64)
+    out['timestamp'] = (header['timestamp'][:, None] + offsets).reshape(-1)
+
+
+class SequenceTracker:
+    # Follows udp_cnt (16 bits, wrapping) across batches. A forward jump of
+    # k counts k - 1 lost packets; a step back or a repeat counts as
+    # reordered, without moving the expected count back.
+
+    def __init__(self):
+        self.last = None
+        self.lost = 0
+        self.reordered = 0
+
+    def update(self, udp_cnt):
+        if not len(udp_cnt):
+            return 0
+        cnt = udp_cnt.astype(np.int64)
+        prev = np.empty_like(cnt)
+        prev[0] = cnt[0] - 1 if self.last is None else self.last
+        prev[1:] = cnt[:-1]
+        step = (cnt - prev) & 0xFFFF
+        forward = (step > 0) & (step < 0x8000)
+        lost = int((step[forward] - 1).sum())
+        self.lost += lost
+        self.reordered += int(np.count_nonzero(~forward))
+        ahead = np.flatnonzero(forward)
+        if len(ahead):
+            self.last = int(cnt[ahead[-1]])
+        return lost
+
+
+class FrameAssembler:
+    # Gathers decoded points into the current frame until frame_cnt moves
+    # on, then hands the finished frame to on_frame(frame_cnt, points).
+    # Two preallocated buffers alternate, so the points array passed to
+    # on_frame stays valid until the following frame is finished; copy it
+    # to keep it longer. Buffers grow when a frame outgrows them. transform,
+    # a PointTransform, moves each finished frame in place, e.g. the
+    # inverse of the device's install attitude to get sensor-frame points.
+
+    def __init__(self, on_frame=None, capacity=RECV_FRAME_POINTS, transform=None):
+        self.on_frame = on_frame
+        self.transform = transform
+        self._buffers = [np.zeros(capacity, FRAME_DTYPE), np.zeros(capacity, FRAME_DTYPE)]
+        self._current = 0
+        self.frame_cnt = None
+        self.size = 0
+        self.frames = 0
+        self.points = 0
+
+    def _reserve(self, n):
+        buf = self._buffers[self._current]
+        if self.size + n > len(buf):
+            grown = np.zeros(max(2 * len(buf), self.size + n), FRAME_DTYPE)
+            grown[:self.size] = buf[:self.size]
+            self._buffers[self._current] = buf = grown
+            log.debug("Frame buffer grown to %d points", len(grown))
+        return buf[self.size:self.size + n]
+
+    def add(self, frame_cnt, packets):
+        # packets: a packet_view() of consecutive packets of one frame.
+        if frame_cnt != self.frame_cnt:
+            self.flush()
+            self.frame_cnt = frame_cnt
+        n = packets['points'].shape[0] * packets['points'].shape[1]
+        decode_points(packets, self._reserve(n))
+        self.size += n
+
+    def flush(self):
+        # Finishes the current frame, if any.
+        if self.frame_cnt is None:
+            return None
+        points = self._buffers[self._current][:self.size]
+        frame_cnt = self.frame_cnt
+        self.frame_cnt = None
+        self.size = 0
+        self._current ^= 1
+        self.frames += 1
+        self.points += len(points)
+        RECV_FRAMES.add()
+        if self.transform is not None:
+            self.transform.apply_fields(points, FRAME_UNIT_MM)
+        if self.on_frame is not None:
+            self.on_frame(frame_cnt, points)
+        return points
+
+
+class PointDecoder:
+    # Validates a batch of received point packets, tracks their udp_cnt and
+    # feeds them to a FrameAssembler (if given).
+
+    def __init__(self, assembler=None):
+        self.assembler = assembler
+        self.sequence = SequenceTracker()
+        self.invalid = 0
+
+    def process(self, slots, lengths, headers):
+        ok = valid_packets(slots, lengths, headers, point_payload_size)
+        bad = len(ok) - int(np.count_nonzero(ok))
+        if bad:
+            self.invalid += bad
+            RECV_INVALID.add(bad)
+            log.debug("Dropped %d invalid point packets", bad)
+        rows = np.flatnonzero(ok)
+        RECV_LOST.add(self.sequence.update(headers['udp_cnt'][rows]))
+        if self.assembler is None or not len(rows):
+            return len(rows)
+
+        # Runs of packets with the same frame, data type and dot_num are
+        # decoded together; in a clean stream a run is a contiguous slice.
+        h = headers[rows]
+        key = (h['frame_cnt'].astype(np.int64) << 24) | (h['data_type'].astype(np.int64) << 16) | h['dot_num']
+        cuts = np.flatnonzero(np.diff(key)) + 1
+        for start, end in zip(np.r_[0, cuts].tolist(), np.r_[cuts, len(rows)].tolist()):
+            first, last = int(rows[start]), int(rows[end - 1])
+            sel = slice(first, last + 1) if last - first == end - start - 1 else rows[start:end]
+            data_type = int(h['data_type'][start])
+            if data_type not in POINT_DTYPES:
+                continue
+            self.assembler.add(int(h['frame_cnt'][start]), packet_view(slots, sel, data_type, int(h['dot_num'][start])))
+        return len(rows)
+
+
+class ImuDecoder:
+    # Validates IMU packets and hands on_imu(headers, samples) zero-copy
+    # views of the valid ones.
+
+    def __init__(self, on_imu=None):
+        self.on_imu = on_imu
+        self.sequence = SequenceTracker()
+        self.invalid = 0
+        self.samples = 0
+
+    def process(self, slots, lengths, headers):
+        ok = valid_packets(slots, lengths, headers, lambda h: np.where(h['data_type'] == IMU_DATA_TYPE,
+                                                                       IMU_DTYPE.itemsize, -1))
+        bad = len(ok) - int(np.count_nonzero(ok))
+        if bad:
+            self.invalid += bad
+            RECV_INVALID.add(bad)
+        rows = np.flatnonzero(ok)
+        RECV_LOST.add(self.sequence.update(headers['udp_cnt'][rows]))
+        self.samples += len(rows)
+        if self.on_imu is not None and len(rows):
+            view = np.ndarray((len(slots),), IMU_PACKET_DTYPE, buffer=slots, strides=(slots.shape[1],))
+            sel = slice(int(rows[0]), int(rows[-1]) + 1) if rows[-1] - rows[0] == len(rows) - 1 else rows
+            packets = view[sel]
+            self.on_imu(packets['header'], packets['imu'])
+        return len(rows)
+
+
+def open_host_socket(ip, port, profile='receive'):
+    sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+    try:
+        sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+        # Buffer sizes must be set before bind to take effect on the queue.
+        apply_profile(sock, profile, f"receiver {ip}:{port}")
+        sock.bind((ip, port))
+    except OSError as e:
+        log.error("Socket bind failed on %s:%d: %s", ip, port, e)
+        sock.close()
+        return None
+    return sock
+
+
+class LidarReceiver:
+    # Host endpoint for one device's point and IMU streams, standing in for
+    # the SDK: binds the host ports, validates every packet, counts udp_cnt
+    # gaps and delivers whole frames to on_frame(frame_cnt, points) and IMU
+    # samples to on_imu(headers, samples). Pass port None to skip a stream.
+    # attitude, a LivoxLidarInstallAttitude the device applies, is undone
+    # on every frame, so on_frame sees points in the sensor frame.
+
+    def __init__(self, host_ip=LIDAR_HOST_IP, point_port=point_data_port_host, imu_port=imu_data_port_host,
+                 on_frame=None, on_imu=None, frame_idle=RECV_FRAME_IDLE, attitude=None):
+        self.frame_idle = frame_idle
+        transform = PointTransform.from_attitude(attitude).inverse() if attitude is not None else None
+        self.assembler = FrameAssembler(on_frame, transform=transform)
+        self.points = PointDecoder(self.assembler)
+        self.imu = ImuDecoder(on_imu)
+        self._streams = []
+        for port, decoder in ((point_port, self.points), (imu_port, self.imu)):
+            if port is None:
+                continue
+            sock = open_host_socket(host_ip, port)
+            if sock is None:
+                self.close()
+                raise OSError(f"Cannot bind {host_ip}:{port}")
+            self._streams.append((PacketReceiver(sock), decoder))
+        self._poll = select.poll()
+        for receiver, _ in self._streams:
+            self._poll.register(receiver.sock, select.POLLIN)
+        self._last_points = time.monotonic()
+
+    def addresses(self):
+        return [receiver.sock.getsockname() for receiver, _ in self._streams]
+
+    def poll(self, timeout=0.1):
+        # Processes whatever arrives within timeout seconds. A frame still
+        # open after frame_idle seconds without point data is finished, so
+        # the last frame of a stream is not held back. Returns the number of
+        # packets processed.
+        ready = {fd for fd, _ in self._poll.poll(max(0, int(timeout * 1000)))}
+        total = 0
+        for receiver, decoder in self._streams:
+            if receiver.sock.fileno() not in ready:
+                continue
+            while True:
+                n = receiver.recv(0)
+                if n <= 0:
+                    break
+                processed = decoder.process(receiver.slots[:n], receiver.lengths[:n], receiver.headers(n))
+                if processed and decoder is self.points:
+                    self._last_points = time.monotonic()
+                total += processed
+                if n < len(receiver.slots):
+                    break
+        # IMU traffic keeps flowing after the point stream stops, so only
+        # point packets count as activity.
+        if self.assembler.frame_cnt is not None and time.monotonic() - self._last_points >= self.frame_idle:
+            self.assembler.flush()
+        return total
+
+    def run(self, stop, timeout=0.1):
+        # Thread body: receives until the threading.Event stop is set.
+        while not stop.is_set():
+            self.poll(timeout)
+        self.assembler.flush()
+        return 0
+
+    def stats(self):
+        receivers = [receiver for receiver, _ in self._streams]
+        return {
+            'packets': sum(r.packets for r in receivers),
+            'bytes': sum(r.bytes for r in receivers),
+            'invalid': self.points.invalid + self.imu.invalid,
+            'lost': self.points.sequence.lost,
+            'reordered': self.points.sequence.reordered,
+            'frames': self.assembler.frames,
+            'points': self.assembler.points,
+            'imu_samples': self.imu.samples,
+            'imu_lost': self.imu.sequence.lost,
+        }
+
+    def close(self):
+        for receiver, _ in self._streams:
+            receiver.sock.close()
+        self._streams = []
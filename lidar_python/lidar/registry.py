@@ -0,0 +1,87 @@
+# lidar/registry.py
+import socket
+import struct
+from .config import LIDAR_DEVICE_IP, LIDAR_DEVICE_SN, DEVICE_MAC, LIDAR_DEVICE_PORT_STRIDE, MAX_SOCKETS
+from .device import LidarDevice, get_default_device
+from .log import get_logger, DEVICE
+
+log = get_logger(DEVICE)
+
+SOCKETS_PER_DEVICE = 4  # Command, point, IMU and state push
+MAX_DEVICES = (MAX_SOCKETS - 1) // SOCKETS_PER_DEVICE  # Plus one shared broadcast socket
+
+
+def device_ip(base_ip, index):
+    return socket.inet_ntoa(struct.pack('!I', struct.unpack('!I', socket.inet_aton(base_ip))[0] + index))
+
+def device_sn(base_sn, index):
+    # Device 0 keeps base_sn; others replace its trailing digits with
+    # index + 1, so "Tux-LivoxLidar1" becomes "Tux-LivoxLidar2", ...
+    if index == 0:
+        return base_sn
+    suffix = str(index + 1)
+    return base_sn.rstrip('0123456789')[:16 - len(suffix)] + suffix
+
+def device_mac(base_mac, index):
+    return tuple(base_mac[:-1]) + ((base_mac[-1] + index) & 0xFF,)
+
+
+class DeviceRegistry:
+    # The emulated sensors served by this process. Device 0 is the default
+    # device behind the module-level functions in lidar.device.
+
+    def __init__(self):
+        self.devices = []
+
+    def __len__(self):
+        return len(self.devices)
+
+    def __iter__(self):
+        return iter(self.devices)
+
+    def __getitem__(self, index):
+        return self.devices[index]
+
+    def add(self, device):
+        if len(self.devices) >= MAX_DEVICES:
+            raise ValueError(f"At most {MAX_DEVICES} devices fit in MAX_SOCKETS = {MAX_SOCKETS}")
+        self.devices.append(device)
+        return device
+
+    def create(self, count, port_stride=LIDAR_DEVICE_PORT_STRIDE):
+        for index in range(len(self.devices), len(self.devices) + count):
+            if index == 0:
+                self.add(get_default_device())
+                continue
+            self.add(LidarDevice(
+                index,
+                ip=LIDAR_DEVICE_IP if port_stride else device_ip(LIDAR_DEVICE_IP, index),
+                sn=device_sn(LIDAR_DEVICE_SN, index),
+                mac=device_mac(DEVICE_MAC, index),
+                port_offset=index * port_stride,
+            ))
+        return self.devices[-count:] if count else []
+
+    def open_sockets(self):
+        # Opens each device's command and IMU sockets; returns the number of
+        # devices whose command socket is up.
+        opened = 0
+        for device in self.devices:
+            if device.open_sockets() == 0:
+                opened += 1
+        return opened
+
+    def close(self):
+        for device in self.devices:
+            device.close()
+
+
+def create_registry(replay_paths, port_stride=LIDAR_DEVICE_PORT_STRIDE):
+    # One device per replay file. Returns None if any file cannot be opened.
+    registry = DeviceRegistry()
+    for device, path in zip(registry.create(len(replay_paths), port_stride), replay_paths):
+        if device.setup_pcl_file_handle(path) < 0:
+            return None
+        log.info("Device %d: SN %s at %s, command port %d, replaying %s",
+                 device.index, device.sn, device.ip, device.cmd_port, path)
+    return registry
@@ -0,0 +1,82 @@
+# lidar/ring.py
+import threading
+import numpy as np
+from .config import MAXLEN, PCL_RING_SLOTS
+
+
+class PacketRing:
+    # Fixed ring of preallocated packet slots shared by one producer (the
+    # encoder) and one consumer (the transmitter). Slots are handed out as
+    # contiguous runs so both sides can work on several packets per call
+    # without copying; a run never wraps past the end of the ring.
+
+    def __init__(self, slots=PCL_RING_SLOTS, slot_size=MAXLEN):
+        self.size = slots
+        self.slot_size = slot_size
+        self.buf = np.zeros(slots * slot_size, np.uint8)
+        self.slots = self.buf.reshape(slots, slot_size)
+        self.offsets = np.arange(slots, dtype=np.int64) * slot_size
+        self.lengths = np.zeros(slots, np.int64)
+        self.dots = np.zeros(slots, np.int64)
+        self.frame_start = np.zeros(slots, np.bool_)
+        self.dropped = 0
+        self.closed = False
+        self._head = 0  # Total slots committed
+        self._tail = 0  # Total slots released
+        self._cond = threading.Condition()
+
+    def __len__(self):
+        return self._head - self._tail
+
+    def acquire(self, n, timeout=None):
+        # Waits up to timeout for free space; returns (start, count) with
+        # 0 < count <= n, or count 0 if the ring stayed full or was closed.
+        with self._cond:
+            if not self._cond.wait_for(lambda: self.closed or self._head - self._tail < self.size, timeout):
+                return 0, 0
+            if self.closed:
+                return 0, 0
+            start = self._head % self.size
+            free = self.size - (self._head - self._tail)
+            return start, min(n, free, self.size - start)
+
+    def commit(self, start, count, lengths, dots, frame_start=False):
+        self.lengths[start:start + count] = lengths
+        self.dots[start:start + count] = dots
+        self.frame_start[start:start + count] = False
+        self.frame_start[start] = frame_start
+        with self._cond:
+            self._head += count
+            self._cond.notify_all()
+
+    def drop(self, count):
+        with self._cond:
+            self.dropped += count
+
+    def peek(self, n, timeout=None):
+        # Waits up to timeout for filled slots; returns (start, count) of the
+        # oldest contiguous run, or count 0 if none arrived.
+        with self._cond:
+            if not self._cond.wait_for(lambda: self.closed or self._head > self._tail, timeout):
+                return 0, 0
+            start = self._tail % self.size
+            filled = self._head - self._tail
+            return start, min(n, filled, self.size - start)
+
+    def release(self, count):
+        with self._cond:
+            self._tail += count
+            self._cond.notify_all()
+
+    def pending(self):
+        # Slot indices of the committed, unreleased packets, oldest first.
+        with self._cond:
+            return np.arange(self._tail, self._head) % self.size
+
+    def close(self):
+        with self._cond:
+            self.closed = True
+            self._cond.notify_all()
+
+    def drained(self):
+        return self.closed and self._head == self._tail
@@ -0,0 +1,133 @@
+# lidar/scheduler.py
+import math
+import time
+from .config import PCL_SCHED_SPIN_NS, PCL_SCHED_MAX_LAG_NS
+
+POLICY_CATCHUP = 'catchup'
+POLICY_DROP = 'drop'
+
+
+class RateScheduler:
+    # Paces work to a fixed rate of items per second (points, packets or
+    # frames) against absolute perf_counter_ns() deadlines, so per-item
+    # processing time never accumulates into drift. Sleeps until spin_ns
+    # before each deadline and busy-waits the remainder.
+    #
+    # When running late, POLICY_CATCHUP sends immediately until the backlog
+    # is cleared (forgetting any lag beyond max_lag_ns), while POLICY_DROP
+    # tells the caller to skip items that missed their slot.
+
+    def __init__(self, rate, policy=POLICY_CATCHUP, spin_ns=PCL_SCHED_SPIN_NS,
+                 max_lag_ns=PCL_SCHED_MAX_LAG_NS):
+        if policy not in (POLICY_CATCHUP, POLICY_DROP):
+            raise ValueError(f"Unknown scheduler policy: {policy}")
+        self.rate = rate
+        self.period_ns = 1e9 / rate if rate > 0 else 0.0
+        self.policy = policy
+        self.spin_ns = spin_ns
+        self.max_lag_ns = max_lag_ns
+        self.reset()
+
+    def reset(self):
+        self.start_ns = None
+        self.deadline_ns = 0.0
+        self.shifted_ns = 0  # Total moved by shift()
+        self.items = 0
+        self.dropped = 0
+        self.resyncs = 0
+        self._waits = 0
+        self._late_mean = 0.0
+        self._late_m2 = 0.0
+        self._late_max = 0
+        self._last_ns = None
+
+    def start(self, now_ns=None):
+        self.start_ns = time.perf_counter_ns() if now_ns is None else now_ns
+        self.deadline_ns = float(self.start_ns)
+
+    def shift(self, delta_ns):
+        # Moves the whole timeline later by delta_ns, e.g. by the length of
+        # a pause, so it is neither caught up nor counted as lateness.
+        if self.start_ns is not None:
+            self.start_ns += delta_ns
+            self.deadline_ns += delta_ns
+            self.shifted_ns += delta_ns
+
+    def remaining_ns(self):
+        # Time until the next slot opens; 0 if it already has or unpaced.
+        if self.start_ns is None or self.period_ns == 0:
+            return 0
+        return max(0, self.deadline_ns - time.perf_counter_ns())
+
+    def wait(self, n=1):
+        # Blocks until the slot for the next n items, then reserves it.
+        # Returns False if the caller should drop those n items.
+        if self.start_ns is None:
+            self.start()
+        if self.period_ns != 0:
+            deadline = self.deadline_ns
+            remaining = deadline - time.perf_counter_ns()
+            if remaining > 0:
+                if remaining > self.spin_ns:
+                    time.sleep((remaining - self.spin_ns) / 1e9)
+                while time.perf_counter_ns() < deadline:
+                    pass
+        return self.reserve(n)
+
+    def reserve(self, n=1):
+        # Reserves the slot for the next n items without waiting, for
+        # callers that wait out remaining_ns() themselves, e.g. on an event
+        # loop. Returns False if the caller should drop those n items.
+        if self.start_ns is None:
+            self.start()
+        now = time.perf_counter_ns()
+        self._last_ns = now
+        if self.period_ns == 0:
+            self.items += n
+            return True
+
+        deadline = self.deadline_ns
+        late = now - deadline
+        self._record(late)
+        self.deadline_ns = deadline + n * self.period_ns
+
+        if late > n * self.period_ns and self.policy == POLICY_DROP:
+            self.dropped += n
+            return False
+        if late > self.max_lag_ns:
+            self.deadline_ns = now + n * self.period_ns
+            self.resyncs += 1
+        self.items += n
+        return True
+
+    def _record(self, late):
+        self._waits += 1
+        delta = late - self._late_mean
+        self._late_mean += delta / self._waits
+        self._late_m2 += delta * (late - self._late_mean)
+        if late > self._late_max:
+            self._late_max = late
+
+    def stats(self):
+        elapsed = 0.0
+        if self.start_ns is not None and self._last_ns is not None:
+            elapsed = (self._last_ns - self.start_ns) / 1e9
+        jitter = math.sqrt(self._late_m2 / self._waits) if self._waits > 1 else 0.0
+        return {
+            'target_rate': self.rate,
+            'achieved_rate': self.items / elapsed if elapsed > 0 else 0.0,
+            'items': self.items,
+            'dropped': self.dropped,
+            'resyncs': self.resyncs,
+            'elapsed_s': elapsed,
+            'late_mean_us': self._late_mean / 1e3,
+            'jitter_us': jitter / 1e3,
+            'late_max_us': self._late_max / 1e3,
+        }
+
+    def summary(self):
+        s = self.stats()
+        return (f"rate {s['achieved_rate']:.0f}/{s['target_rate']:.0f} per s, "
+                f"items {s['items']}, dropped {s['dropped']}, resyncs {s['resyncs']}, "
+                f"lateness mean {s['late_mean_us']:.1f} us, jitter {s['jitter_us']:.1f} us, "
+                f"max {s['late_max_us']:.1f} us")
@@ -0,0 +1,200 @@
+# lidar/sim.py
+import asyncio
+import collections
+import threading
+import time
+import numpy as np
+from .config import SIM_QUEUE_FRAMES, SIM_FRAME_PERIOD_NS
+from .aio import serve
+from .device import get_default_device
+from .metrics import SIM_FRAMES, SIM_DROPPED_FRAMES
+from .protocol import handle_parameter_pointcloud_data, init_livox_lidar_info_data
+from .registry import DeviceRegistry
+from .log import get_logger, REPLAY
+
+log = get_logger(REPLAY)
+
+# Streaming API for simulators (Isaac Sim, Gazebo, ...) and tests: hand
+# over each scan as a float array in metres and the device encodes and
+# sends it like the real sensor. Nothing here depends on the simulator.
+
+METRE_UNIT_MM = 1000
+
+
+def finite_points(points):
+    # Drops points with a NaN or infinite coordinate; returns points itself
+    # when there are none.
+    if points.dtype.names:
+        xyz = [points[name] for name in ('x', 'y', 'z')]
+        ok = np.isfinite(xyz[0]) & np.isfinite(xyz[1]) & np.isfinite(xyz[2])
+    else:
+        if points.ndim != 2 or points.shape[1] < 3:
+            raise ValueError(f"Expected (N, 3..5) point array, got shape {points.shape}")
+        ok = np.isfinite(points[:, :3]).all(axis=1)
+    return points if ok.all() else points[ok]
+
+
+class FrameStreamer:
+    # Sends point frames handed over by a simulator from a worker thread, so
+    # stream_frame() on the render thread only queues. Points are float
+    # metres, (N, 3..5) x, y, z[, reflectivity[, tag]] or a structured array
+    # with x/y/z fields. At most queue_frames frames wait; when the sender
+    # falls behind, the oldest is dropped, as a stale scan is worth less
+    # than the current one. Frames are withheld while the device's point
+    # data is paused (see WorkModeMachine).
+
+    def __init__(self, dev=None, queue_frames=SIM_QUEUE_FRAMES, frame_period_ns=SIM_FRAME_PERIOD_NS, copy=True):
+        self.dev = dev or get_default_device()
+        self.frame_period_ns = frame_period_ns
+        # Annotator buffers may be reused once the callback returns.
+        self.copy = copy
+        self.seq_num = 0
+        self.frames = 0
+        self.sent = 0
+        self.dropped = 0
+        self.withheld = 0
+        self._queue = collections.deque(maxlen=max(1, queue_frames))
+        self._cond = threading.Condition()
+        self._busy = False
+        self._closed = False
+        self._thread = None
+
+    def start(self):
+        with self._cond:
+            if self._thread is None and not self._closed:
+                self._thread = threading.Thread(target=self._run, name=f'{self.dev.sn}-sim', daemon=True)
+                self._thread.start()
+
+    def stream_frame(self, points, timestamp_ns=None):
+        # Queues one frame. timestamp_ns is the time of its first point on
+        # the lidar clock, e.g. the simulation time; None stamps it with the
+        # device clock now. Returns False once closed.
+        if self._closed:
+            return False
+        points = np.array(points, copy=True) if self.copy else np.asarray(points)
+        perf_ns = time.perf_counter_ns()
+        with self._cond:
+            if len(self._queue) == self._queue.maxlen:
+                self.dropped += 1
+                SIM_DROPPED_FRAMES.add()
+            self._queue.append((points, timestamp_ns, perf_ns))
+            self._cond.notify()
+        SIM_FRAMES.add()
+        if self._thread is None:
+            self.start()
+        return True
+
+    def _run(self):
+        while True:
+            with self._cond:
+                self._busy = False
+                self._cond.notify_all()
+                self._cond.wait_for(lambda: self._queue or self._closed)
+                if not self._queue:
+                    return
+                frame = self._queue.popleft()
+                self._busy = True
+            try:
+                self.send_frame(*frame)
+            except Exception as e:
+                # A bad frame must not stop the stream.
+                log.error("%s: dropping simulator frame: %s", self.dev.sn, e)
+
+    def send_frame(self, points, timestamp_ns=None, perf_ns=None):
+        # Encodes and sends one frame from the calling thread. Returns the
+        # number of packets sent, 0 if withheld, or -1 on error.
+        dev = self.dev
+        if not dev.work.points.is_set():
+            self.withheld += 1
+            return 0
+        points = dev.pipeline.process(finite_points(np.asarray(points)), METRE_UNIT_MM)
+        if len(points) == 0:
+            return 0
+        period_ns = self.frame_period_ns / len(points)
+        buf, offsets = handle_parameter_pointcloud_data(points, self.seq_num, METRE_UNIT_MM, perf_ns, period_ns, dev,
+                                                        timestamp_ns)
+        n_pkts = len(offsets) - 1
+        self.seq_num = (self.seq_num + n_pkts) & 0xFFFF
+        self.frames += 1
+        if dev.send_pcl_packets(buf, offsets) < 0:
+            return -1
+        self.sent += n_pkts
+        return n_pkts
+
+    def wait(self, timeout=None):
+        # Blocks until every queued frame has been sent.
+        with self._cond:
+            return self._cond.wait_for(lambda: not self._queue and not self._busy, timeout)
+
+    def close(self):
+        # Sends what is queued, then stops the worker.
+        with self._cond:
+            self._closed = True
+            self._cond.notify_all()
+        if self._thread is not None:
+            self._thread.join()
+        log.info("%s: streamed %d simulator frames (%d packets), dropped %d, withheld %d", self.dev.sn,
+                 self.frames, self.sent, self.dropped, self.withheld)
+
+
+class SimulatorBridge:
+    # Everything a simulator script needs: the devices' command, push and
+    # IMU endpoints served from a background event loop, so the host can
+    # discover and configure them as usual, and a FrameStreamer per device.
+    # Typical use from a behaviour script:
+    #     on_play:   bridge = SimulatorBridge(); bridge.start()
+    #     on_update: bridge.stream_frame(annotator.get_data()['data'], sim_time_ns)
+    #     on_stop:   bridge.close()
+
+    def __init__(self, registry=None):
+        if registry is None:
+            init_livox_lidar_info_data()
+            registry = DeviceRegistry()
+            registry.add(get_default_device())
+        self.registry = registry
+        self.streamers = [FrameStreamer(dev) for dev in registry]
+        self._loop = None
+        self._stop = None
+        self._thread = None
+        self._ready = threading.Event()
+
+    def start(self, timeout=5.0):
+        self._thread = threading.Thread(target=self._serve, name='sim-bridge', daemon=True)
+        self._thread.start()
+        self._ready.wait(timeout)
+        return self
+
+    def _serve(self):
+        async def main():
+            self._loop = asyncio.get_running_loop()
+            self._stop = asyncio.Event()
+            self._ready.set()
+            await serve(self.registry, replay=False, stop=self._stop)
+        try:
+            asyncio.run(main())
+        finally:
+            self._ready.set()
+
+    def stream_frame(self, points, timestamp_ns=None, device=0):
+        return self.streamers[device].stream_frame(points, timestamp_ns)
+
+    def close(self):
+        for streamer in self.streamers:
+            streamer.close()
+        if self._loop is not None and not self._loop.is_closed():
+            self._loop.call_soon_threadsafe(self._stop.set)
+        if self._thread is not None:
+            self._thread.join()
+
+
+_default_streamer = None
+_default_lock = threading.Lock()
+
+def stream_frame(points, timestamp_ns=None):
+    # Streams through the default device, starting its FrameStreamer on
+    # first use.
+    global _default_streamer
+    with _default_lock:
+        if _default_streamer is None:
+            _default_streamer = FrameStreamer()
+    return _default_streamer.stream_frame(points, timestamp_ns)
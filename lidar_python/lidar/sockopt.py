@@ -0,0 +1,92 @@
+# lidar/sockopt.py
+import socket
+import sys
+from .config import SOCKET_PROFILES
+from .log import get_logger, DEVICE
+
+log = get_logger(DEVICE)
+
+# Linux reports (and charges) twice the buffer size asked for, to cover
+# its bookkeeping overhead.
+_BUFFER_SCALE = 2 if sys.platform.startswith('linux') else 1
+
+SO_PRIORITY = getattr(socket, 'SO_PRIORITY', 12 if sys.platform.startswith('linux') else None)
+SO_BUSY_POLL = getattr(socket, 'SO_BUSY_POLL', 46 if sys.platform.startswith('linux') else None)
+SO_SNDBUFFORCE = getattr(socket, 'SO_SNDBUFFORCE', 32 if sys.platform.startswith('linux') else None)
+SO_RCVBUFFORCE = getattr(socket, 'SO_RCVBUFFORCE', 33 if sys.platform.startswith('linux') else None)
+
+
+def get_profile(name):
+    profile = SOCKET_PROFILES.get(name)
+    if profile is None:
+        raise ValueError(f"Unknown socket profile: {name}")
+    return profile
+
+def _set_buffer(sock, option, force_option, size, force, label, name):
+    try:
+        sock.setsockopt(socket.SOL_SOCKET, option, size)
+    except OSError as e:
+        log.warning("%s: setting %s to %d failed: %s", name, label, size, e)
+    granted = sock.getsockopt(socket.SOL_SOCKET, option) // _BUFFER_SCALE
+    if granted < size and force and force_option is not None:
+        # Exceeds net.core.[rw]mem_max without CAP_NET_ADMIN, so may fail.
+        try:
+            sock.setsockopt(socket.SOL_SOCKET, force_option, size)
+            granted = sock.getsockopt(socket.SOL_SOCKET, option) // _BUFFER_SCALE
+        except OSError:
+            pass
+    if granted < size:
+        log.warning("%s: kernel granted %s of %d bytes, %d requested; raise net.core.%s_max",
+                    name, label, granted, size, 'wmem' if option == socket.SO_SNDBUF else 'rmem')
+    return granted
+
+def apply_profile(sock, profile, name=None):
+    # Applies a SOCKET_PROFILES entry (or a dict of the same keys) to sock
+    # and returns what the kernel actually granted. Options the platform
+    # or our privileges do not allow are logged and skipped.
+    if isinstance(profile, str):
+        name = name or profile
+        profile = get_profile(profile)
+    name = name or 'socket'
+    granted = {}
+    force = profile.get('force_buffers', False)
+
+    if profile.get('rcvbuf'):
+        granted['rcvbuf'] = _set_buffer(sock, socket.SO_RCVBUF, SO_RCVBUFFORCE, profile['rcvbuf'], force, 'SO_RCVBUF', name)
+    if profile.get('sndbuf'):
+        granted['sndbuf'] = _set_buffer(sock, socket.SO_SNDBUF, SO_SNDBUFFORCE, profile['sndbuf'], force, 'SO_SNDBUF', name)
+
+    if profile.get('priority') is not None:
+        if SO_PRIORITY is None:
+            log.debug("%s: SO_PRIORITY is not supported here", name)
+        else:
+            try:
+                sock.setsockopt(socket.SOL_SOCKET, SO_PRIORITY, profile['priority'])
+                granted['priority'] = sock.getsockopt(socket.SOL_SOCKET, SO_PRIORITY)
+            except OSError as e:
+                log.warning("%s: setting SO_PRIORITY to %d failed: %s", name, profile['priority'], e)
+
+    if profile.get('dscp') is not None:
+        # DSCP is the top six bits of the IPv4 TOS byte.
+        try:
+            sock.setsockopt(socket.IPPROTO_IP, socket.IP_TOS, (profile['dscp'] & 0x3F) << 2)
+            granted['dscp'] = sock.getsockopt(socket.IPPROTO_IP, socket.IP_TOS) >> 2
+        except OSError as e:
+            log.warning("%s: setting DSCP to %d failed: %s", name, profile['dscp'], e)
+
+    if profile.get('busy_poll'):
+        if SO_BUSY_POLL is None:
+            log.debug("%s: SO_BUSY_POLL is not supported here", name)
+        else:
+            try:
+                sock.setsockopt(socket.SOL_SOCKET, SO_BUSY_POLL, profile['busy_poll'])
+                granted['busy_poll'] = sock.getsockopt(socket.SOL_SOCKET, SO_BUSY_POLL)
+            except OSError as e:
+                log.warning("%s: setting SO_BUSY_POLL to %d us failed: %s", name, profile['busy_poll'], e)
+
+    if profile.get('nonblocking'):
+        sock.setblocking(False)
+        granted['nonblocking'] = True
+
+    log.debug("%s socket options: %s", name, granted)
+    return granted
@@ -0,0 +1,86 @@
+# lidar/source.py
+import math
+import threading
+from .config import PCL_POINTS_PER_FRAME, PCL_REPLAY_LOOP, PCL_REPLAY_START, PCL_REPLAY_END, PCL_REPLAY_SPEED
+from .log import get_logger, REPLAY
+
+log = get_logger(REPLAY)
+
+
+class ReplaySource:
+    # Frame-addressed replay over a reader with read_points(): frame i is
+    # points [i * points_per_frame, (i + 1) * points_per_frame), read
+    # directly, so seeking is O(1) and looping never re-reads the file
+    # from the top. Plays frames [start, end) (slice semantics, negative
+    # counts from the end), wrapping back to start when loop is set; speed
+    # scales the rate the frames are replayed at.
+
+    def __init__(self, reader, points_per_frame=PCL_POINTS_PER_FRAME, start=PCL_REPLAY_START,
+                 end=PCL_REPLAY_END, loop=PCL_REPLAY_LOOP, speed=PCL_REPLAY_SPEED):
+        if points_per_frame <= 0:
+            raise ValueError(f"points_per_frame must be positive, got {points_per_frame}")
+        if speed <= 0:
+            raise ValueError(f"Replay speed must be positive, got {speed}")
+        self.reader = reader
+        self.points_per_frame = points_per_frame
+        self.frame_count = math.ceil(reader.points / points_per_frame)
+        frames = range(self.frame_count)[start:end]
+        self.start = frames.start
+        self.end = max(frames.start, frames.stop)
+        self.loop = loop
+        self.speed = speed
+        self.scale_mm = reader.scale_mm
+        self.position = self.start
+        self.loops = 0
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return self.end - self.start
+
+    def frame(self, index):
+        first = index * self.points_per_frame
+        return self.reader.read_points(first, min(self.points_per_frame, self.reader.points - first))
+
+    def seek(self, index):
+        # Makes frame index (of the whole file) the next one frames() yields.
+        # Safe to call from another thread while frames() runs.
+        if not self.start <= index < self.end:
+            raise ValueError(f"Frame {index} outside replay range [{self.start}, {self.end})")
+        with self._lock:
+            self.position = index
+
+    def frames(self):
+        # Yields frames from the current position to the end of the range,
+        # or forever when looping.
+        for _, points in self.indexed_frames():
+            yield points
+
+    def indexed_frames(self):
+        # As frames(), yielding (frame index, points) pairs.
+        sent = True
+        while True:
+            with self._lock:
+                index = self.position
+                if index >= self.end:
+                    # A pass without a single point would loop forever.
+                    if not self.loop or not sent:
+                        return
+                    sent = False
+                    index = self.start
+                    self.loops += 1
+                    log.info("Replay of %s looped (%d), back to frame %d", self.reader.path, self.loops, index)
+                self.position = index + 1
+            points = self.frame(index)
+            if len(points):
+                sent = True
+                yield index, points
+
+    def close(self):
+        self.reader.close()
+
+
+def replay_source(reader, **kwargs):
+    # reader itself if it is already a ReplaySource, else a new one over it.
+    if isinstance(reader, ReplaySource):
+        return reader
+    return ReplaySource(reader, **kwargs)
@@ -0,0 +1,71 @@
+# lidar/timing.py
+import time
+import numpy as np
+
+TIME_TYPE_NONE = 0  # Time since power-on
+TIME_TYPE_PTP = 1
+TIME_TYPE_GPS = 2
+
+TIME_INTERVAL_UNIT_NS = 100  # LivoxLidarEthernetPacket.time_interval is in 0.1 us
+NOMINAL_POINT_PERIOD_NS = 5000  # Mid-360 emits ~200k points/s
+
+
+def source_timestamps_ns(values):
+    # Per-point timestamps from a replay source. Integers are taken as ns;
+    # floats are seconds unless they are already ns-sized (the Livox ROS
+    # driver stores ns in float64).
+    values = np.asarray(values)
+    if values.dtype.kind == 'f':
+        if len(values) and np.nanmax(np.abs(values)) < 1e11:
+            return np.rint(values * 1e9).astype(np.int64)
+        return values.astype(np.int64)
+    return values.astype(np.int64, copy=False)
+
+
+class PacketClock:
+    # Derives packet timestamps from the perf_counter_ns() timebase used by
+    # RateScheduler, following the device's time_sync_type/time_offset.
+
+    def __init__(self, info):
+        self.info = info
+        self.boot_ns = time.perf_counter_ns()
+        self.epoch_ns = time.time_ns() - self.boot_ns
+        self.frame_cnt = 0
+
+    def time_type(self):
+        return self.info.time_sync_type
+
+    def to_lidar_ns(self, perf_ns):
+        if self.info.time_sync_type == TIME_TYPE_NONE:
+            base = perf_ns - self.boot_ns
+        else:
+            base = perf_ns + self.epoch_ns
+        return int(base + self.info.time_offset)
+
+    def now(self):
+        return self.to_lidar_ns(time.perf_counter_ns())
+
+    def next_frame(self):
+        self.frame_cnt = (self.frame_cnt + 1) & 0xFF
+        return self.frame_cnt
+
+    def packet_times(self, start_perf_ns, n_points, dots, point_period_ns):
+        # Timestamp of each packet's first point and the span it covers,
+        # assuming points are emitted evenly at point_period_ns.
+        return self.packet_times_at(self.to_lidar_ns(start_perf_ns), n_points, dots, point_period_ns)
+
+    @staticmethod
+    def packet_times_at(start_ns, n_points, dots, point_period_ns):
+        # As packet_times, from a first point time already on the lidar clock.
+        first = np.arange(0, n_points, dots, dtype=np.int64)
+        counts = np.minimum(n_points - first, dots)
+        timestamps = start_ns + np.rint(first * point_period_ns).astype(np.int64)
+        intervals = np.clip(np.rint(counts * point_period_ns / TIME_INTERVAL_UNIT_NS), 0, 0xFFFF)
+        return timestamps, intervals.astype(np.uint16)
+
+    @staticmethod
+    def packet_times_from_source(point_ts_ns, dots):
+        first = point_ts_ns[::dots]
+        last = point_ts_ns[np.minimum(np.arange(dots - 1, len(point_ts_ns) + dots - 1, dots), len(point_ts_ns) - 1)]
+        intervals = np.clip((last - first) // TIME_INTERVAL_UNIT_NS, 0, 0xFFFF)
+        return first, intervals.astype(np.uint16)
@@ -0,0 +1,163 @@
+# lidar/transmit.py
+import ctypes
+import errno
+import socket
+import time
+import numpy as np
+from .config import PCL_SEND_BATCH_SIZE
+from .mmsg import iovec, mmsghdr, sockaddr_in, sendmmsg
+from .log import get_logger, TRANSMIT
+from .metrics import POINT_SEND
+
+log = get_logger(TRANSMIT)
+
+# Errors meaning the socket buffer is full: on a non-blocking socket the
+# packet is dropped and counted rather than waited for.
+_BUFFER_FULL = (errno.EAGAIN, errno.EWOULDBLOCK, errno.ENOBUFS)
+
+
+class PacketTransmitter:
+    # Sends datagrams to one destination in batches of up to batch_size with
+    # a single sendmmsg() call each, or a sendto() loop where sendmmsg is
+    # unavailable. send_packets() hands every packet to the kernel before
+    # it returns, so callers may reuse their buffers at once; each caller
+    # already passes a whole batch (a ring run, a frame, due IMU packets).
+    # Batches are counted in metrics, a SendMetrics set.
+
+    def __init__(self, sock, dest, batch_size=PCL_SEND_BATCH_SIZE, use_sendmmsg=True, metrics=POINT_SEND):
+        self.sock = sock
+        self.metrics = metrics
+        self.dest = dest
+        self.batch_size = max(1, int(batch_size))
+        self.use_sendmmsg = use_sendmmsg and sendmmsg is not None
+        self.sent_packets = 0
+        self.sent_bytes = 0
+        self.errors = 0
+        self.dropped = 0
+
+        self._count = 0
+        self._views = [None] * self.batch_size
+
+        if self.use_sendmmsg:
+            self._sockaddr = sockaddr_in()
+            self._sockaddr.sin_family = socket.AF_INET
+            self._sockaddr.sin_port[:] = dest[1].to_bytes(2, 'big')
+            self._sockaddr.sin_addr[:] = socket.inet_aton(dest[0])
+            self._iovs = (iovec * self.batch_size)()
+            self._msgs = (mmsghdr * self.batch_size)()
+            for i in range(self.batch_size):
+                hdr = self._msgs[i].msg_hdr
+                hdr.msg_name = ctypes.addressof(self._sockaddr)
+                hdr.msg_namelen = ctypes.sizeof(self._sockaddr)
+                hdr.msg_iov = ctypes.pointer(self._iovs[i])
+                hdr.msg_iovlen = 1
+
+    def send_packets(self, buf, offsets, lengths=None):
+        # Sends packet i = buf[offsets[i]:offsets[i] + lengths[i]]; without
+        # lengths, offsets holds len(packets) + 1 boundaries. Returns the
+        # number of bytes handed to the kernel, or -1 on error.
+        buf = np.frombuffer(buf, np.uint8) if not isinstance(buf, np.ndarray) else buf
+        offsets = np.asarray(offsets, dtype=np.int64)
+        if lengths is None:
+            lengths = np.diff(offsets)
+            offsets = offsets[:-1]
+        else:
+            lengths = np.asarray(lengths, dtype=np.int64)
+
+        sent = 0
+        base = buf.ctypes.data if self.use_sendmmsg else None
+        mv = None if self.use_sendmmsg else memoryview(buf)
+        for offset, length in zip(offsets.tolist(), lengths.tolist()):
+            if self.use_sendmmsg:
+                iov = self._iovs[self._count]
+                iov.iov_base = base + offset
+                iov.iov_len = length
+            else:
+                self._views[self._count] = mv[offset:offset + length]
+            self._count += 1
+            if self._count == self.batch_size:
+                result = self._flush()
+                if result < 0:
+                    return -1
+                sent += result
+
+        result = self._flush()
+        if result < 0:
+            return -1
+        return sent + result
+
+    def _flush(self):
+        count = self._count
+        if count == 0:
+            return 0
+        self._count = 0
+        packets = self.sent_packets
+        errors = self.errors
+        dropped = self.dropped
+        t0 = time.perf_counter_ns()
+        if self.use_sendmmsg:
+            sent = self._flush_sendmmsg(count)
+        else:
+            sent = self._flush_sendto(count)
+        metrics = self.metrics
+        metrics.time.record(time.perf_counter_ns() - t0)
+        metrics.packets.add(self.sent_packets - packets)
+        metrics.bytes.add(max(sent, 0))
+        metrics.errors.add(self.errors - errors)
+        metrics.drops.add(self.dropped - dropped)
+        return sent
+
+    def _flush_sendmmsg(self, count):
+        fd = self.sock.fileno()
+        msgs = self._msgs
+        size = ctypes.sizeof(mmsghdr)
+        done = 0
+        sent = 0
+        while done < count:
+            n = sendmmsg(fd, ctypes.addressof(msgs) + done * size, count - done, 0)
+            if n < 0:
+                err = ctypes.get_errno()
+                if err == errno.EINTR:
+                    continue
+                if err == errno.EBADF:
+                    log.error("Error sending message to host. Error: %s", errno.errorcode.get(err, err))
+                    return -1
+                # Drop the datagram the kernel refused and carry on with the rest.
+                if err in _BUFFER_FULL:
+                    self.dropped += 1
+                else:
+                    self.errors += 1
+                done += 1
+                continue
+            for i in range(done, done + n):
+                sent += msgs[i].msg_len
+            done += n
+            self.sent_packets += n
+        self.sent_bytes += sent
+        return sent
+
+    def _flush_sendto(self, count):
+        sendto = self.sock.sendto
+        dest = self.dest
+        views = self._views
+        sent = 0
+        packets = 0
+        for i in range(count):
+            try:
+                sent += sendto(views[i], dest)
+                packets += 1
+            except InterruptedError:
+                sent += sendto(views[i], dest)
+                packets += 1
+            except OSError as e:
+                if e.errno == errno.EBADF:
+                    log.error("Error sending message to host. Error: %s", e)
+                    return -1
+                if e.errno in _BUFFER_FULL:
+                    self.dropped += 1
+                else:
+                    self.errors += 1
+            views[i] = None
+        self.sent_packets += packets
+        self.sent_bytes += sent
+        return sent
@@ -5,18 +5,11 @@ def error(msg):
     print(f"Error: {msg}", file=sys.stderr)
     sys.exit(1)
 
+def format_buffer(buf):
+    # 16 bytes per line in groups of 4, each line starting with a newline.
+    data = bytes(buf)
+    return ''.join(['\n ' + data[i:i + 16].hex(' ', -4) for i in range(0, len(data), 16)])
+
 def print_buffer(buf):
-    length = len(buf)
-    for i in range(length):
-        if i % 16 == 0:
-            print()
-        if i % 4 == 0:
-            print(" ", end="")
-        if buf[i] > 9:
-            print(f"{buf[i]:02x}", end="")
-        elif buf[i]:
-            print(f"0{buf[i]:x}", end="")
-        else:
-            print("00", end="")
-    print()
-    return length
+    print(format_buffer(buf))
+    return len(buf)
@@ -0,0 +1,75 @@
+# lidar/workmode.py
+import threading
+from .enums import LivoxLidarWorkMode
+from .log import get_logger, DEVICE
+
+log = get_logger(DEVICE)
+
+# Work modes the host may request through kKeyWorkMode; the others are
+# states the device passes through on its own.
+TARGET_MODES = {
+    LivoxLidarWorkMode.kLivoxLidarNormal.value: 'sampling',
+    LivoxLidarWorkMode.kLivoxLidarWakeUp.value: 'idle',
+    LivoxLidarWorkMode.kLivoxLidarSleep.value: 'standby',
+    LivoxLidarWorkMode.kLivoxLidarUpgrade.value: 'upgrade',
+}
+POINT_SEND_ENABLED = 0x00  # kKeyPointSendEn: 0 sends point data, 1 withholds it
+
+
+class WorkModeMachine:
+    # Tracks one device's work state from the host's kKeyWorkMode and
+    # kKeyPointSendEn and decides whether its streams flow: IMU data while
+    # sampling, point data while sampling with point sending enabled and a
+    # point socket configured. Transitions take effect at once; listeners
+    # (callables without arguments) run on every change so paused senders
+    # wake immediately.
+
+    def __init__(self, dev):
+        self.dev = dev
+        self.points = threading.Event()
+        self.imu = threading.Event()
+        self._listeners = []
+        self.update()
+
+    def add_listener(self, fn):
+        self._listeners.append(fn)
+
+    def remove_listener(self, fn):
+        if fn in self._listeners:
+            self._listeners.remove(fn)
+
+    def state(self):
+        return TARGET_MODES.get(self.dev.info.cur_work_state, f'0x{self.dev.info.cur_work_state:02x}')
+
+    def request(self, mode):
+        # Called after the host sets work_tgt_mode.
+        info = self.dev.info
+        if mode not in TARGET_MODES:
+            log.warning("%s: unsupported work mode 0x%02x, staying %s", self.dev.sn, mode, self.state())
+            info.work_tgt_mode = info.cur_work_state
+            return False
+        if mode != info.cur_work_state:
+            log.info("%s: work mode %s -> %s", self.dev.sn, self.state(), TARGET_MODES[mode])
+            info.cur_work_state = mode
+        self.update()
+        return True
+
+    def sampling(self):
+        return self.dev.info.cur_work_state == LivoxLidarWorkMode.kLivoxLidarNormal.value
+
+    def update(self):
+        # Re-evaluates the stream gates; call after anything they depend on.
+        sampling = self.sampling()
+        points = (sampling and self.dev.info.point_send_en == POINT_SEND_ENABLED
+                  and self.dev.pcl_transmitter is not None)
+        changed = points != self.points.is_set() or sampling != self.imu.is_set()
+        for event, on in ((self.points, points), (self.imu, sampling)):
+            if on:
+                event.set()
+            else:
+                event.clear()
+        if changed:
+            log.info("%s: %s, point data %s, IMU data %s", self.dev.sn, self.state(),
+                     "on" if points else "off", "on" if sampling else "off")
+            for fn in list(self._listeners):
+                fn()
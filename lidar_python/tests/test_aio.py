@@ -0,0 +1,55 @@
+# tests/test_aio.py
+import asyncio
+import socket
+import struct
+from lidar.aio import CommandReader
+from lidar.device import LidarDevice
+from lidar.enums import ParamKeyName
+from lidar.packet import LivoxLidarCmdPacket
+from lidar.protocol import pack_cmd_response
+from lidar.registry import DeviceRegistry
+
+
+def command(cmd_id, seq_num, data=b''):
+    return bytes(pack_cmd_response(LivoxLidarCmdPacket(0xAA, 0, 0, seq_num, cmd_id, 0, 0, b'\x00' * 6, 0, 0, data)))
+
+
+def test_command_reader_answers_from_one_buffer():
+    dev = LidarDevice(0)
+    registry = DeviceRegistry()
+    registry.add(dev)
+    server = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+    server.bind(('127.0.0.1', 0))
+    client = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+    client.bind(('127.0.0.1', 0))
+    client.settimeout(1.0)
+    reader = CommandReader(registry, server, dev)
+    buf = reader.buf
+    value = b'\x02'
+    config = struct.pack('<HHHH', 1, 0, ParamKeyName.kKeyPclDataType.value, len(value)) + value
+
+    async def exchange():
+        loop = asyncio.get_running_loop()
+        reader.start(loop)
+        try:
+            replies = []
+            for cmd_id, seq_num, data in ((0x0000, 1, b''), (0x0100, 2, config)):
+                client.sendto(command(cmd_id, seq_num, data), server.getsockname())
+                replies.append(await loop.run_in_executor(None, client.recv, 2048))
+            return replies
+        finally:
+            reader.close()
+
+    try:
+        query, ack = asyncio.run(exchange())
+    finally:
+        server.close()
+        client.close()
+
+    assert LivoxLidarCmdPacket.unpack(query).seq_num == 1
+    assert dev.sn.encode()[:14] in query
+    ack = LivoxLidarCmdPacket.unpack(ack)
+    assert (ack.seq_num, ack.cmd_id) == (2, 0x0100)
+    assert struct.unpack('<BH', ack.data) == (0, 0)
+    assert dev.info.pcl_data_type == 2
+    assert reader.buf is buf
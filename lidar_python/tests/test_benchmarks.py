@@ -0,0 +1,39 @@
+# tests/test_benchmarks.py
+import json
+from benchmarks import run
+from benchmarks.harness import compare, load_results, measure
+
+
+def test_measure_counts_items():
+    calls = []
+    r = measure('noop', lambda: calls.append(1), items=4, iterations=20, warmup=5)
+    assert len(calls) == 25
+    assert (r['calls'], r['items']) == (20, 80)
+    assert r['items_per_s'] > 0 and r['p50_us'] <= r['p99_us'] <= r['max_us']
+
+
+def test_compare_flags_slower_cases():
+    baseline = {'a': {'items_per_s': 100.0, 'p50_us': 10.0}, 'b': {'items_per_s': 100.0, 'p50_us': 10.0}}
+    results = [
+        {'name': 'a', 'unit': 'B', 'items_per_s': 95.0, 'p50_us': 10.5},
+        {'name': 'b', 'unit': 'B', 'items_per_s': 80.0, 'p50_us': 12.0},
+        {'name': 'new', 'unit': 'B', 'items_per_s': 1.0, 'p50_us': 1.0},
+    ]
+    regressions = compare(results, baseline, 0.10)
+    assert len(regressions) == 2 and all(message.startswith('b: ') for message in regressions)
+
+
+def test_quick_run_and_baseline(tmp_path, capsys):
+    output = tmp_path / 'results.json'
+    assert run.main(['--quick', '--cases', 'crc', '--output', str(output)]) == 0
+    results = load_results(output)
+    assert sorted(results) == ['crc16_header', 'crc32_packet']
+    assert 'crc32_packet' in capsys.readouterr().out
+
+    # A baseline far faster than anything reachable fails the run.
+    for r in results.values():
+        r['items_per_s'] *= 1000
+    with open(output, 'w') as f:
+        json.dump({'results': results}, f)
+    assert run.main(['--quick', '--cases', 'crc', '--baseline', str(output)]) == 1
+    assert 'REGRESSION crc32_packet' in capsys.readouterr().out
@@ -0,0 +1,54 @@
+# tests/test_crc.py
+import os
+import pytest
+from lidar.crc import (calculate_crc16, calculate_crc32, calculate_crc16_table, calculate_crc16_bitwise,
+                       calculate_crc32_bitwise, Crc16, Crc32)
+
+SAMPLES = [b'', b'\x00', b'123456789', bytes(range(256)), os.urandom(1380)]
+BUFFERS = [bytes, bytearray, memoryview]
+
+
+@pytest.mark.parametrize('kind', BUFFERS)
+@pytest.mark.parametrize('data', SAMPLES)
+def test_crc16_matches_bitwise(kind, data):
+    expected = calculate_crc16_bitwise(data)
+    assert calculate_crc16(kind(data)) == expected
+    assert calculate_crc16_table(kind(data)) == expected
+    assert Crc16(kind(data)).digest() == expected
+
+
+@pytest.mark.parametrize('kind', BUFFERS)
+@pytest.mark.parametrize('data', SAMPLES)
+def test_crc32_matches_bitwise(kind, data):
+    expected = calculate_crc32_bitwise(data)
+    assert calculate_crc32(kind(data)) == expected
+    assert Crc32(kind(data)).digest() == expected
+
+
+def test_known_values():
+    assert calculate_crc16(b'123456789') == 0x29B1
+    assert calculate_crc32(b'123456789') == 0xCBF43926
+
+
+@pytest.mark.parametrize('kind', BUFFERS)
+@pytest.mark.parametrize('chunk', [1, 7, 64, 1000])
+def test_chunked_update(kind, chunk):
+    data = os.urandom(1380)
+    crc16, crc32 = Crc16(), Crc32()
+    for start in range(0, len(data), chunk):
+        crc16.update(kind(data[start:start + chunk]))
+        crc32.update(kind(data[start:start + chunk]))
+    assert crc16.digest() == calculate_crc16_bitwise(data)
+    assert crc32.digest() == calculate_crc32_bitwise(data)
+    # Running checksums through the function interface as well.
+    crc = calculate_crc32(data[:chunk])
+    assert calculate_crc32(memoryview(data)[chunk:], crc) == calculate_crc32_bitwise(data)
+    crc = calculate_crc16_table(data[:chunk])
+    assert calculate_crc16_table(memoryview(data)[chunk:], crc) == calculate_crc16_bitwise(data)
+
+
+def test_copy_continues_independently():
+    a = Crc32(b'abc')
+    b = a.copy().update(b'def')
+    assert a.digest() == calculate_crc32_bitwise(b'abc')
+    assert b.digest() == calculate_crc32_bitwise(b'abcdef')
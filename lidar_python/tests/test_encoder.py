@@ -0,0 +1,88 @@
+# tests/test_encoder.py
+import struct
+import numpy as np
+import pytest
+from lidar.config import RECV_SLOT_SIZE
+from lidar.crc import calculate_crc32_bitwise
+from lidar.encoder import encode_packets, encode_packets_into, HEADER_DTYPE, HEADER_SIZE, DOTS_PER_PACKET
+from lidar.packet import LivoxLidarEthernetPacket
+from lidar.receiver import FrameAssembler, PointDecoder
+
+# Wire point size and worst-case round-trip error (metres) per data type:
+# 1 is mm, 2 is cm, 3 is mm depth with 0.01 degree angles.
+FORMATS = {1: (14, 0.0005), 2: (8, 0.005), 3: (10, 0.006)}
+
+
+def to_slots(buf, offsets, slot_size=RECV_SLOT_SIZE):
+    # The packets of encode_packets() laid out as a receiver batch.
+    n = len(offsets) - 1
+    slots = np.zeros((n, slot_size), np.uint8)
+    lengths = np.diff(offsets)
+    for i in range(n):
+        slots[i, :lengths[i]] = buf[offsets[i]:offsets[i + 1]]
+    headers = np.ndarray((n,), HEADER_DTYPE, buffer=slots, strides=(slot_size,))
+    return slots, lengths, headers
+
+
+def sample_points(n):
+    rng = np.random.default_rng(1)
+    points = np.zeros((n, 5), np.float32)
+    points[:, :3] = rng.uniform(-20, 20, (n, 3))
+    points[:, 3] = rng.integers(0, 256, n)
+    points[:, 4] = rng.integers(0, 4, n)
+    return points
+
+
+@pytest.mark.parametrize('data_type', sorted(FORMATS))
+def test_packets_decode_back_to_input(data_type):
+    point_size, tolerance = FORMATS[data_type]
+    n = 3 * DOTS_PER_PACKET[data_type] + 17
+    points = sample_points(n)
+    buf, offsets = encode_packets(points, udp_cnt=100, frame_cnt=5, timestamp=10**9, scale=1000, data_type=data_type)
+    lengths = np.diff(offsets)
+    assert np.all(lengths[:-1] == HEADER_SIZE + DOTS_PER_PACKET[data_type] * point_size)
+    assert lengths[-1] == HEADER_SIZE + 17 * point_size
+
+    frames = []
+    decoder = PointDecoder(FrameAssembler(lambda cnt, got: frames.append((cnt, got.copy()))))
+    assert decoder.process(*to_slots(buf, offsets)) == len(lengths)
+    decoder.assembler.flush()
+    assert decoder.invalid == 0 and decoder.sequence.lost == 0
+
+    [(frame_cnt, got)] = frames
+    assert frame_cnt == 5 and len(got) == n
+    xyz = np.stack([got['x'], got['y'], got['z']], axis=1)
+    assert np.abs(xyz - points[:, :3]).max() <= tolerance
+    assert np.array_equal(got['reflectivity'], points[:, 3].astype(np.uint8))
+    assert np.array_equal(got['tag'], points[:, 4].astype(np.uint8))
+
+
+def reference_packets(points, dots, udp_cnt, frame_cnt, timestamps, time_interval, data_type):
+    # Cartesian low packets built field by field with struct, as the
+    # original per-point encoder did.
+    packets = []
+    for i, start in enumerate(range(0, len(points), dots)):
+        chunk = points[start:start + dots]
+        body = struct.pack('<Q', timestamps[i]) + b''.join(
+            struct.pack('<hhhBB', *(int(np.rint(v * 100)) for v in p[:3]), int(p[3]), int(p[4])) for p in chunk)
+        header = LivoxLidarEthernetPacket(0, HEADER_SIZE + len(chunk) * 8, time_interval, len(chunk),
+                                          (udp_cnt + i) & 0xFFFF, frame_cnt, data_type, 1, b'\x00' * 12,
+                                          calculate_crc32_bitwise(body), 0, b'').pack()
+        packets.append(header[:-8] + body)
+    return packets
+
+
+def test_packet_layout_matches_struct_reference():
+    dots = 96
+    points = sample_points(2 * dots + 5)
+    timestamps = [10**9, 10**9 + 250000, 10**9 + 500000]
+    buf, offsets = encode_packets(points, udp_cnt=0xFFFE, frame_cnt=0x1FF, timestamp=timestamps, time_interval=2500,
+                                  time_type=1, scale=1000, data_type=2, dot_num=dots)
+    expected = reference_packets(points, dots, 0xFFFE, 0xFF, timestamps, 2500, 2)
+    assert [bytes(buf[a:b]) for a, b in zip(offsets[:-1], offsets[1:])] == expected
+
+    # The ring variant writes the same bytes into rows of a slot array.
+    slots = np.zeros((4, 1400), np.uint8)
+    lengths = encode_packets_into(slots, points, udp_cnt=0xFFFE, frame_cnt=0x1FF, timestamp=timestamps,
+                                  time_interval=2500, time_type=1, scale=1000, data_type=2, dot_num=dots)
+    assert [bytes(slots[i, :n]) for i, n in enumerate(lengths)] == expected
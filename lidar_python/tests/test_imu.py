@@ -0,0 +1,64 @@
+# tests/test_imu.py
+import socket
+import time
+import numpy as np
+from lidar.device import LidarDevice
+from lidar.imu import ImuFile, ImuStream, SyntheticImu
+from lidar.receiver import LidarReceiver
+
+PERIOD_NS = 5000000
+
+
+def test_csv_with_header_and_seconds(tmp_path):
+    path = tmp_path / 'imu.csv'
+    path.write_text("time,acc_x,acc_y,acc_z,gyro_x,gyro_y,gyro_z\n"
+                    "10.0,0,0,1,0.1,0.2,0.3\n"
+                    "10.01,0,0,1,0.4,0.5,0.6\n"
+                    "10.03,0,0,1,0.7,0.8,0.9\n")
+    source = ImuFile(str(path))
+    offsets, values = source.read(8, PERIOD_NS)
+    # Recorded spacing is kept; columns come back gyro first.
+    assert np.allclose(offsets, [0, 10000000, 30000000], atol=1000)
+    assert np.allclose(values[1], [0.4, 0.5, 0.6, 0, 0, 1])
+    assert len(source.read(8, PERIOD_NS)[1]) == 0
+
+
+def test_synthetic_is_level_at_rest():
+    offsets, values = SyntheticImu(gyro_noise=0, acc_noise=0).read(4, PERIOD_NS)
+    assert offsets.tolist() == [0, PERIOD_NS, 2 * PERIOD_NS, 3 * PERIOD_NS]
+    assert np.allclose(np.linalg.norm(values[:, 3:], axis=1), 1.0)
+
+
+def test_stream_sends_due_samples_across_blocks():
+    dev = LidarDevice(0)
+    received = []
+    rx = LidarReceiver('127.0.0.1', None, 0, on_imu=lambda headers, samples: received.append(headers.copy()))
+    dev.imu_sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+    cfg = dev.info.imu_host_ipcfg
+    cfg.dest_ip, cfg.dest_port = rx.addresses()[0]
+    stream = ImuStream(dev, SyntheticImu(), rate=1e9 / PERIOD_NS, block=4)
+    try:
+        stream.start(0)
+        assert stream.send_due(0) == 1
+        assert stream.due_in_ns(0) == PERIOD_NS
+        assert stream.send_due(10 * PERIOD_NS) == 10
+        # Paused by the work mode: nothing goes out and the timeline moves on
+        # by the length of the pause.
+        dev.work.imu.clear()
+        assert stream.send_due(11 * PERIOD_NS) == 0 and stream.due_in_ns(11 * PERIOD_NS) is None
+        dev.work.imu.set()
+        assert stream.flowing(16 * PERIOD_NS)
+        assert stream.due_in_ns(16 * PERIOD_NS) == 0
+        assert stream.send_due(20 * PERIOD_NS) == 5
+        assert stream.sent == 16
+        deadline = time.monotonic() + 2.0
+        while sum(len(h) for h in received) < 16 and time.monotonic() < deadline:
+            rx.poll(0.02)
+    finally:
+        dev.imu_sock.close()
+        rx.close()
+
+    headers = np.concatenate(received)
+    assert headers['udp_cnt'].tolist() == list(range(16))
+    gaps = np.diff(headers['timestamp'].astype(np.int64)).tolist()
+    assert gaps == [PERIOD_NS] * 10 + [6 * PERIOD_NS] + [PERIOD_NS] * 4
@@ -0,0 +1,71 @@
+# tests/test_log.py
+import logging
+import pytest
+from lidar import log as lidar_log
+from lidar.log import get_logger, lazy_hex, log_hexdump, Sampler
+
+
+class CountingBuffer:
+    # Counts how often the log arguments turn it into bytes.
+    def __init__(self, data):
+        self.data = data
+        self.conversions = 0
+
+    def __bytes__(self):
+        self.conversions += 1
+        return self.data
+
+
+class ListHandler(logging.Handler):
+    def __init__(self):
+        super().__init__()
+        self.messages = []
+
+    def emit(self, record):
+        self.messages.append(record.getMessage())
+
+
+@pytest.fixture
+def logger():
+    logger = get_logger('test')
+    handler = ListHandler()
+    logger.addHandler(handler)
+    logger.setLevel(logging.INFO)
+    yield logger, handler.messages
+    logger.removeHandler(handler)
+    lidar_log.set_hexdump(lidar_log.LOG_HEXDUMP)
+
+
+def test_hex_is_formatted_only_when_emitted(logger):
+    logger, messages = logger
+    buf = CountingBuffer(b'\xaa\x01')
+    logger.debug("packet %s", lazy_hex(buf))
+    assert buf.conversions == 0 and messages == []
+    logger.info("packet %s", lazy_hex(buf))
+    assert buf.conversions > 0 and messages == ['packet aa01']
+
+
+def test_hexdump_needs_switch_and_debug(logger):
+    logger, messages = logger
+    lidar_log.set_hexdump(False)
+    logger.setLevel(logging.DEBUG)
+    log_hexdump(logger, b'\x01\x02', "sent")
+    assert messages == []
+    lidar_log.set_hexdump(True)
+    logger.setLevel(logging.INFO)
+    log_hexdump(logger, b'\x01\x02', "sent")
+    assert messages == []
+    logger.setLevel(logging.DEBUG)
+    log_hexdump(logger, b'\x01\x02', "sent %s", 'x')
+    assert len(messages) == 1 and messages[0].startswith("sent x (2 bytes):")
+
+
+def test_sampler_reports_every_nth_tick(logger):
+    logger, _ = logger
+    sampler = Sampler(logger, every=3)
+    assert [sampler.tick(10) for _ in range(7)] == [False, False, True, False, False, True, False]
+    assert (sampler.count, sampler.items) == (7, 70)
+    # Nothing to report when the logger would drop the record.
+    quiet = Sampler(logger, every=1, level=logging.DEBUG)
+    assert not quiet.tick()
+    assert not Sampler(logger, every=0).tick()
@@ -0,0 +1,61 @@
+# tests/test_metrics.py
+import urllib.request
+import numpy as np
+from lidar import metrics
+from lidar.metrics import Histogram, counter, gauge, histogram, render, start_http_server
+
+
+def test_histogram_buckets_bound_their_values():
+    hist = Histogram('test_bounds', '')
+    for value in [0, 1, 127, 128, 129, 255, 256, 1000, 123456789, 1 << 39]:
+        index = hist._index(value)
+        assert hist._upper(index) >= value
+        assert index == 0 or hist._upper(index - 1) < value
+
+
+def test_histogram_quantiles_within_error():
+    hist = Histogram('test_quantiles', '')
+    values = np.random.default_rng(0).lognormal(12, 1.5, 20000).astype(np.int64)
+    for value in values:
+        hist.record(value)
+    for q in (0.5, 0.9, 0.99):
+        exact = np.quantile(values, q, method='inverted_cdf')
+        assert exact <= hist.quantile(q) <= exact * 1.016
+    assert hist.quantile(1.0) == hist.max == values.max()
+    assert (hist.count, hist.sum, hist.min) == (len(values), values.sum(), values.min())
+    hist.record(-5)
+    assert hist.min == 0
+    hist.reset()
+    assert hist.quantile(0.5) == 0 and hist.count == 0
+
+
+def test_render_prometheus_text():
+    packets = counter('test_render_packets_total', 'Packets')
+    assert counter('test_render_packets_total', 'Packets') is packets
+    packets.add(3)
+    latency = histogram('test_render_seconds', 'Latency')
+    latency.record(2000)
+    depth = gauge('test_render_depth', 'Depth', lambda: 1)
+    assert gauge('test_render_depth', 'Depth', lambda: 7) is depth
+    lines = render().splitlines()
+    assert '# TYPE test_render_packets_total counter' in lines
+    assert 'test_render_packets_total 3' in lines
+    assert 'test_render_depth 7' in lines
+    assert '# TYPE test_render_seconds summary' in lines
+    median = next(line for line in lines if line.startswith('test_render_seconds{quantile="0.5"} '))
+    assert abs(float(median.split()[1]) - 2e-6) < 1e-12
+    assert 'test_render_seconds_count 1' in lines
+    assert 'test_render_packets_total' in metrics.summary()
+
+
+def test_http_endpoint():
+    counter('test_http_total', 'Scrapes').add()
+    server = start_http_server('127.0.0.1', 0)
+    try:
+        url = 'http://127.0.0.1:%d' % server.server_address[1]
+        with urllib.request.urlopen(url + '/metrics', timeout=2) as response:
+            assert response.headers['Content-Type'].startswith('text/plain; version=0.0.4')
+            assert 'test_http_total 1' in response.read().decode()
+    finally:
+        server.shutdown()
+        server.server_close()
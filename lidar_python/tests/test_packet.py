@@ -0,0 +1,15 @@
+# tests/test_packet.py
+import struct
+from lidar.packet import LivoxLidarParamInquire, _key_list_struct
+
+
+def test_param_inquire_unpacks_key_lists():
+    for keys in ([], [0x0004], [0x0004, 0x8000, 0x001A]):
+        data = b'\xff' + struct.pack(f'<HH{len(keys)}H', len(keys), 0, *keys)
+        inquire = LivoxLidarParamInquire.unpack_from(data, 1)
+        assert (inquire.key_num, inquire.key_list) == (len(keys), keys)
+
+
+def test_key_list_structs_are_compiled_once():
+    assert _key_list_struct(3) is _key_list_struct(3)
+    assert _key_list_struct(3).size == 6
@@ -0,0 +1,72 @@
+# tests/test_params.py
+import struct
+from types import SimpleNamespace
+import pytest
+from lidar.device import LidarDevice
+from lidar.enums import LivoxLidarRetCode, ParamKeyName
+from lidar.protocol import handle_parameter_configuration
+
+
+class FakeSocket:
+    def __init__(self):
+        self.sent = []
+
+    def sendto(self, data, addr):
+        self.sent.append(data)
+
+
+def configure(dev, *pairs):
+    data = b''.join(struct.pack('<HH', key.value, len(value)) + value for key, value in pairs)
+    req = SimpleNamespace(sof=0xAA, version=0, seq_num=1, cmd_id=0x0100, rsvd=b'\x00' * 6,
+                          data=struct.pack('<HH', len(pairs), 0) + data)
+    sock = FakeSocket()
+    handle_parameter_configuration(sock, ('127.0.0.1', 56101), req, dev)
+    assert len(sock.sent) == 1
+    return struct.unpack_from('<BH', sock.sent[0], 24)
+
+
+def test_unsupported_pcl_data_type_is_rejected():
+    dev = LidarDevice(0)
+    old = dev.info.pcl_data_type
+    ret_code, error_key = configure(dev, (ParamKeyName.kKeyPclDataType, b'\x09'),
+                                    (ParamKeyName.kKeyPatternMode, b'\x01'))
+    assert ret_code == LivoxLidarRetCode.kLivoxLidarRetOutOfRange.value
+    assert error_key == ParamKeyName.kKeyPclDataType.value
+    assert dev.info.pcl_data_type == old
+    assert dev.info.pattern_mode == 1
+
+
+def test_supported_pcl_data_type_is_acked():
+    dev = LidarDevice(0)
+    assert configure(dev, (ParamKeyName.kKeyPclDataType, b'\x01')) == (0, 0)
+    assert dev.info.pcl_data_type == 1
+
+
+def test_install_attitude_offsets_are_signed():
+    dev = LidarDevice(0)
+    value = struct.pack('<fffiii', 1.0, -2.0, 90.0, -250, 40, -1200)
+    assert dev.store.set(ParamKeyName.kKeyInstallAttitude.value, value)
+    att = dev.info.install_attitude
+    assert (att.x_mm, att.y_mm, att.z_mm) == (-250, 40, -1200)
+    assert dev.store.get(ParamKeyName.kKeyInstallAttitude.value).value == value
+
+
+def test_unsupported_work_mode_is_rejected():
+    dev = LidarDevice(0)
+    ret_code, error_key = configure(dev, (ParamKeyName.kKeyWorkMode, b'\x05'))
+    assert ret_code == LivoxLidarRetCode.kLivoxLidarRetOutOfRange.value
+    assert error_key == ParamKeyName.kKeyWorkMode.value
+    assert dev.work.state() == 'sampling'
+    assert configure(dev, (ParamKeyName.kKeyWorkMode, b'\x03')) == (0, 0)
+    assert dev.work.state() == 'standby'
+
+
+def test_func_io_cfg_needs_four_bytes():
+    dev = LidarDevice(0)
+    key = ParamKeyName.kKeyFuncIoCfg.value
+    for value in (b'\x01\x02\x03', b'\x01\x02\x03\x04\x05'):
+        with pytest.raises(ValueError):
+            dev.store.set(key, value)
+    assert dev.store.set(key, b'\x01\x02\x03\x04')
+    assert dev.info.func_io_cfg == [1, 2, 3, 4]
+    dev.info.pack()
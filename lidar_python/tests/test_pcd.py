@@ -0,0 +1,75 @@
+# tests/test_pcd.py
+import logging
+import struct
+import numpy as np
+import pytest
+from lidar import pcd
+from lidar.pcd import PcdReader, lzf_decompress
+
+DTYPE = np.dtype([('x', '<f4'), ('y', '<f4'), ('z', '<f4'), ('intensity', 'u1')])
+
+
+def sample_points(n=300):
+    points = np.zeros(n, DTYPE)
+    rng = np.random.default_rng(0)
+    # Quarter metres, so ASCII round-trips exactly.
+    for name in ('x', 'y', 'z'):
+        points[name] = rng.integers(-400, 400, n) / 4
+    points['intensity'] = rng.integers(0, 256, n)
+    return points
+
+
+def lzf_literals(data):
+    # A valid LZF stream made only of literal runs (at most 32 bytes each).
+    out = bytearray()
+    for start in range(0, len(data), 32):
+        chunk = data[start:start + 32]
+        out.append(len(chunk) - 1)
+        out += chunk
+    return bytes(out)
+
+
+def write_pcd(path, points, data):
+    header = (f"# .PCD v0.7\nVERSION 0.7\nFIELDS x y z intensity\nSIZE 4 4 4 1\nTYPE F F F U\nCOUNT 1 1 1 1\n"
+              f"WIDTH {len(points)}\nHEIGHT 1\nVIEWPOINT 0 0 0 1 0 0 0\nPOINTS {len(points)}\nDATA {data}\n")
+    if data == 'ascii':
+        body = ''.join(f"{p['x']} {p['y']} {p['z']} {p['intensity']}\n" for p in points).encode()
+    elif data == 'binary':
+        body = points.tobytes()
+    else:
+        raw = b''.join(np.ascontiguousarray(points[name]).tobytes() for name in DTYPE.names)
+        compressed = lzf_literals(raw)
+        body = struct.pack('<II', len(compressed), len(raw)) + compressed
+    path.write_bytes(header.encode() + body)
+    return str(path)
+
+
+@pytest.mark.parametrize('data', ['ascii', 'binary', 'binary_compressed'])
+def test_round_trip(tmp_path, data):
+    points = sample_points()
+    reader = PcdReader(write_pcd(tmp_path / f'{data}.pcd', points, data))
+    try:
+        assert (reader.data, reader.points, reader.fields) == (data, len(points), list(DTYPE.names))
+        assert reader.scale_mm == pcd.PCD_METRE_UNIT_MM
+        assert np.array_equal(reader.read_points(100, 50), points[100:150])
+        assert np.array_equal(np.concatenate(list(reader.frames(128))), points)
+        assert np.array_equal(reader.points_array(), points)
+    finally:
+        reader.close()
+
+
+def test_lzf_fallback_back_references():
+    # 'ab', then 4 bytes from 2 back, overlapping what they copy.
+    assert bytes(lzf_decompress(b'\x01ab\x40\x01', 6)) == b'ababab'
+    with pytest.raises(ValueError):
+        lzf_decompress(b'\x01ab', 3)
+
+
+def test_warns_when_lzf_is_missing(tmp_path, monkeypatch, caplog):
+    monkeypatch.setattr(pcd, 'lzf', None)
+    path = write_pcd(tmp_path / 'c.pcd', sample_points(10), 'binary_compressed')
+    with caplog.at_level(logging.WARNING, logger='lidar.device'):
+        PcdReader(path).close()
+        PcdReader(write_pcd(tmp_path / 'b.pcd', sample_points(10), 'binary')).close()
+    warnings = [r for r in caplog.records if 'python-lzf' in r.getMessage()]
+    assert len(warnings) == 1
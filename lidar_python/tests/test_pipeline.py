@@ -0,0 +1,115 @@
+# tests/test_pipeline.py
+import struct
+import numpy as np
+import pytest
+from lidar.device import LidarDevice
+from lidar.enums import ParamKeyName
+from lidar.packet import FovCfg
+from lidar.pipeline import PointReducer
+
+
+def random_points(n=1000, seed=0):
+    return np.random.default_rng(seed).uniform(-20, 20, (n, 3))
+
+
+def test_default_state_passes_every_point():
+    dev = LidarDevice(0)
+    points = random_points()
+    assert not dev.pipeline.enabled()
+    assert dev.pipeline.process(points, 1000) is points
+    assert dev.pipeline.process(points, 1000, key=0) is points
+
+
+def test_blind_spot_alone_keeps_default_windows_off():
+    dev = LidarDevice(0)
+    points = random_points()
+    dev.store.set(ParamKeyName.kKeyBlindSpotSet.value, struct.pack('<I', 1000))
+    out = dev.pipeline.process(points, 1000)
+    expected = np.linalg.norm(points, axis=1) >= 10
+    assert len(out) == np.count_nonzero(expected)
+
+
+def test_fov_window_applies_once_set_and_recull_cached_frames():
+    dev = LidarDevice(0)
+    points = random_points()
+    assert len(dev.pipeline.process(points, 1000, key=1)) == len(points)
+    dev.store.set(ParamKeyName.kKeyFovCfg0.value, FovCfg(350, 10, -90, 90, 0).pack())
+    dev.store.set(ParamKeyName.kKeyFovCfgEn.value, b'\x01')
+    out = dev.pipeline.process(points, 1000, key=1)
+    azimuth = np.degrees(np.arctan2(out[:, 1], out[:, 0])) % 360
+    assert 0 < len(out) < len(points)
+    assert np.all((azimuth >= 350) | (azimuth <= 10))
+    # ROI mode cuts the same window out instead.
+    dev.store.set(ParamKeyName.kKeyRoiMode.value, b'\x01')
+    assert len(dev.pipeline.process(points, 1000, key=1)) == len(points) - len(out)
+
+
+def set_attitude(dev, roll, pitch, yaw, x, y, z):
+    value = struct.pack('<fffiii', roll, pitch, yaw, x, y, z)
+    assert dev.store.set(ParamKeyName.kKeyInstallAttitude.value, value)
+
+
+def test_attitude_keeps_structured_fields():
+    dev = LidarDevice(0)
+    set_attitude(dev, 0.0, 0.0, 90.0, -100, 0, 0)
+    dtype = np.dtype([('x', '<f4'), ('y', '<f4'), ('z', '<f4'), ('intensity', 'u1'), ('timestamp', '<f8')])
+    points = np.zeros(3, dtype)
+    points['x'] = [1.0, 2.0, 3.0]
+    points['intensity'] = [5, 6, 7]
+    points['timestamp'] = [0.5, 0.6, 0.7]
+    out = dev.pipeline.process(points, 1000)
+    assert out.dtype == dtype
+    np.testing.assert_allclose(out['x'], -0.1, atol=1e-6)
+    np.testing.assert_allclose(out['y'], [1.0, 2.0, 3.0], atol=1e-6)
+    assert np.array_equal(out['timestamp'], points['timestamp'])
+    assert np.array_equal(out['intensity'], points['intensity'])
+    assert np.array_equal(points['x'], [1.0, 2.0, 3.0])
+
+
+def test_attitude_results_are_not_shared():
+    dev = LidarDevice(0)
+    set_attitude(dev, 10.0, 0.0, 0.0, 0, 0, 500)
+    first = dev.pipeline.process(random_points(seed=1), 1000)
+    kept = first.copy()
+    dev.pipeline.process(random_points(seed=2), 1000)
+    assert np.array_equal(first, kept)
+
+
+def test_attitude_on_integer_fields_rounds():
+    dev = LidarDevice(0)
+    set_attitude(dev, 0.0, 0.0, 0.0, 15, -25, 1000)
+    points = np.zeros(2, [('x', '<i2'), ('y', '<i2'), ('z', '<i2')])
+    points['x'] = [100, -100]
+    out = dev.pipeline.process(points, 10)
+    assert out.dtype == points.dtype
+    assert out['x'].tolist() == [102, -98]
+    assert out['y'].tolist() == [-2, -2]
+    assert out['z'].tolist() == [100, 100]
+
+
+def test_voxel_keeps_first_point_per_cell_in_scan_order():
+    reducer = PointReducer(voxel_size=1.0)
+    points = np.array([[0.2, 0.2, 0.2], [5.5, 0, 0], [0.9, 0.1, 0.4], [-0.5, 0, 0], [5.1, 0.3, 0.9]])
+    assert reducer(points, 1000).tolist() == points[[0, 1, 3]].tolist()
+    # The voxel size is in metres whatever the source unit.
+    assert len(reducer(points * 1000, 1)) == 3
+    assert len(PointReducer(voxel_size=0.1)(points, 1000)) == 5
+
+
+def test_decimate_and_budget():
+    points = np.arange(100)[:, None] * np.ones(3)
+    assert PointReducer(decimate=4)(points, 1000)[:, 0].tolist() == list(range(0, 100, 4))
+    assert PointReducer(budget=10)(points, 1000)[:, 0].tolist() == list(range(0, 100, 10))
+    assert len(PointReducer(budget=200)(points, 1000)) == 100
+    assert len(PointReducer(decimate=4, budget=10)(points, 1000)) == 10
+    for reducer in (PointReducer(decimate=4, mode='random', seed=0), PointReducer(budget=10, mode='random', seed=0)):
+        out = reducer(points, 1000)[:, 0]
+        assert len(out) == (25 if reducer.decimate > 1 else 10)
+        assert len(set(out)) == len(out) and np.all(np.diff(out) > 0)
+
+
+def test_reducer_settings():
+    assert not PointReducer(0, 1, 'stride', 0).enabled()
+    for kwargs in ({'mode': 'every'}, {'voxel_size': -1}, {'decimate': 0}, {'budget': -1}):
+        with pytest.raises(ValueError):
+            PointReducer(**kwargs)
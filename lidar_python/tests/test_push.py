@@ -0,0 +1,60 @@
+# tests/test_push.py
+import struct
+from lidar.device import LidarDevice
+from lidar.enums import ParamKeyName
+from lidar.packet import LivoxLidarCmdPacket, LivoxLidarParamConfig
+from lidar.push import StatePusher, PUSH_CMD_ID
+
+KEYS = [ParamKeyName.kKeyPclDataType, ParamKeyName.kKeyPatternMode, ParamKeyName.kKeyTimeOffset]
+
+
+class FakeSocket:
+    def __init__(self):
+        self.sent = []
+
+    def sendto(self, data, addr):
+        self.sent.append((data, addr))
+
+
+def pushed_keys(buf):
+    cmd_id, = struct.unpack_from('<H', buf, 8)
+    assert cmd_id == PUSH_CMD_ID
+    config = LivoxLidarParamConfig.unpack_from(buf, LivoxLidarCmdPacket.size)
+    return {param.key: bytes(param.value) for param in config.key_list}
+
+
+def test_changed_keys_between_full_pushes():
+    dev = LidarDevice(0)
+    pusher = StatePusher(dev, KEYS, full_every=3)
+    first = pushed_keys(pusher.packet()[0])
+    assert sorted(first) == sorted(key.value for key in KEYS)
+
+    assert pusher.packet()[1] == 0
+    assert dev.store.set(ParamKeyName.kKeyPatternMode.value, b'\x02')
+    assert pushed_keys(pusher.packet()[0]) == {ParamKeyName.kKeyPatternMode.value: b'\x02'}
+
+    # The third push is full again and repeats the unchanged keys as encoded.
+    full = pushed_keys(pusher.packet()[0])
+    assert full == {**first, ParamKeyName.kKeyPatternMode.value: b'\x02'}
+    assert pusher.packet()[1] == 0
+    assert pusher.seq_num == 5
+
+
+def test_changed_only_without_full_pushes():
+    dev = LidarDevice(0)
+    pusher = StatePusher(dev, KEYS, full_every=0)
+    assert pusher.packet()[1] == len(KEYS)
+    assert [pusher.packet()[1] for _ in range(3)] == [0, 0, 0]
+    assert dev.store.set(ParamKeyName.kKeyTimeOffset.value, struct.pack('<q', 12))
+    assert pusher.packet()[1] == 1
+
+
+def test_push_sends_to_host_cfg():
+    dev = LidarDevice(0)
+    pusher = StatePusher(dev, KEYS)
+    assert pusher.push() == -1
+    dev.push_sock = FakeSocket()
+    assert pusher.push() == 0 and pusher.sent == 1
+    [(buf, addr)] = dev.push_sock.sent
+    assert addr == pusher.dest()
+    assert len(pushed_keys(buf)) == len(KEYS)
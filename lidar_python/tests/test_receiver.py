@@ -0,0 +1,70 @@
+# tests/test_receiver.py
+import socket
+import time
+import numpy as np
+from lidar.encoder import encode_packets, encode_imu_packets_into, HEADER_DTYPE, HEADER_SIZE, IMU_PACKET_SIZE
+from lidar.receiver import LidarReceiver, PointDecoder, SequenceTracker, valid_packets, point_payload_size
+
+
+def to_slots(buf, offsets, slot_size=2048):
+    n = len(offsets) - 1
+    slots = np.zeros((n, slot_size), np.uint8)
+    lengths = np.diff(offsets)
+    for i in range(n):
+        slots[i, :lengths[i]] = buf[offsets[i]:offsets[i + 1]]
+    return slots, lengths, np.ndarray((n,), HEADER_DTYPE, buffer=slots, strides=(slot_size,))
+
+
+def test_open_frame_flushes_while_imu_flows():
+    frames = []
+    rx = LidarReceiver('127.0.0.1', 0, 0, on_frame=lambda cnt, points: frames.append((cnt, len(points))),
+                       frame_idle=0.15)
+    tx = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+    try:
+        point_addr, imu_addr = rx.addresses()
+        points = np.zeros((200, 3), np.float32)
+        buf, offsets = encode_packets(points, frame_cnt=7, scale=1000, data_type=1)
+        for start, end in zip(offsets[:-1], offsets[1:]):
+            tx.sendto(buf[start:end].tobytes(), point_addr)
+        imu = np.zeros((1, IMU_PACKET_SIZE), np.uint8)
+        deadline = time.monotonic() + 1.0
+        udp_cnt = 0
+        while not frames and time.monotonic() < deadline:
+            lengths = encode_imu_packets_into(imu, np.zeros((1, 6), np.float32), udp_cnt)
+            tx.sendto(imu[0, :lengths[0]].tobytes(), imu_addr)
+            udp_cnt += 1
+            rx.poll(0.02)
+        assert frames == [(7, 200)]
+        assert rx.imu.samples > 0
+    finally:
+        tx.close()
+        rx.close()
+
+
+def test_sequence_tracker_counts_gaps_and_reordering():
+    tracker = SequenceTracker()
+    assert tracker.update(np.array([10, 11, 13], np.uint16)) == 1
+    # A late packet and a repeat are reordered, not lost, and leave the
+    # expected count alone.
+    assert tracker.update(np.array([12], np.uint16)) == 0
+    assert tracker.update(np.array([14, 14], np.uint16)) == 0
+    assert (tracker.lost, tracker.reordered, tracker.last) == (1, 2, 14)
+
+    wrapped = SequenceTracker()
+    assert wrapped.update(np.array([0xFFFE, 0xFFFF, 0, 2], np.uint16)) == 1
+    assert (wrapped.lost, wrapped.reordered) == (1, 0)
+
+
+def test_invalid_packets_are_rejected():
+    points = np.zeros((4 * 96, 3), np.float32)
+    buf, offsets = encode_packets(points, scale=1000, data_type=1, dot_num=96)
+    slots, lengths, headers = to_slots(buf, offsets)
+    slots[1, HEADER_SIZE + 3] ^= 0xFF   # Payload no longer matches its CRC32
+    headers['length'][2] += 1           # Header disagrees with the datagram
+    lengths[3] -= 14                    # Datagram shorter than dot_num says
+    headers['length'][3] -= 14
+    assert valid_packets(slots, lengths, headers, point_payload_size).tolist() == [True, False, False, False]
+
+    decoder = PointDecoder()
+    assert decoder.process(slots, lengths, headers) == 1
+    assert decoder.invalid == 3
@@ -0,0 +1,44 @@
+# tests/test_registry.py
+import pytest
+from lidar.config import LIDAR_DEVICE_IP, LIDAR_DEVICE_SN
+from lidar.device import get_default_device
+from lidar.registry import DeviceRegistry, MAX_DEVICES, device_ip, device_mac, device_sn
+
+
+def test_device_identities():
+    assert device_ip('192.168.1.44', 3) == '192.168.1.47'
+    assert device_ip('10.0.0.255', 1) == '10.0.1.0'
+    assert device_sn('Tux-LivoxLidar1', 0) == 'Tux-LivoxLidar1'
+    assert device_sn('Tux-LivoxLidar1', 1) == 'Tux-LivoxLidar2'
+    # The SN stays within 16 bytes as the suffix grows.
+    assert device_sn('ABCDEFGHIJKLMNO1', 9) == 'ABCDEFGHIJKLMN10'
+    assert device_mac((1, 2, 3, 4, 5, 0xFF), 2) == (1, 2, 3, 4, 5, 1)
+
+
+def test_ip_aliases_by_default():
+    devices = DeviceRegistry().create(3, port_stride=0)
+    assert devices[0] is get_default_device()
+    assert [dev.ip for dev in devices[1:]] == [device_ip(LIDAR_DEVICE_IP, i) for i in (1, 2)]
+    assert [dev.sn for dev in devices] == [device_sn(LIDAR_DEVICE_SN, i) for i in range(3)]
+    assert len({dev.cmd_port for dev in devices}) == 1
+
+
+def test_port_stride_shares_one_ip():
+    devices = DeviceRegistry().create(3, port_stride=10)
+    assert {dev.ip for dev in devices} == {LIDAR_DEVICE_IP}
+    base = devices[0]
+    for i, dev in enumerate(devices):
+        assert (dev.cmd_port, dev.point_port, dev.imu_port, dev.push_port) == \
+            (base.cmd_port + 10 * i, base.point_port + 10 * i, base.imu_port + 10 * i, base.push_port + 10 * i)
+    assert len({dev.sn for dev in devices}) == 3
+
+
+def test_create_appends_and_caps_devices():
+    registry = DeviceRegistry()
+    registry.create(2)
+    added = registry.create(1)
+    assert [dev.index for dev in registry] == [0, 1, 2] and added == [registry[2]]
+    assert registry.create(0) == []
+    with pytest.raises(ValueError):
+        registry.create(MAX_DEVICES)
+    assert len(registry) == MAX_DEVICES
@@ -0,0 +1,61 @@
+# tests/test_ring.py
+import threading
+import numpy as np
+from lidar.ring import PacketRing
+
+
+def fill(ring, n, first_len=100):
+    start, count = ring.acquire(n, 0)
+    ring.commit(start, count, np.arange(first_len, first_len + count), 1, frame_start=True)
+    return start, count
+
+
+def test_runs_stop_at_the_end_and_wrap():
+    ring = PacketRing(slots=8, slot_size=64)
+    assert fill(ring, 6) == (0, 6)
+    assert ring.peek(4, 0) == (0, 4)
+    ring.release(4)
+    # Only two slots remain before the end, so the run is cut there.
+    assert fill(ring, 5, 200) == (6, 2)
+    assert fill(ring, 5, 300) == (0, 4)
+    assert len(ring) == 8
+    assert ring.acquire(1, 0) == (0, 0)
+
+    assert ring.pending().tolist() == [4, 5, 6, 7, 0, 1, 2, 3]
+    assert ring.peek(8, 0) == (4, 4)
+    assert ring.lengths[4:8].tolist() == [104, 105, 200, 201]
+    ring.release(4)
+    assert ring.peek(8, 0) == (0, 4)
+    assert ring.lengths[0:4].tolist() == [300, 301, 302, 303]
+    assert ring.frame_start[0:4].tolist() == [True, False, False, False]
+    ring.release(4)
+    assert len(ring) == 0 and ring.peek(1, 0) == (0, 0)
+
+
+def test_slots_share_the_flat_buffer():
+    ring = PacketRing(slots=4, slot_size=16)
+    ring.slots[3, :2] = (7, 9)
+    assert ring.buf[ring.offsets[3]:ring.offsets[3] + 2].tolist() == [7, 9]
+
+
+def test_full_ring_waits_for_release():
+    ring = PacketRing(slots=4, slot_size=16)
+    fill(ring, 4)
+    got = []
+    producer = threading.Thread(target=lambda: got.append(ring.acquire(4, 2.0)))
+    producer.start()
+    ring.release(3)
+    producer.join(2.0)
+    assert got == [(0, 3)]
+
+
+def test_close_wakes_both_sides():
+    ring = PacketRing(slots=4, slot_size=16)
+    got = []
+    consumer = threading.Thread(target=lambda: got.append(ring.peek(4, 2.0)))
+    consumer.start()
+    ring.close()
+    consumer.join(2.0)
+    assert got == [(0, 0)]
+    assert ring.acquire(1, 0) == (0, 0)
+    assert ring.drained()
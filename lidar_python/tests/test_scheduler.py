@@ -0,0 +1,80 @@
+# tests/test_scheduler.py
+import pytest
+from lidar import scheduler
+from lidar.scheduler import RateScheduler, POLICY_CATCHUP, POLICY_DROP
+
+PERIOD_NS = 1000000
+
+
+class FakeTime:
+    # perf_counter_ns() moves on 1 us per call, so busy-waits end.
+    def __init__(self):
+        self.now = 0
+        self.slept = 0
+
+    def perf_counter_ns(self):
+        self.now += 1000
+        return self.now
+
+    def sleep(self, seconds):
+        self.slept += 1
+        self.now += int(seconds * 1e9)
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    fake = FakeTime()
+    monkeypatch.setattr(scheduler, 'time', fake)
+    return fake
+
+
+def test_paces_to_deadlines(clock):
+    sched = RateScheduler(1e9 / PERIOD_NS, spin_ns=100000)
+    sched.start(0)
+    for i in range(5):
+        assert sched.wait()
+        assert i * PERIOD_NS <= clock.now < i * PERIOD_NS + 10000
+    assert sched.items == 5 and clock.slept == 4
+
+
+def test_catchup_bursts_then_paces(clock):
+    sched = RateScheduler(1e9 / PERIOD_NS, POLICY_CATCHUP)
+    sched.start(0)
+    clock.now = 5 * PERIOD_NS + 500000
+    late_at = clock.now
+    # Every slot missed is sent at once, then pacing resumes.
+    for _ in range(6):
+        assert sched.wait()
+    assert clock.now - late_at < 100000 and clock.slept == 0
+    assert sched.wait()
+    assert clock.now >= 6 * PERIOD_NS
+    assert (sched.items, sched.dropped, sched.resyncs) == (7, 0, 0)
+
+
+def test_catchup_forgives_lag_beyond_max(clock):
+    sched = RateScheduler(1e9 / PERIOD_NS, POLICY_CATCHUP, max_lag_ns=10 * PERIOD_NS)
+    sched.start(0)
+    clock.now = 50 * PERIOD_NS
+    assert sched.wait()
+    assert sched.resyncs == 1
+    # The schedule restarts from now instead of bursting 50 slots.
+    assert sched.remaining_ns() > PERIOD_NS // 2
+
+
+def test_drop_skips_missed_slots(clock):
+    sched = RateScheduler(1e9 / PERIOD_NS, POLICY_DROP)
+    sched.start(0)
+    clock.now = 3 * PERIOD_NS + 500000
+    results = [sched.wait() for _ in range(4)]
+    assert results == [False, False, False, True]
+    assert (sched.items, sched.dropped) == (1, 3)
+
+
+def test_reserve_never_blocks(clock):
+    sched = RateScheduler(1e9 / PERIOD_NS)
+    sched.start(0)
+    assert sched.reserve(3)
+    assert sched.reserve()
+    assert clock.slept == 0 and clock.now < PERIOD_NS
+    assert sched.items == 4
+    assert sched.remaining_ns() > 3 * PERIOD_NS
@@ -0,0 +1,79 @@
+# tests/test_sim.py
+import threading
+import time
+import numpy as np
+from lidar.device import LidarDevice
+from lidar.receiver import LidarReceiver
+from lidar.sim import FrameStreamer
+
+FRAME_PERIOD_NS = 100000000
+
+
+def receive(rx, frames, count, timeout=2.0):
+    deadline = time.monotonic() + timeout
+    while len(frames) < count and time.monotonic() < deadline:
+        rx.poll(0.02)
+
+
+def test_stream_frame_loopback():
+    dev = LidarDevice(0)
+    frames = []
+    rx = LidarReceiver('127.0.0.1', 0, None, on_frame=lambda cnt, points: frames.append(points.copy()),
+                       frame_idle=0.05)
+    streamer = FrameStreamer(dev, frame_period_ns=FRAME_PERIOD_NS)
+    rng = np.random.default_rng(0)
+    sent = []
+    try:
+        assert dev.open_pcl_socket(('127.0.0.1', 0), rx.addresses()[0])
+        for k in range(2):
+            points = rng.uniform(-20, 20, (1000, 3)).astype(np.float32)
+            points[::100, k] = np.nan
+            points[1::100, 2] = np.inf
+            timestamp_ns = (k + 1) * 1000000000
+            assert streamer.stream_frame(points, timestamp_ns)
+            sent.append((points[np.isfinite(points).all(axis=1)], timestamp_ns))
+        assert streamer.wait(2.0)
+        receive(rx, frames, len(sent))
+    finally:
+        streamer.close()
+        dev.close()
+        rx.close()
+
+    assert len(frames) == len(sent)
+    for got, (points, timestamp_ns) in zip(frames, sent):
+        # Metres on the way in, millimetres on the wire, metres again here.
+        assert len(got) == len(points) == 980
+        xyz = np.stack([got['x'], got['y'], got['z']], axis=1)
+        assert np.abs(xyz - points).max() <= 0.0005 + 1e-6
+        # The first point carries timestamp_ns, the rest span the frame.
+        assert int(got['timestamp'][0]) == timestamp_ns
+        assert np.all(np.diff(got['timestamp'].astype(np.int64)) >= 0)
+        assert abs(int(got['timestamp'][-1]) - timestamp_ns - FRAME_PERIOD_NS) < FRAME_PERIOD_NS / 50
+
+
+def test_stream_frame_drops_oldest_when_behind():
+    streamer = FrameStreamer(LidarDevice(0), queue_frames=2)
+    busy = threading.Event()
+    release = threading.Event()
+    sent = []
+
+    def send_frame(points, timestamp_ns=None, perf_ns=None):
+        sent.append(timestamp_ns)
+        busy.set()
+        release.wait(2.0)
+        return 1
+
+    streamer.send_frame = send_frame
+    points = np.zeros((10, 3), np.float32)
+    try:
+        streamer.stream_frame(points, 0)
+        assert busy.wait(2.0)
+        for timestamp_ns in range(1, 5):
+            streamer.stream_frame(points, timestamp_ns)
+        assert streamer.dropped == 2
+        release.set()
+        assert streamer.wait(2.0)
+    finally:
+        release.set()
+        streamer.close()
+    assert sent == [0, 3, 4]
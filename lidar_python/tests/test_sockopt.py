@@ -0,0 +1,34 @@
+# tests/test_sockopt.py
+import socket
+import pytest
+from lidar.sockopt import apply_profile, get_profile
+
+
+@pytest.fixture
+def sock():
+    sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+    yield sock
+    sock.close()
+
+
+def test_granted_options_are_reported(sock):
+    granted = apply_profile(sock, {'rcvbuf': 1 << 15, 'sndbuf': 1 << 15, 'dscp': 46, 'nonblocking': True})
+    # Sizes come back as asked for, not the doubled value Linux reports.
+    assert granted['rcvbuf'] == granted['sndbuf'] == 1 << 15
+    assert granted['dscp'] == 46
+    assert sock.getsockopt(socket.IPPROTO_IP, socket.IP_TOS) == 46 << 2
+    assert granted['nonblocking'] and sock.gettimeout() == 0.0
+
+
+def test_buffer_beyond_limit_is_capped_not_fatal(sock):
+    # Far beyond net.core.wmem_max; the kernel grants less and we go on.
+    granted = apply_profile(sock, {'sndbuf': 1 << 30}, 'capped')
+    assert 0 < granted['sndbuf'] < 1 << 30
+
+
+def test_named_profiles():
+    assert get_profile('point')['nonblocking']
+    with pytest.raises(ValueError):
+        get_profile('bogus')
+    with socket.socket(socket.AF_INET, socket.SOCK_DGRAM) as sock:
+        assert set(apply_profile(sock, 'command')) == {'rcvbuf', 'sndbuf'}
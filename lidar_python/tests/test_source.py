@@ -0,0 +1,68 @@
+# tests/test_source.py
+import itertools
+import numpy as np
+import pytest
+from lidar.source import ReplaySource, replay_source
+
+
+class FakeReader:
+    # Point i is just the number i.
+    path = 'fake.pcd'
+    scale_mm = 1000
+
+    def __init__(self, points):
+        self.points = points
+        self.reads = 0
+
+    def read_points(self, first, count):
+        self.reads += 1
+        return np.arange(first, first + count)
+
+
+def firsts(frames, n=None):
+    return [int(points[0]) for points in itertools.islice(frames, n)]
+
+
+def test_frames_split_the_file():
+    source = ReplaySource(FakeReader(25), points_per_frame=10, start=0, end=None, loop=False)
+    frames = list(source.frames())
+    assert len(source) == source.frame_count == 3
+    assert [len(points) for points in frames] == [10, 10, 5]
+    assert int(frames[2][-1]) == 24
+
+
+def test_range_uses_slice_semantics():
+    source = ReplaySource(FakeReader(100), points_per_frame=10, start=2, end=-3, loop=False)
+    assert (source.start, source.end) == (2, 7)
+    assert [index for index, _ in source.indexed_frames()] == [2, 3, 4, 5, 6]
+    empty = ReplaySource(FakeReader(100), points_per_frame=10, start=8, end=4, loop=False)
+    assert len(empty) == 0 and list(empty.frames()) == []
+
+
+def test_loop_wraps_to_start():
+    reader = FakeReader(100)
+    source = ReplaySource(reader, points_per_frame=10, start=7, end=None, loop=True)
+    assert firsts(source.frames(), 7) == [70, 80, 90, 70, 80, 90, 70]
+    assert source.loops == 2
+    # Each frame is read on its own; looping never rescans the file.
+    assert reader.reads == 7
+
+
+def test_seek_moves_the_next_frame():
+    source = ReplaySource(FakeReader(100), points_per_frame=10, start=2, end=8, loop=False)
+    frames = source.frames()
+    assert firsts(frames, 2) == [20, 30]
+    source.seek(6)
+    assert firsts(frames) == [60, 70]
+    for index in (1, 8):
+        with pytest.raises(ValueError):
+            source.seek(index)
+
+
+def test_invalid_arguments():
+    with pytest.raises(ValueError):
+        ReplaySource(FakeReader(10), points_per_frame=0)
+    with pytest.raises(ValueError):
+        ReplaySource(FakeReader(10), speed=0)
+    source = ReplaySource(FakeReader(10), points_per_frame=5)
+    assert replay_source(source) is source
@@ -0,0 +1,51 @@
+# tests/test_timing.py
+import struct
+import time
+import numpy as np
+from lidar.device import LidarDevice
+from lidar.enums import ParamKeyName
+from lidar.timing import PacketClock, source_timestamps_ns, TIME_TYPE_NONE, TIME_TYPE_PTP
+
+
+def test_boot_and_epoch_timebases():
+    dev = LidarDevice(0)
+    clock = dev.clock
+    perf_ns = clock.boot_ns + 2500000000
+    # Without sync, packets count from power-on.
+    assert dev.store.set(ParamKeyName.kKeyTimeSyncType.value, bytes([TIME_TYPE_NONE]))
+    assert dev.store.set(ParamKeyName.kKeyTimeOffset.value, struct.pack('<q', 0))
+    assert clock.to_lidar_ns(perf_ns) == 2500000000
+
+    assert dev.store.set(ParamKeyName.kKeyTimeSyncType.value, bytes([TIME_TYPE_PTP]))
+    assert clock.time_type() == TIME_TYPE_PTP
+    assert clock.to_lidar_ns(perf_ns) == perf_ns + clock.epoch_ns
+    assert abs(clock.now() - time.time_ns()) < 50000000
+
+    assert dev.store.set(ParamKeyName.kKeyTimeOffset.value, struct.pack('<q', -7000))
+    assert clock.to_lidar_ns(perf_ns) == perf_ns + clock.epoch_ns - 7000
+    dev.info.time_sync_type = TIME_TYPE_NONE
+    assert clock.to_lidar_ns(perf_ns) == 2500000000 - 7000
+
+
+def test_frame_counter_wraps():
+    clock = PacketClock(LidarDevice(0).info)
+    clock.frame_cnt = 0xFE
+    assert [clock.next_frame() for _ in range(3)] == [0xFF, 0, 1]
+
+
+def test_packet_times():
+    timestamps, intervals = PacketClock.packet_times_at(1000, 250, 96, 5000)
+    assert timestamps.tolist() == [1000, 1000 + 96 * 5000, 1000 + 192 * 5000]
+    # time_interval is in 0.1 us and covers each packet's own points.
+    assert intervals.tolist() == [4800, 4800, 58 * 50]
+
+    point_ts = np.arange(10, dtype=np.int64) * 1000 + 5000
+    timestamps, intervals = PacketClock.packet_times_from_source(point_ts, 4)
+    assert timestamps.tolist() == [5000, 9000, 13000]
+    assert intervals.tolist() == [30, 30, 10]
+
+
+def test_source_timestamps():
+    assert source_timestamps_ns(np.array([1.5, 2.25])).tolist() == [1500000000, 2250000000]
+    assert source_timestamps_ns(np.array([1.7e18])).tolist() == [1700000000000000000]
+    assert source_timestamps_ns(np.array([42], np.uint64)).tolist() == [42]
@@ -0,0 +1,21 @@
+# tests/test_transmit.py
+import socket
+import numpy as np
+from lidar import metrics
+from lidar.transmit import PacketTransmitter
+
+
+def test_metrics_set_counts_only_its_stream():
+    rx = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+    rx.bind(('127.0.0.1', 0))
+    tx_sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+    try:
+        points, imu = metrics.SENT_PACKETS.value, metrics.IMU_PACKETS.value
+        tx = PacketTransmitter(tx_sock, rx.getsockname(), metrics=metrics.IMU_SEND)
+        buf = np.zeros(3 * 60, np.uint8)
+        assert tx.send_packets(buf, np.arange(4) * 60) == 3 * 60
+        assert metrics.IMU_PACKETS.value - imu == 3
+        assert metrics.SENT_PACKETS.value == points
+    finally:
+        tx_sock.close()
+        rx.close()
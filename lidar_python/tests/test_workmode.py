@@ -0,0 +1,125 @@
+# tests/test_workmode.py
+import socket
+import time
+import numpy as np
+from lidar.device import LidarDevice
+from lidar.encoder import HEADER_DTYPE, HEADER_SIZE, DOTS_PER_PACKET, POINT_DTYPES
+from lidar.enums import LivoxLidarWorkMode, ParamKeyName
+from lidar.protocol import PointStream
+from lidar.source import ReplaySource
+
+SAMPLING = LivoxLidarWorkMode.kLivoxLidarNormal.value
+IDLE = LivoxLidarWorkMode.kLivoxLidarWakeUp.value
+STANDBY = LivoxLidarWorkMode.kLivoxLidarSleep.value
+
+
+class FrameReader:
+    # Frame i is DOTS_PER_PACKET points at x = i mm, so one packet per frame.
+    path = 'frames'
+    scale_mm = 1
+
+    def __init__(self, frames, dots):
+        self.dots = dots
+        self.points = frames * dots
+
+    def read_points(self, start, count):
+        points = np.zeros((count, 3), np.float32)
+        points[:, 0] = (start + np.arange(count)) // self.dots
+        return points
+
+    def close(self):
+        pass
+
+
+def set_key(dev, key, value):
+    assert dev.store.set(key.value, bytes([value]))
+
+
+def open_points(dev):
+    host = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+    host.bind(('127.0.0.1', 0))
+    host.settimeout(1.0)
+    assert dev.open_pcl_socket(('127.0.0.1', 0), host.getsockname())
+    return host
+
+
+def test_work_mode_transitions():
+    dev = LidarDevice(0)
+    changes = []
+    dev.work.add_listener(lambda: changes.append(dev.work.state()))
+    assert dev.work.state() == 'sampling'
+    assert dev.work.imu.is_set()
+
+    for mode, state, imu in ((STANDBY, 'standby', False), (SAMPLING, 'sampling', True), (IDLE, 'idle', False)):
+        set_key(dev, ParamKeyName.kKeyWorkMode, mode)
+        assert dev.info.cur_work_state == mode
+        assert dev.work.state() == state
+        assert dev.work.imu.is_set() == imu
+    assert changes == ['standby', 'sampling', 'idle']
+
+
+def test_point_send_en_gates_points_not_imu():
+    dev = LidarDevice(0)
+    assert not dev.work.points.is_set()
+    host = open_points(dev)
+    try:
+        assert dev.work.points.is_set()
+        set_key(dev, ParamKeyName.kKeyPointSendEn, 1)
+        assert not dev.work.points.is_set()
+        assert dev.work.imu.is_set()
+        set_key(dev, ParamKeyName.kKeyPointSendEn, 0)
+        assert dev.work.points.is_set()
+        set_key(dev, ParamKeyName.kKeyWorkMode, STANDBY)
+        assert not dev.work.points.is_set()
+        assert not dev.work.imu.is_set()
+        set_key(dev, ParamKeyName.kKeyWorkMode, SAMPLING)
+        assert dev.work.points.is_set()
+        dev.close_pcl_socket()
+        assert not dev.work.points.is_set()
+    finally:
+        dev.close()
+        host.close()
+
+
+def test_replay_resumes_at_the_same_frame():
+    dev = LidarDevice(0)
+    data_type = dev.info.pcl_data_type
+    dots = DOTS_PER_PACKET[data_type]
+    frames, period_ns, pause_s = 10, 5e6, 0.1
+    source = ReplaySource(FrameReader(frames, dots), points_per_frame=dots, start=0, end=None, loop=False)
+    host = open_points(dev)
+    stream = PointStream(dev, source, frames_per_second=1e9 / period_ns)
+
+    def pump(n):
+        for _ in range(n):
+            assert stream.flowing()
+            start, count = stream.next_batch(1.0)
+            assert count == 1
+            assert stream.send_batch(start, count) == 0
+
+    try:
+        stream.start()
+        pump(frames // 2)
+        set_key(dev, ParamKeyName.kKeyWorkMode, IDLE)
+        assert not stream.flowing()
+        time.sleep(pause_s)
+        set_key(dev, ParamKeyName.kKeyWorkMode, SAMPLING)
+        assert stream.flowing()
+        pump(frames - frames // 2)
+        packets = [host.recv(2048) for _ in range(frames)]
+    finally:
+        stream.close()
+        dev.close()
+        host.close()
+
+    headers = [np.frombuffer(packet, HEADER_DTYPE, 1)[0] for packet in packets]
+    x = [int(np.frombuffer(packet, POINT_DTYPES[data_type], 1, HEADER_SIZE)[0]['x']) for packet in packets]
+    assert x == list(range(frames))
+    assert [int(h['udp_cnt']) for h in headers] == list(range(frames))
+    # Queued and later packets are restamped past the pause, so the frames
+    # keep their spacing on either side and the clock runs on across it.
+    gaps = np.diff([int(h['timestamp']) for h in headers])
+    paused = frames // 2 - 1
+    assert np.allclose(np.delete(gaps, paused), period_ns, atol=period_ns / 10)
+    assert gaps[paused] >= pause_s * 1e9 + period_ns
+    assert stream.paused_ns >= pause_s * 1e9